@@ -1,38 +1,144 @@
+import os
+
 import dash
 from dash import html, dcc
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
 
 # Import your custom modules
-from src.maps import get_districts_mapdata, get_boroughs_mapdata, get_countries_mapdata
+from src import registry
+from src.layout_cache import install_layout_cache
+from src.serving import install_memory_report
+from src.singleflight import single_flight
+from src.live import LIVE_FIGURES, LIVE_TABLES, get_live_version, install_live_updates, start_polling
+from src.keys import get_keys
+from src.votes import get_vote_matrix
+from src.montecarlo import get_seat_projection
+from src.electoral_systems import THRESHOLDS, get_seat_outcomes
+from src.maps import get_districts_mapdata, get_boroughs_mapdata, get_countries_mapdata, get_countries_of_origin_matrix
 from src.preprocess import get_demographics_data, get_elections_data, get_boroughs_data
 from src.viz_stacked_bar_charts import stacked_bar_chart_most, stacked_bar_chart_least, immigrants_map, linguistic_map
-from src.viz_intro_maps import get_montreal_boroughs_map, get_world_immigrants_map
-from src.viz_language import create_interactive_connected_dot_plot, get_language_dropdown_options
+from src.patches import to_patch
+from src.viz_intro_maps import get_montreal_boroughs_map, get_world_immigrants_map, get_world_immigrants_map_updates, get_world_immigrants_map_table
+from src.viz_language import get_language_votes, get_connected_dot_plots, get_connected_dot_plot_updates, get_connected_dot_plot_table, get_language_dropdown_options
 
 # Import Sidney's visualizations
-from src.viz_waffles_charts import get_quebec_waffle_chart, get_montreal_waffle_chart, get_hypothetical_waffle_chart, get_upper_median_immigration_waffle, get_lower_median_immigration_waffle
-from src.viz_waffles_charts import get_immigrant_voting_scatter, get_party_income_relation
+from src.viz_waffles_charts import get_waffle_subsets, get_hypothetical_waffle_updates, get_projection_waffle_chart, get_seat_histogram, get_electoral_system_waffle, get_electoral_system_updates, get_electoral_system_table, get_quebec_waffle_chart, get_montreal_waffle_chart, get_hypothetical_waffle_chart, get_upper_median_immigration_waffle, get_lower_median_immigration_waffle
+from src.viz_waffles_charts import get_immigrant_voting_scatter, get_party_income_relation, get_party_income_updates, get_party_income_table
+
+# 'client' : the interactions only look up tables shipped once with the layout, in the browser (c.f. assets/clientside.js).
+# 'server' : each interaction is a request, answered with a partial figure update.
+CALLBACKS = os.environ.get('CALLBACKS', 'client')
+# Election night : URL of the results feed, polled every LIVE_INTERVAL seconds to update the figures in every browser (c.f. src/live.py)
+LIVE_RESULTS_URL = os.environ.get('LIVE_RESULTS_URL')
+LIVE_INTERVAL = float(os.environ.get('LIVE_INTERVAL', 5))
+
+party_dropdown_options = [
+    {'label': 'Québec Solidaire', 'value': 'Q.S.'},
+    {'label': 'Parti Libéral du Québec', 'value': 'P.L.Q./Q.L.P.'},
+    {'label': 'Coalition Avenir Québec', 'value': 'C.A.Q.-E.F.L.'},
+    {'label': 'Parti Québécois', 'value': 'P.Q.'}
+]
+
+# Scenarios of the hypothetical waffle chart, c.f. src/scenarios.py
+scenario_options = [
+    {'label': 'Profil de vote de Montréal (%)', 'value': 'montreal'},
+    {'label': 'Transfert uniforme (points)', 'value': 'uniform'},
+    {'label': 'Transfert proportionnel (%)', 'value': 'proportional'}
+]
+# Uncertainty levels of the seat projection, c.f. src/montecarlo.py
+uncertainty_options = [
+    {'label': 'Faible', 'value': 'low'},
+    {'label': 'Moyenne', 'value': 'medium'},
+    {'label': 'Forte', 'value': 'high'}
+]
+# Electoral systems, regional groupings and thresholds of the electoral system waffle chart, c.f. src/electoral_systems.py
+electoral_system_options = [
+    {'label': 'Majoritaire (actuel)', 'value': 'fptp'},
+    {'label': "Proportionnelle (D'Hondt)", 'value': 'dhondt'},
+    {'label': 'Proportionnelle (Sainte-Laguë)', 'value': 'sainte-lague'},
+    {'label': 'Mixte compensatoire', 'value': 'mmp'}
+]
+grouping_options = [
+    {'label': 'Québec entier', 'value': 'province'},
+    {'label': 'Par ville', 'value': 'subsets'},
+    {'label': 'Par région', 'value': 'regions'}
+]
+threshold_options = [{'label': f'{t} %', 'value': t} for t in THRESHOLDS]
 
 # ---------- Data Loading -------------
-demographics_data = get_demographics_data()
-borough_df = get_boroughs_data()
-districts_mapdata = get_districts_mapdata()
-montreal_boroughs_mapdata = get_boroughs_mapdata()
-world_mapdata = get_countries_mapdata()
-election_data = get_elections_data()
-
-# ---------- Pre-generate Figures -----
-immigrants_map_fig = immigrants_map(demographics_data, districts_mapdata)
-linguistic_map_fig = linguistic_map(demographics_data, districts_mapdata)
-fig_quebec = get_quebec_waffle_chart()
-fig_montreal = get_montreal_waffle_chart()
-fig_hypothetical = get_hypothetical_waffle_chart()
-fig_upper_median_immigration = get_upper_median_immigration_waffle()
-fig_lower_median_immigration = get_lower_median_immigration_waffle()
-fig_immigrant_voting = get_immigrant_voting_scatter(demographics_data, election_data)
-fig_most = stacked_bar_chart_most(demographics_data, election_data)
-fig_least = stacked_bar_chart_least(demographics_data, election_data)
-montreal_boroughs_map = get_montreal_boroughs_map(montreal_boroughs_mapdata, borough_df)
+# Nothing is loaded here : every dataset and figure is declared with its dependencies,
+# and built on first request (c.f. src/registry.py)
+registry.register('demographics_data', get_demographics_data)
+registry.register('borough_df', get_boroughs_data)
+registry.register('districts_mapdata', get_districts_mapdata)
+registry.register('montreal_boroughs_mapdata', get_boroughs_mapdata)
+registry.register('world_mapdata', get_countries_mapdata)
+registry.register('election_data', get_elections_data)
+registry.register('countries_of_origin', get_countries_of_origin_matrix, depends=['borough_df', 'world_mapdata'])
+# Integer IDs of the circonscriptions, boroughs and quartiers, shared by all the sources (c.f. src/keys.py)
+registry.register(
+    'keys', get_keys,
+    depends=['demographics_data', 'election_data', 'districts_mapdata', 'borough_df', 'montreal_boroughs_mapdata'])
+# District x party view of the elections data, read by all the election charts (c.f. src/votes.py)
+registry.register('vote_matrix', get_vote_matrix, depends=['election_data', 'keys'])
+registry.register('live_version', get_live_version, depends=['vote_matrix'])
+
+# ---------- Figures ------------------
+# The immigration and linguistic maps are not used by the layout (it shows static HTML exports instead)
+registry.register('immigrants_map_fig', immigrants_map, depends=['demographics_data', 'districts_mapdata', 'keys'])
+registry.register('linguistic_map_fig', linguistic_map, depends=['demographics_data', 'districts_mapdata', 'keys'])
+# Districts of every waffle, whose seats are read from the vote matrix (c.f. src/viz_waffles_charts.py)
+registry.register('waffle_subsets', get_waffle_subsets, depends=['demographics_data', 'keys'])
+registry.register('fig_quebec', get_quebec_waffle_chart, depends=['vote_matrix', 'waffle_subsets'])
+# Monte Carlo projection of the seats, with the default uncertainty (c.f. src/montecarlo.py)
+registry.register('seat_projection', get_seat_projection, depends=['vote_matrix'])
+registry.register('fig_projection_waffle', get_projection_waffle_chart, depends=['vote_matrix', 'waffle_subsets', 'seat_projection'])
+registry.register('fig_seat_histogram', get_seat_histogram, depends=['seat_projection'])
+registry.register('fig_montreal', get_montreal_waffle_chart, depends=['vote_matrix', 'waffle_subsets'])
+registry.register('fig_hypothetical', get_hypothetical_waffle_chart, depends=['vote_matrix', 'waffle_subsets'])
+# Seats under every electoral system, computed in one batch (c.f. src/electoral_systems.py)
+registry.register('seat_outcomes', get_seat_outcomes, depends=['vote_matrix', 'keys'])
+registry.register('fig_electoral_system', get_electoral_system_waffle, depends=['vote_matrix', 'seat_outcomes'])
+registry.register('fig_upper_median_immigration', get_upper_median_immigration_waffle, depends=['vote_matrix', 'waffle_subsets'])
+registry.register('fig_lower_median_immigration', get_lower_median_immigration_waffle, depends=['vote_matrix', 'waffle_subsets'])
+registry.register('fig_immigrant_voting', get_immigrant_voting_scatter, depends=['demographics_data', 'vote_matrix', 'keys'])
+registry.register('fig_most', stacked_bar_chart_most, depends=['demographics_data', 'vote_matrix', 'keys'])
+registry.register('fig_least', stacked_bar_chart_least, depends=['demographics_data', 'vote_matrix', 'keys'])
+registry.register('montreal_boroughs_map', get_montreal_boroughs_map, depends=['montreal_boroughs_mapdata', 'borough_df', 'keys'])
+
+# The interactive figures are sent in full once, with their default selection, then only updated by the callbacks (c.f. src/patches.py)
+registry.register(
+    'world_immigrants_map', lambda *data: get_world_immigrants_map(*data)[0],
+    depends=['montreal_boroughs_mapdata', 'world_mapdata', 'countries_of_origin'])
+registry.register('language_votes', get_language_votes, depends=['demographics_data', 'vote_matrix', 'keys'])
+registry.register('connected_dot_plots', get_connected_dot_plots, depends=['language_votes'])
+registry.register(
+    'fig_connected_dot_plot', lambda dot_plots: dot_plots[get_language_dropdown_options()[0]], depends=['connected_dot_plots'])
+registry.register('fig_party_income', get_party_income_relation, depends=['demographics_data', 'vote_matrix', 'keys'])
+# Party -> updates of the income scatter plot, each one built on first selection
+registry.register('electoral_system_updates', get_electoral_system_updates, depends=['vote_matrix', 'seat_outcomes'])
+registry.register('party_income_updates', get_party_income_updates, depends=['demographics_data', 'vote_matrix', 'keys'])
+# The updates for every selection at once, for the clientside callbacks
+registry.register(
+    'world_immigrants_map_table', get_world_immigrants_map_table, depends=['montreal_boroughs_mapdata', 'countries_of_origin'])
+registry.register('connected_dot_plot_table', get_connected_dot_plot_table, depends=['connected_dot_plots'])
+registry.register('electoral_system_table', get_electoral_system_table, depends=['vote_matrix', 'seat_outcomes'])
+registry.register(
+    'party_income_table', lambda *data: get_party_income_table(*data, [o['value'] for o in party_dropdown_options]),
+    depends=['demographics_data', 'vote_matrix', 'keys'])
+
+# Values used by the layout and the callbacks, pre-warmed in the background once the server is up
+WARM_UP_VALUES = [
+    'fig_quebec', 'fig_projection_waffle', 'fig_seat_histogram', 'fig_montreal', 'fig_hypothetical', 'fig_electoral_system', 'fig_upper_median_immigration', 'fig_lower_median_immigration',
+    'fig_immigrant_voting', 'fig_most', 'fig_least', 'montreal_boroughs_map',
+    'world_immigrants_map', 'fig_connected_dot_plot', 'fig_party_income',
+    'demographics_data', 'election_data', 'keys', 'vote_matrix', 'montreal_boroughs_mapdata', 'world_mapdata', 'countries_of_origin']
+WARM_UP_VALUES += (
+    ['world_immigrants_map_table', 'connected_dot_plot_table', 'party_income_table', 'electoral_system_table'] if CALLBACKS == 'client'
+    else ['party_income_updates', 'electoral_system_updates'])
+if LIVE_RESULTS_URL:
+    WARM_UP_VALUES += ['live_version', *[name for name, _, _ in LIVE_TABLES.values()]]
+
 language_dropdown_options = get_language_dropdown_options()
 
 # ---------- Dash App Setup -----------
@@ -45,283 +151,513 @@ app = dash.Dash(
 server = app.server
 
 # ---------- Layout --------------------
-app.layout = html.Div([
+def serve_layout(get_figure=registry.get):
+    """
+    Build the layout on page load, so that the figures are only built once the server is up.
+    get_figure returns the figure to show for a registered name.
+    """
+    return html.Div([
+
+        # Floating Navbar
+        html.Nav([
+            html.Div([
+                # Left side: Dashboard Title / Branding
+                html.Div("Tableau démographique", className="navbar-brand"),
+
+                # Right side: Any extra nav links or placeholders
+                html.Div([
+                ], className="nav-right")
+            ], className="navbar-container")
+        ], className="navbar"),
 
-    # Floating Navbar
-    html.Nav([
+        # Header
+        html.Header([
+            html.H1('Comment votent vos voisins ?', className='hero-title'),
+            html.H2('Analyse des comportements électoraux et de la diversité culturelle à Montréal', className='hero-subtitle'),
+        ], className='hero-header'),
+
+        # Main container
         html.Div([
-            # Left side: Dashboard Title / Branding
-            html.Div("Tableau démographique", className="navbar-brand"),
 
-            # Right side: Any extra nav links or placeholders
+            # 1. World Immigration Origins
             html.Div([
-            ], className="nav-right")
-        ], className="navbar-container")
-    ], className="navbar"),
+                html.H2('Immigration à Montreal', className='section-title'),
 
-    # Header
-    html.Header([
-        html.H1('Comment votent vos voisins ?', className='hero-title'),
-        html.H2('Analyse des comportements électoraux et de la diversité culturelle à Montréal', className='hero-subtitle'),
-    ], className='hero-header'),
+                html.H3('Répartition des immigrants en ville'),
+                html.P(
+                    """Le Québec compte environ 1,1 million de personnes immigrantes, dont plus de 500 000 vivent sur l’île de Montréal. 
+                    Cela signifie que près de la moitié de la population immigrante de la province est concentrée 
+                    sur un territoire représentant moins de 5% de sa superficie. 
+                    Cette forte densité souligne le rôle central de Montréal comme pôle d’accueil au Québec."""),
+                html.P(
+                    """Plusieurs facteurs expliquent cette répartition : la présence de quartiers multiculturels historiques, 
+                    une offre de logement relativement accessible, des services d’intégration développés et des réseaux 
+                    communautaires bien établis."""),
+                html.P(
+                    "Source : Statistique Canada, Recensement de 2021 — Profil de la population immigrante (tableau 98-10-0439-01).", 
+                    style={"fontSize": "0.8em", "color": "#6c757d", "marginTop": "10px"}),
+                html.P(
+                    """La carte ci-dessous montre la répartition des immigrants selon les circonscriptions électorales de 
+                    l’île de Montréal, avec des zones de forte concentration comme Côte-des-Neiges, Saint-Laurent ou Parc-Extension.
+                    Elle permet de visualiser les contrastes territoriaux et de mieux comprendre la géographie sociale de l’immigration sur l’île."""),
+                html.H2("Carte de la proportion d'immigrants à Montréal", style={'marginTop': '20px', 'textAlign': 'center'}),
+                html.Iframe(src="/assets/immigration_map.html", width="100%", height="600", className='iframe'),
 
-    # Main container
-    html.Div([
+                html.Hr(className='section-divider'),
 
-        # 1. World Immigration Origins
-        html.Div([
-            html.H2('Immigration à Montreal', className='section-title'),
-
-            html.H3('Répartition des immigrants en ville'),
-            html.P(
-                """Le Québec compte environ 1,1 million de personnes immigrantes, dont plus de 500 000 vivent sur l’île de Montréal. 
-                Cela signifie que près de la moitié de la population immigrante de la province est concentrée 
-                sur un territoire représentant moins de 5% de sa superficie. 
-                Cette forte densité souligne le rôle central de Montréal comme pôle d’accueil au Québec."""),
-            html.P(
-                """Plusieurs facteurs expliquent cette répartition : la présence de quartiers multiculturels historiques, 
-                une offre de logement relativement accessible, des services d’intégration développés et des réseaux 
-                communautaires bien établis."""),
-            html.P(
-                "Source : Statistique Canada, Recensement de 2021 — Profil de la population immigrante (tableau 98-10-0439-01).", 
-                style={"fontSize": "0.8em", "color": "#6c757d", "marginTop": "10px"}),
-            html.P(
-                """La carte ci-dessous montre la répartition des immigrants selon les circonscriptions électorales de 
-                l’île de Montréal, avec des zones de forte concentration comme Côte-des-Neiges, Saint-Laurent ou Parc-Extension.
-                Elle permet de visualiser les contrastes territoriaux et de mieux comprendre la géographie sociale de l’immigration sur l’île."""),
-            html.H2("Carte de la proportion d'immigrants à Montréal", style={'marginTop': '20px', 'textAlign': 'center'}),
-            html.Iframe(src="/assets/immigration_map.html", width="100%", height="600", className='iframe'),
+                html.H3('Pays d\'origine'),
+                html.P(
+                    """Cette visualisation met en relation les arrondissements de Montréal avec les principaux pays d’origine de 
+                    leur population immigrante. Elle permet d’explorer la diversité géographique des communautés présentes dans 
+                    chaque secteur de la ville, en offrant une lecture croisée entre territoire local et provenance mondiale."""),
+                html.H4('Cliquez sur un arrondissement !'),
+                html.P(id='current-borough', children='Pays d\'origine : Ville de Montréal'),
+
+                html.H2("Carte des principaux pays d'origine des immigrants des arrondissements de Montréal", style={'marginTop': '20px', 'textAlign': 'center'}),
+                html.Div(className='flex-row', children=[
+                    html.Div(className='four columns', children=[ # Montreal Map
+                        dcc.Graph(id='montreal-immigrants-map', figure=get_figure('montreal_boroughs_map'), style={'justify': 'center'})]),
+                    html.Div(className='eight columns', children=[ # World map
+                        dcc.Graph(id='world-immigrants-map', figure=get_figure('world_immigrants_map'), style={'justify': 'center'})])]),
+            ], className='card',  style={"overflow": "hidden"}),
 
             html.Hr(className='section-divider'),
 
-            html.H3('Pays d\'origine'),
-            html.P(
-                """Cette visualisation met en relation les arrondissements de Montréal avec les principaux pays d’origine de 
-                leur population immigrante. Elle permet d’explorer la diversité géographique des communautés présentes dans 
-                chaque secteur de la ville, en offrant une lecture croisée entre territoire local et provenance mondiale."""),
-            html.H4('Cliquez sur un arrondissement !'),
-            html.P(id='current-borough', children='Ville de Montréal'),
-
-            html.H2("Carte des principaux pays d'origine des immigrants des arrondissements de Montréal", style={'marginTop': '20px', 'textAlign': 'center'}),
-            html.Div(className='flex-row', children=[
-                html.Div(className='four columns', children=[ # Montreal Map
-                    dcc.Graph(id='montreal-immigrants-map', figure=montreal_boroughs_map, style={'justify': 'center'})]),
-                html.Div(className='eight columns', children=[ # World map
-                    dcc.Graph(id='world-immigrants-map', style={'justify': 'center'})])]),
-        ], className='card',  style={"overflow": "hidden"}),
-
-        html.Hr(className='section-divider'),
-
-        # 3. Language Distribution (Montreal)
-        html.Div([
-            html.H2('Répartition des langues à Montréal selon les districtes en fonctionne des gens qui ne parlent ni le français ni l’anglais à la maison', className='section-title'),
-            html.P(
-                """Cette carte montre la répartition des personnes vivant sur l’île de Montréal qui ne parlent ni le français 
-                ni l’anglais à la maison. Bien que leur proportion demeure faible dans l’ensemble, certaines circonscriptions 
-                dépassent les 5 %, notamment dans des secteurs marqués par une forte diversité linguistique."""),
-            html.P(
-                """Cette situation révèle une réalité importante : pour une partie des résidents, les langues officielles 
-                ne sont ni maîtrisées ni utilisées au quotidien, ce qui peut limiter l’accès à l’information, aux soins, 
-                à l’éducation, ainsi qu’à la participation à la vie citoyenne et politique."""),
-            html.P(
-                "Source : Statistique Canada, Recensement de 2021 – Langue parlée à la maison (tableau 98-10-0235-01).",
-                style={"fontSize": "0.8em", "color": "#6c757d", "marginTop": "10px"}),
-            html.H2("Carte de la proportion des personnes qui ne parlent ni le français ni l'anglais à Montréal", style={'marginTop': '20px', 'textAlign': 'center'}),
-            html.Iframe(src="/assets/linguistic_map.html", width="100%", height="600", className='iframe'),
+            # 3. Language Distribution (Montreal)
+            html.Div([
+                html.H2('Répartition des langues à Montréal selon les districtes en fonctionne des gens qui ne parlent ni le français ni l’anglais à la maison', className='section-title'),
+                html.P(
+                    """Cette carte montre la répartition des personnes vivant sur l’île de Montréal qui ne parlent ni le français 
+                    ni l’anglais à la maison. Bien que leur proportion demeure faible dans l’ensemble, certaines circonscriptions 
+                    dépassent les 5 %, notamment dans des secteurs marqués par une forte diversité linguistique."""),
+                html.P(
+                    """Cette situation révèle une réalité importante : pour une partie des résidents, les langues officielles 
+                    ne sont ni maîtrisées ni utilisées au quotidien, ce qui peut limiter l’accès à l’information, aux soins, 
+                    à l’éducation, ainsi qu’à la participation à la vie citoyenne et politique."""),
+                html.P(
+                    "Source : Statistique Canada, Recensement de 2021 – Langue parlée à la maison (tableau 98-10-0235-01).",
+                    style={"fontSize": "0.8em", "color": "#6c757d", "marginTop": "10px"}),
+                html.H2("Carte de la proportion des personnes qui ne parlent ni le français ni l'anglais à Montréal", style={'marginTop': '20px', 'textAlign': 'center'}),
+                html.Iframe(src="/assets/linguistic_map.html", width="100%", height="600", className='iframe'),
 
-            html.Hr(className='section-divider'),
+                html.Hr(className='section-divider'),
 
-            html.H2('Langue et vote au Québec : un lien marqué', className='section-title'),
-            html.P(
-                """Le Québec est une terre d’immigration où se côtoient une grande variété de langues et de cultures.
-                Cette diversité se reflète aussi dans les urnes."""),
-            html.P(
-                """Ce graphique illustre les écarts de vote selon la majorité linguistique des circonscriptions.
-                Là où les francophones sont majoritaires, ce sont la CAQ et le Parti Québécois qui dominent. Dans les circonscriptions
-                anglophones et allophones, c’est le Parti libéral qui l’emporte largement. Québec solidaire, de son côté, tire sa force
-                des zones allophones ou linguistiquement mixtes, où aucun groupe linguistique ne prévaut."""),
-            html.P(
-                """Fait notable : le soutien au Parti conservateur reste relativement stable, peu importe la composition linguistique des circonscriptions."""),
-            dcc.Dropdown(
-                id='language-dropdown',
-                options=language_dropdown_options,
-                value=language_dropdown_options[0],
-                className='custom-dropdown'),
-            dcc.Graph(id='connected-dot-plot', className='graph'),
-        ], className='card', style={"overflow": "hidden"}),
-
-        # 4. Electoral Representation
-        html.Div([
-            html.H2('Analyse de la représentation électorale', className='section-title'),
-            html.P(
-                """Cette section présente plusieurs visualisations en forme de waffle charts, illustrant la 
-                répartition des 125 sièges de l’Assemblée nationale du Québec. Chaque case représente un siège 
-                et est colorée selon le parti politique auquel il appartient. Ces représentations permettent 
-                d’analyser différentes configurations électorales et d’explorer les effets du système majoritaire, 
-                tout en mettant en lumière les liens possibles entre la structure démographique des territoires 
-                et les tendances de vote observées."""),
-            # Example of a flex row with two columns
+                html.H2('Langue et vote au Québec : un lien marqué', className='section-title'),
+                html.P(
+                    """Le Québec est une terre d’immigration où se côtoient une grande variété de langues et de cultures.
+                    Cette diversité se reflète aussi dans les urnes."""),
+                html.P(
+                    """Ce graphique illustre les écarts de vote selon la majorité linguistique des circonscriptions.
+                    Là où les francophones sont majoritaires, ce sont la CAQ et le Parti Québécois qui dominent. Dans les circonscriptions
+                    anglophones et allophones, c’est le Parti libéral qui l’emporte largement. Québec solidaire, de son côté, tire sa force
+                    des zones allophones ou linguistiquement mixtes, où aucun groupe linguistique ne prévaut."""),
+                html.P(
+                    """Fait notable : le soutien au Parti conservateur reste relativement stable, peu importe la composition linguistique des circonscriptions."""),
+                dcc.Dropdown(
+                    id='language-dropdown',
+                    options=language_dropdown_options,
+                    value=language_dropdown_options[0],
+                    clearable=False,
+                    className='custom-dropdown'),
+                dcc.Graph(id='connected-dot-plot', figure=get_figure('fig_connected_dot_plot'), className='graph'),
+            ], className='card', style={"overflow": "hidden"}),
+
+            # 4. Electoral Representation
             html.Div([
-                # Quebec Waffle
+                html.H2('Analyse de la représentation électorale', className='section-title'),
+                html.P(
+                    """Cette section présente plusieurs visualisations en forme de waffle charts, illustrant la 
+                    répartition des 125 sièges de l’Assemblée nationale du Québec. Chaque case représente un siège 
+                    et est colorée selon le parti politique auquel il appartient. Ces représentations permettent 
+                    d’analyser différentes configurations électorales et d’explorer les effets du système majoritaire, 
+                    tout en mettant en lumière les liens possibles entre la structure démographique des territoires 
+                    et les tendances de vote observées."""),
+                # Example of a flex row with two columns
                 html.Div([
-                    html.H3('Représentation électorale au Québec'),
+                    # Quebec Waffle
+                    html.Div([
+                        html.H3('Représentation électorale au Québec'),
+                        html.P(
+                            """Le résultat électoral à l’échelle provinciale révèle une nette domination de la 
+                            Coalition Avenir Québec (CAQ), qui occupe une large majorité des sièges à l’Assemblée 
+                            nationale. Cette surreprésentation reflète les effets du système électoral majoritaire 
+                            uninominal à un tour, qui favorise fortement le parti en tête, même lorsque le vote 
+                            populaire est plus partagé entre plusieurs formations politiques (élections 2022)."""),
+                        dcc.Graph(figure=get_figure('fig_quebec'), className='graph', id='waffle_quebec')
+                    ], className='card flex-child'),
+
+                    # Montreal Waffle
+                    html.Div([
+                        html.H3('Représentation électorale à Montréal'),
+                        html.P(
+                            """Sur l’île de Montréal, la répartition des sièges reflète une plus grande diversité 
+                            politique, dominée par le Parti libéral du Québec (PLQ) et Québec solidaire (QS), avec 
+                            une faible présence de la CAQ. Cette tendance s’explique en partie par un électorat urbain 
+                            plus progressiste, jeune et fortement marqué par l’immigration et la diversité culturelle, 
+                            des facteurs qui influencent significativement les choix électoraux (élections 2022)."""),
+                        dcc.Graph(figure=get_figure('fig_montreal'), className='graph', id='waffle_montreal')
+                    ], className='card flex-child'),
+
+
+                # Seat projection
+                html.Div([
+                    html.H3('Projection des sièges'),
                     html.P(
-                        """Le résultat électoral à l’échelle provinciale révèle une nette domination de la 
-                        Coalition Avenir Québec (CAQ), qui occupe une large majorité des sièges à l’Assemblée 
-                        nationale. Cette surreprésentation reflète les effets du système électoral majoritaire 
-                        uninominal à un tour, qui favorise fortement le parti en tête, même lorsque le vote 
-                        populaire est plus partagé entre plusieurs formations politiques (élections 2022)."""),
-                    dcc.Graph(figure=fig_quebec, className='graph')
-                ], className='card flex-child'),
-
-                # Montreal Waffle
+                        """Ce résultat aurait-il pu être différent ? En simulant 100 000 élections où les votes de chaque 
+                        circonscription varient autour des résultats de 2022, avec des variations communes à tout le Québec 
+                        et à chaque région, on obtient la probabilité de chaque parti de remporter chaque siège, ainsi que 
+                        la distribution de son nombre de sièges."""),
+                    html.Div([
+                        html.H4('Incertitude :'),
+                        dcc.RadioItems(
+                            id='projection-uncertainty',
+                            options=uncertainty_options,
+                            value='medium',
+                            inline=True
+                        )
+                    ], className='row'),
+                    dcc.Graph(figure=get_figure('fig_projection_waffle'), className='graph', id='waffle_projection'),
+                    dcc.Graph(figure=get_figure('fig_seat_histogram'), className='graph', id='seat-histogram')
+                ], className='card'),
+
+                # Another row for the next two
+                # Hypothetical Electoral Scenario
                 html.Div([
-                    html.H3('Représentation électorale à Montréal'),
+                    html.H3('Et si seule Montréal votait ?'),
                     html.P(
-                        """Sur l’île de Montréal, la répartition des sièges reflète une plus grande diversité 
-                        politique, dominée par le Parti libéral du Québec (PLQ) et Québec solidaire (QS), avec 
-                        une faible présence de la CAQ. Cette tendance s’explique en partie par un électorat urbain 
-                        plus progressiste, jeune et fortement marqué par l’immigration et la diversité culturelle, 
-                        des facteurs qui influencent significativement les choix électoraux (élections 2022)."""),
-                    dcc.Graph(figure=fig_montreal, className='graph', id='waffle_montreal')
-                ], className='card flex-child'),
-
-
-            # Another row for the next two
-            # Hypothetical Electoral Scenario
-            html.Div([
-                html.H3('Et si seule Montréal votait ?'),
-                html.P(
-                    """En imaginant que l’ensemble du Québec adopte les tendances de vote observées à Montréal, 
-                    la composition de l’Assemblée nationale serait transformée, avec une présence renforcée 
-                    des partis progressistes. Ce scénario révèle un décalage important entre les milieux urbains 
-                    et les régions rurales, en partie lié à la diversité culturelle, à l’immigration et aux 
-                    réalités sociales propres aux centres urbains. Il met aussi en évidence les limites d’un 
-                    système électoral qui peine à refléter la pluralité des voix à l’échelle provinciale."""),
-                dcc.Graph(figure=fig_hypothetical, className='graph')
-            ], className='card'),
-
-            # Upper median immigration districts
-            html.Div([
-                html.H3('Circonscriptions avec le plus d\'immigration'),
-                html.P('Immigration supérieure à la médiane'),
-                html.P(
-                    """Cette visualisation met en lumière les circonscriptions montréalaises où la proportion 
-                    d’immigrants est supérieure à la médiane. Ces zones, souvent caractérisées par une forte 
-                    diversité culturelle et linguistique, sont des lieux de rencontre et d’échange, mais aussi 
-                    de défis en matière d’intégration et de représentation politique."""),
-                dcc.Graph(figure=fig_upper_median_immigration, className='graph')
-            ], className='card'),
+                        """En imaginant que l’ensemble du Québec adopte les tendances de vote observées à Montréal, 
+                        la composition de l’Assemblée nationale serait transformée, avec une présence renforcée 
+                        des partis progressistes. Ce scénario révèle un décalage important entre les milieux urbains 
+                        et les régions rurales, en partie lié à la diversité culturelle, à l’immigration et aux 
+                        réalités sociales propres aux centres urbains. Il met aussi en évidence les limites d’un 
+                        système électoral qui peine à refléter la pluralité des voix à l’échelle provinciale."""),
+                    html.P(
+                        """Les contrôles ci-dessous permettent d’explorer d’autres scénarios : rapprocher plus ou moins 
+                        le vote de chaque circonscription du profil de Montréal, ou transférer des votes d’un parti à 
+                        un autre, uniformément (en points) ou proportionnellement (en % des votes du parti)."""),
+                    html.Div([
+                        html.H4('Scénario :'),
+                        dcc.RadioItems(
+                            id='scenario',
+                            options=scenario_options,
+                            value='montreal',
+                            inline=True
+                        ),
+                        dcc.Dropdown(
+                            id='scenario-source',
+                            options=party_dropdown_options,
+                            value='C.A.Q.-E.F.L.',
+                            clearable=False,
+                            className='custom-dropdown'
+                        ),
+                        dcc.Dropdown(
+                            id='scenario-target',
+                            options=party_dropdown_options,
+                            value='P.L.Q./Q.L.P.',
+                            clearable=False,
+                            className='custom-dropdown'
+                        ),
+                        dcc.Slider(
+                            id='scenario-amount',
+                            min=0,
+                            max=100,
+                            step=1,
+                            value=100,
+                            marks={i: str(i) for i in range(0, 101, 25)},
+                            updatemode='drag'
+                        )
+                    ], className='row'),
+                    dcc.Graph(figure=get_figure('fig_hypothetical'), className='graph', id='waffle_hypothetical')
+                ], className='card'),
+
+                # Alternative electoral systems
+                html.Div([
+                    html.H3('Et avec un autre mode de scrutin ?'),
+                    html.P(
+                        """Avec les mêmes votes, la composition de l’Assemblée nationale dépend du mode de scrutin. 
+                        Une proportionnelle répartit les sièges selon les votes obtenus par chaque parti, à l’échelle du 
+                        Québec ou de chaque région, au-dessus d’un seuil minimal. Un mode mixte compensatoire conserve 
+                        des sièges de circonscription, et attribue les sièges de liste de façon à corriger les écarts."""),
+                    html.Div([
+                        html.H4('Mode de scrutin :'),
+                        dcc.RadioItems(
+                            id='electoral-system',
+                            options=electoral_system_options,
+                            value='mmp',
+                            inline=True
+                        ),
+                        dcc.RadioItems(
+                            id='electoral-system-grouping',
+                            options=grouping_options,
+                            value='subsets',
+                            inline=True
+                        ),
+                        dcc.RadioItems(
+                            id='electoral-system-threshold',
+                            options=threshold_options,
+                            value=10,
+                            inline=True
+                        )
+                    ], className='row'),
+                    dcc.Graph(figure=get_figure('fig_electoral_system'), className='graph', id='waffle_electoral_system')
+                ], className='card'),
+
+                # Upper median immigration districts
+                html.Div([
+                    html.H3('Circonscriptions avec le plus d\'immigration'),
+                    html.P('Immigration supérieure à la médiane'),
+                    html.P(
+                        """Cette visualisation met en lumière les circonscriptions montréalaises où la proportion 
+                        d’immigrants est supérieure à la médiane. Ces zones, souvent caractérisées par une forte 
+                        diversité culturelle et linguistique, sont des lieux de rencontre et d’échange, mais aussi 
+                        de défis en matière d’intégration et de représentation politique."""),
+                    dcc.Graph(figure=get_figure('fig_upper_median_immigration'), className='graph', id='waffle_upper_median_immigration')
+                ], className='card'),
+
+                # Lower median immigration districts
+                html.Div([
+                    html.H3('Circonscriptions avec le moins d\'immigration'),
+                    html.P('Immigration inférieure à la médiane'),
+                    html.P(
+                        """Cette visualisation met au contraire en lumière les circonscriptions montréalaises où la proportion 
+                        d’immigrants est inférieure à la médiane. Ces zones, souvent plus homogènes sur le plan 
+                        culturel et linguistique, peuvent présenter des défis bien différents en matière d’intégration 
+                        des nouveaux arrivants."""),
+                    dcc.Graph(figure=get_figure('fig_lower_median_immigration'), className='graph', id='waffle_lower_median_immigration')
+                ], className='card'),
+
+                # Immigration and Voter Participation
+                html.Div([
+                    html.H3('Immigration et taux de participation électorale'),
+                    html.P(
+                        """Le taux de participation électorale tend à diminuer légèrement dans les circonscriptions 
+                        où la proportion d’immigrants est plus élevée. Cette tendance, bien que non systématique, 
+                        reflète des dynamiques sociales complexes liées à l’intégration et à la représentation politique."""),
+                    dcc.Graph(id='immigrant-voting-scatter', figure=get_figure('fig_immigrant_voting'), className='graph')
+                ], className='card'),
 
-            # Lower median immigration districts
-            html.Div([
-                html.H3('Circonscriptions avec le moins d\'immigration'),
-                html.P('Immigration inférieure à la médiane'),
-                html.P(
-                    """Cette visualisation met au contraire en lumière les circonscriptions montréalaises où la proportion 
-                    d’immigrants est inférieure à la médiane. Ces zones, souvent plus homogènes sur le plan 
-                    culturel et linguistique, peuvent présenter des défis bien différents en matière d’intégration 
-                    des nouveaux arrivants."""),
-                dcc.Graph(figure=fig_lower_median_immigration, className='graph')
-            ], className='card'),
 
-            # Immigration and Voter Participation
-            html.Div([
-                html.H3('Immigration et taux de participation électorale'),
-                html.P(
-                    """Le taux de participation électorale tend à diminuer légèrement dans les circonscriptions 
-                    où la proportion d’immigrants est plus élevée. Cette tendance, bien que non systématique, 
-                    reflète des dynamiques sociales complexes liées à l’intégration et à la représentation politique."""),
-                dcc.Graph(figure=fig_immigrant_voting, className='graph')
+                # 4.5 Party Support by Income
+                html.Div([
+                    html.H3('Soutien électoral par niveau de revenu'),
+                    html.P(
+                        """Cette visualisation interactive permet d’explorer la relation entre le revenu médian 
+                        des ménages et le soutien électoral selon le parti sélectionné. Elle met en évidence certaines 
+                        tendances, notamment le lien entre le niveau de revenu d’une circonscription et l’adhésion 
+                        à un parti, offrant un aperçu des profils socio-économiques associés aux préférences politiques."""),
+                    html.Div([
+                        html.H4('Sélectionnez un parti politique :'),
+                        dcc.Dropdown(
+                            id='party-dropdown',
+                            options=party_dropdown_options,
+                            value='Q.S.',
+                            clearable=False,
+                            className='custom-dropdown'
+                        )
+                    ], className='row'),
+
+                    html.Div(
+                        dcc.Graph(id='party-income-chart', figure=get_figure('fig_party_income'), className='graph'),
+                        id='income-chart-container',
+                        className='graph-container row'
+                    )
+                ], className='card'),]),
             ], className='card'),
 
+            html.Hr(className='section-divider'),
 
-            # 4.5 Party Support by Income
+            # 5. Voting Patterns (Stacked Bar)
             html.Div([
-                html.H3('Soutien électoral par niveau de revenu'),
+                html.H2('Comportements de vote en fonction du taux d\'immigration', className='section-title'),
                 html.P(
-                    """Cette visualisation interactive permet d’explorer la relation entre le revenu médian 
-                    des ménages et le soutien électoral selon le parti sélectionné. Elle met en évidence certaines 
-                    tendances, notamment le lien entre le niveau de revenu d’une circonscription et l’adhésion 
-                    à un parti, offrant un aperçu des profils socio-économiques associés aux préférences politiques."""),
+                    """Le contraste entre les circonscriptions à faible et forte immigration révèle une polarisation des 
+                    préférences électorales. La CAQ domine dans les zones moins diversifiées, tandis que le vote est plus 
+                    fragmenté dans les secteurs à forte immigration, avec une présence marquée du PLQ et de Québec solidaire. 
+                    Ces résultats montrent que la composition démographique influence directement les dynamiques politiques 
+                    locales : la diversité culturelle, linguistique et socio-économique façonne les priorités électorales 
+                    et les comportements politiques à l’échelle des territoires."""),
                 html.Div([
-                    html.H4('Sélectionnez un parti politique :'),
-                    dcc.Dropdown(
-                        id='party-dropdown',
-                        options=[
-                            {'label': 'Québec Solidaire', 'value': 'Q.S.'},
-                            {'label': 'Parti Libéral du Québec', 'value': 'P.L.Q./Q.L.P.'},
-                            {'label': 'Coalition Avenir Québec', 'value': 'C.A.Q.-E.F.L.'},
-                            {'label': 'Parti Québécois', 'value': 'P.Q.'}
-                        ],
-                        value='Q.S.',
-                        className='custom-dropdown'
-                    )
-                ], className='row'),
-
-                html.Div(
-                    id='income-chart-container',
-                    className='graph-container row'
-                )
-            ], className='card'),]),
-        ], className='card'),
+                    html.H3('Circonscriptions avec le plus haut taux d\'immigration'),
+                    dcc.Graph(id='stacked-bar-most', figure=get_figure('fig_most'), className='graph')
+                ], className='card'),
 
-        html.Hr(className='section-divider'),
-
-        # 5. Voting Patterns (Stacked Bar)
-        html.Div([
-            html.H2('Comportements de vote en fonction du taux d\'immigration', className='section-title'),
-            html.P(
-                """Le contraste entre les circonscriptions à faible et forte immigration révèle une polarisation des 
-                préférences électorales. La CAQ domine dans les zones moins diversifiées, tandis que le vote est plus 
-                fragmenté dans les secteurs à forte immigration, avec une présence marquée du PLQ et de Québec solidaire. 
-                Ces résultats montrent que la composition démographique influence directement les dynamiques politiques 
-                locales : la diversité culturelle, linguistique et socio-économique façonne les priorités électorales 
-                et les comportements politiques à l’échelle des territoires."""),
-            html.Div([
-                html.H3('Circonscriptions avec le plus haut taux d\'immigration'),
-                dcc.Graph(figure=fig_most, className='graph')
+                html.Div([
+                    html.H3('Circonscriptions avec le plus faible taux d\'immigration'),
+                    dcc.Graph(id='stacked-bar-least', figure=get_figure('fig_least'), className='graph')
+                ], className='card')
             ], className='card'),
-
-            html.Div([
-                html.H3('Circonscriptions avec le plus faible taux d\'immigration'),
-                dcc.Graph(figure=fig_least, className='graph')
-            ], className='card')
-        ], className='card'),
-    ], className='dashboard-container'),
-
-    # Footer
-    html.Footer([
-        html.P("© 2025 My Dashboard, Inc."),
-        html.A("Privacy Policy", href="#"),
-        html.A("Terms of Service", href="#")
-    ], className="page-footer"),
-
-], className='body-wrapper')  # outermost container
+        ], className='dashboard-container'),
+
+        # Tables of the clientside callbacks
+        *([
+            dcc.Store(id='world-immigrants-map-table', data=get_figure('world_immigrants_map_table')),
+        ] if CALLBACKS == 'client' else []),
+        # Also updated by the live results
+        *([
+            dcc.Store(id=store_id, data=get_figure(name) if CALLBACKS == 'client' else None)
+            for store_id, (name, _, _) in LIVE_TABLES.items()
+        ] if CALLBACKS == 'client' or LIVE_RESULTS_URL else []),
+
+        # Live results : the browsers poll for the updates of the figures (c.f. src/live.py)
+        *([
+            dcc.Interval(id='live-interval', interval=LIVE_INTERVAL * 1000),
+            dcc.Store(id='live-version', data=get_figure('live_version')),
+        ] if LIVE_RESULTS_URL else []),
+
+        # Footer
+        html.Footer([
+            html.P("© 2025 My Dashboard, Inc."),
+            html.A("Privacy Policy", href="#"),
+            html.A("Terms of Service", href="#")
+        ], className="page-footer"),
+
+    ], className='body-wrapper')  # outermost container
+
+# Dash validates the callbacks against this layout, so it does not need to build the real one at startup.
+# Building it also lists the registered values read by the layout
+LAYOUT_VALUES = []
+app.validation_layout = serve_layout(get_figure=lambda name: LAYOUT_VALUES.append(name))
+app.layout = serve_layout
+
+
+def get_layout_version():
+    """
+    Versions of the values read by the layout (c.f. registry.get_versions) : building or replacing any other value
+    (e.g. the figure updates of a callback) does not make the cached layout stale.
+    """
+    return registry.get_versions(LAYOUT_VALUES)
+
+# Serve /_dash-layout from a precompressed cache, rebuilt only when a figure or a dataset of the layout changes
+install_layout_cache(app, get_layout_version)
+install_memory_report(server)
+if LIVE_RESULTS_URL:
+    install_live_updates(server)
 
 # ---------- Callbacks ----------
+# The figures are already in the layout, so the callbacks only update them, and skip the initial call
+if CALLBACKS == 'client':
+    app.clientside_callback(
+        ClientsideFunction(namespace='figures', function_name='update_party_income_chart'),
+        Output('party-income-chart', 'figure'),
+        Input('party-dropdown', 'value'),
+        State('party-income-table', 'data'),
+        State('party-income-chart', 'figure'),
+        prevent_initial_call=True)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='figures', function_name='update_world_immigrants_map'),
+        Output('world-immigrants-map', 'figure'),
+        Output('current-borough', 'children'),
+        Input('montreal-immigrants-map', 'clickData'),
+        State('world-immigrants-map-table', 'data'),
+        State('world-immigrants-map', 'figure'),
+        prevent_initial_call=True)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='figures', function_name='update_language_dot_plot'),
+        Output('connected-dot-plot', 'figure'),
+        Input('language-dropdown', 'value'),
+        State('connected-dot-plot-table', 'data'),
+        State('connected-dot-plot', 'figure'),
+        prevent_initial_call=True)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='figures', function_name='update_electoral_system_waffle'),
+        Output('waffle_electoral_system', 'figure'),
+        Input('electoral-system', 'value'),
+        Input('electoral-system-grouping', 'value'),
+        Input('electoral-system-threshold', 'value'),
+        State('electoral-system-table', 'data'),
+        State('waffle_electoral_system', 'figure'),
+        prevent_initial_call=True)
+
+else:
+    # Partial updates (Patch), c.f. src/patches.py
+    # Identical concurrent requests (e.g. many users picking the same party at once) share a single computation
+    @app.callback(
+        Output('party-income-chart', 'figure'),
+        Input('party-dropdown', 'value'),
+        prevent_initial_call=True
+    )
+    @single_flight
+    def update_party_income_chart(party):
+        return to_patch(registry.get('party_income_updates')(party))
+
+    @app.callback(
+        Output(component_id='world-immigrants-map', component_property='figure'),
+        Output(component_id='current-borough', component_property='children'),
+        Input(component_id='montreal-immigrants-map', component_property='clickData'),
+        prevent_initial_call=True)
+    @single_flight
+    def update_world_immigrants_map(clickdata):
+        updates, borough = get_world_immigrants_map_updates(
+            registry.get('montreal_boroughs_mapdata'), registry.get('countries_of_origin'), clickdata)
+        return to_patch(updates), borough
+
+    @app.callback(
+        Output(component_id='connected-dot-plot', component_property='figure'),
+        Input(component_id='language-dropdown', component_property='value'),
+        prevent_initial_call=True)
+    @single_flight
+    def update_language_dot_plot(lang_option):
+        return to_patch(get_connected_dot_plot_updates(registry.get('connected_dot_plots'), lang_option))
+
+    @app.callback(
+        Output('waffle_electoral_system', 'figure'),
+        Input('electoral-system', 'value'),
+        Input('electoral-system-grouping', 'value'),
+        Input('electoral-system-threshold', 'value'),
+        prevent_initial_call=True)
+    @single_flight
+    def update_electoral_system_waffle(system, grouping, threshold):
+        return to_patch(registry.get('electoral_system_updates')(system, grouping, threshold))
+
+# The scenarios are computed on the server in both modes : a swing of the whole vote matrix is a few array operations,
+# well under the time between two positions of the slider (c.f. src/scenarios.py)
 @app.callback(
-    Output('income-chart-container', 'children'),
-    Input('party-dropdown', 'value')
-)
-def update_party_income_chart(party):
-    fig = get_party_income_relation(demographics_data, election_data, party)
-    return dcc.Graph(figure=fig, className='graph')
-
-@app.callback(
-    Output(component_id='world-immigrants-map', component_property='figure'),
-    Output(component_id='current-borough', component_property='children'),
-    Input(component_id='montreal-immigrants-map', component_property='clickData'))
-def update_world_immigrants_map(clickdata):
-    fig, borough = get_world_immigrants_map(montreal_boroughs_mapdata, world_mapdata, borough_df, clickdata)
-    return fig, borough
-
+    Output('waffle_hypothetical', 'figure'),
+    Input('scenario', 'value'),
+    Input('scenario-amount', 'value'),
+    Input('scenario-source', 'value'),
+    Input('scenario-target', 'value'),
+    prevent_initial_call=True)
+@single_flight
+def update_hypothetical_waffle(scenario, amount, source, target):
+    return to_patch(get_hypothetical_waffle_updates(
+        registry.get('vote_matrix'), registry.get('waffle_subsets'), scenario, amount, source, target))
+
+# Each uncertainty level is simulated at warm-up (c.f. gunicorn.conf.py), then read from the cache :
+# a request only simulates in its own process, if the results changed since (c.f. src/montecarlo.py)
 @app.callback(
-    Output(component_id='connected-dot-plot', component_property='figure'),
-    Input(component_id='language-dropdown', component_property='value'))
-def update_language_dot_plot(lang_option):
-    fig = create_interactive_connected_dot_plot(demographics_data, election_data, lang_option)
-    return fig
+    Output('waffle_projection', 'figure'),
+    Output('seat-histogram', 'figure'),
+    Input('projection-uncertainty', 'value'),
+    prevent_initial_call=True)
+@single_flight
+def update_seat_projection(uncertainty):
+    vote_matrix = registry.get('vote_matrix')
+    projection = get_seat_projection(vote_matrix, uncertainty)
+    return get_projection_waffle_chart(vote_matrix, registry.get('waffle_subsets'), projection), get_seat_histogram(projection)
+
+if LIVE_RESULTS_URL:
+    # Fetches the updates of the live figures, and applies the newest ones
+    app.clientside_callback(
+        ClientsideFunction(namespace='live', function_name='update_figures'),
+        Output('live-version', 'data'),
+        *[output for store_id, (_, graph_id, _) in LIVE_TABLES.items()
+          for output in (Output(store_id, 'data'), Output(graph_id, 'figure', allow_duplicate=True))],
+        *[Output(graph_id, 'figure') for graph_id in LIVE_FIGURES],
+        Input('live-interval', 'n_intervals'),
+        State('live-version', 'data'),
+        *[State(graph_id, 'figure') for _, graph_id, _ in LIVE_TABLES.values()],
+        *[State(component_id, 'value') for _, _, selections in LIVE_TABLES.values() for component_id in selections],
+        *[State(graph_id, 'figure') for graph_id in LIVE_FIGURES],
+        prevent_initial_call=True)
 
 if __name__ == '__main__':
+    # With the debug reloader, only the child process actually serving the requests warms up
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        registry.warm_up_in_background(WARM_UP_VALUES)
+        if LIVE_RESULTS_URL:
+            start_polling(LIVE_RESULTS_URL, interval=LIVE_INTERVAL, warm_up_values=LAYOUT_VALUES)
     app.run(debug=True)
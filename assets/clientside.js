@@ -0,0 +1,67 @@
+// Clientside callbacks, used when the app runs with CALLBACKS=client (c.f. app.py).
+// Every interaction only looks up figure updates precomputed on the server and shipped once in a dcc.Store,
+// so clicking and changing selections never reaches the server.
+
+// Apply [path, value] updates (c.f. src/patches.py) to a figure, without modifying it.
+// Only the objects along each path are copied : the rest (e.g. the map geometry) is shared with the previous figure.
+function applyFigureUpdates(figure, updates) {
+    const root = {...figure};
+    for (const [path, value] of updates) {
+        let target = root;
+        for (let i = 0; i < path.length - 1; i++) {
+            const child = target[path[i]];
+            target[path[i]] = Array.isArray(child) ? [...child] : {...child};
+            target = target[path[i]];
+        }
+        target[path[path.length - 1]] = value;
+    }
+    return root;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    figures: {
+        update_world_immigrants_map: function(clickData, table, figure) {
+            const borough = table.boroughs[clickData.points[0].pointNumber];
+            return [applyFigureUpdates(figure, table.updates[borough]), table.titles[borough]];
+        },
+        update_language_dot_plot: function(option, table, figure) {
+            return applyFigureUpdates(figure, table[option]);
+        },
+        update_party_income_chart: function(party, table, figure) {
+            return applyFigureUpdates(figure, table[party]);
+        },
+        update_electoral_system_waffle: function(system, grouping, threshold, table, figure) {
+            return applyFigureUpdates(figure, table[[system, grouping, threshold].join('/')]);
+        }
+    },
+    // Live results, c.f. src/live.py
+    live: {
+        // states : the figure of every table, the values of their selection components, then the live figures (c.f. LIVE_TABLES)
+        update_figures: async function(n, version, ...states) {
+            const response = await fetch('/_live?since=' + version.join('-'));
+            if (response.status !== 200) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            const live = await response.json();
+            // Another worker may be a few seconds behind : only move forward
+            const newer = live.version[0] > version[0] || (live.version[0] === version[0] && live.version[1] > version[1]);
+            if (!newer) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            // Every table, and the figure of its current selection
+            const tables = [];
+            let i = live.tables.length;
+            live.tables.forEach(([storeId, nSelections, table], t) => {
+                const updates = table[states.slice(i, i + nSelections).join('/')];
+                i += nSelections;
+                tables.push(table, updates ? applyFigureUpdates(states[t], updates) : window.dash_clientside.no_update);
+            });
+            const figures = states.slice(i);
+            return [
+                live.version,
+                ...tables,
+                ...live.figures.map(([graphId, updates], j) => applyFigureUpdates(figures[j], updates))
+            ];
+        }
+    }
+});
@@ -0,0 +1,48 @@
+"""
+Production serving with gunicorn :
+
+    gunicorn -c gunicorn.conf.py
+
+The app, its datasets, its figures and the serialized layout are loaded once in the master,
+and the workers inherit them through fork. Since every object is frozen before forking and the map data
+holds its coordinates in numpy arrays, the inherited pages stay shared instead of being copied by each worker.
+Set WEB_CONCURRENCY to change the number of workers, and THREADS the number of threads of each one. The memory usage of every worker is logged
+when it starts, and reported by http://127.0.0.1:8050/_memory.
+Set LIVE_RESULTS_URL to poll a results feed on election night (c.f. src/live.py).
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'app:server'
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threaded workers (gthread) : the shared data is never modified by the callbacks, and identical concurrent
+# callbacks share a single computation (c.f. src/singleflight.py)
+threads = int(os.environ.get('THREADS', 4))
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master, after the app was preloaded and before the workers are forked
+    import app
+    from src import registry, serving
+    from src.layout_cache import get_layout_entry
+    from src.montecarlo import warm_up_seat_projections
+
+    # Every uncertainty level of the seat projection, simulated on all the cores before forking
+    warm_up_seat_projections(registry.get('vote_matrix'))
+    timings = registry.warm_up(app.WARM_UP_VALUES)
+    get_layout_entry(app.app, app.get_layout_version)
+    serving.freeze_shared_state()
+    server.log.info('Preloaded %d values in %.2f s', len(timings), sum(timings.values()))
+    server.log.info('Master %s', serving.format_memory_usage())
+
+
+def post_worker_init(worker):
+    import app
+    from src import live, serving
+
+    worker.log.info('Worker %s', serving.format_memory_usage())
+    # Threads do not survive the fork : every worker polls the live results itself (c.f. src/live.py)
+    if app.LIVE_RESULTS_URL:
+        live.start_polling(app.LIVE_RESULTS_URL, interval=app.LIVE_INTERVAL, warm_up_values=app.LAYOUT_VALUES)
@@ -0,0 +1,229 @@
+import hashlib
+import inspect
+import json
+import os
+import os.path as osp
+import pickle
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIRPATH = '.cache'
+
+
+def fingerprint(paths: list, functions: list=()):
+    """
+    Compute a short fingerprint of the given source files and of the code of the given functions.
+    Any change to the content of a file or to the source of a function changes the fingerprint.
+
+    Args:
+        paths (list): Paths of the source files (e.g. the raw CSV).
+        functions (list): Functions or modules whose source code takes part in the fingerprint (e.g. the cleaning function).
+
+    Returns:
+        str: Hexadecimal fingerprint.
+    """
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    for fn in functions:
+        h.update(inspect.getsource(fn).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def save_frame(df: pd.DataFrame, dirpath: str):
+    """
+    Save a dataframe as a set of .npy files, one per column, plus a small JSON metadata file.
+    Columns are addressed by position, so duplicated column names are kept as is.
+
+    Object columns must contain either only strings or only numbers.
+    They are stored as fixed-width unicode or float64 arrays, and turned back into object columns on load.
+    """
+    columns = []
+    os.makedirs(dirpath)
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i].to_numpy()
+        kind = values.dtype.str
+        if values.dtype == object:
+            if all(isinstance(v, str) for v in values):
+                values, kind = values.astype(str), 'object-str'
+            else:
+                try:
+                    values, kind = values.astype(np.float64), 'object-float'
+                except (TypeError, ValueError):
+                    raise ValueError(f'Cannot cache column {df.columns[i]!r}: mixed object values')
+        np.save(osp.join(dirpath, f'{i:04d}.npy'), values, allow_pickle=False)
+        columns.append({'name': df.columns[i], 'kind': kind})
+
+    with open(osp.join(dirpath, 'meta.json'), 'w', encoding='utf-8') as f:
+        # The default RangeIndex is not stored, it is rebuilt on load
+        index = None if df.index.equals(pd.RangeIndex(len(df))) else df.index.tolist()
+        json.dump({'columns': columns, 'index': index}, f)
+
+
+def load_frame(dirpath: str, mmap_mode: str=None):
+    """
+    Load a dataframe saved with save_frame.
+
+    Args:
+        dirpath (str): Directory written by save_frame.
+        mmap_mode (str): Passed to np.load, e.g. 'r' to memory-map the numeric columns.
+
+    Returns:
+        pd.DataFrame: The dataframe, with the same columns, dtypes and index as the saved one.
+    """
+    with open(osp.join(dirpath, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    data = {}
+    for i, col in enumerate(meta['columns']):
+        values = np.load(osp.join(dirpath, f'{i:04d}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+        if col['kind'].startswith('object'):
+            values = values.astype(object)
+        data[i] = values
+
+    df = pd.DataFrame(data, index=meta['index'])
+    df.columns = [col['name'] for col in meta['columns']]
+    return df
+
+
+def cached_frame(name: str, path: str, build_fn, depends: list=(), sources: list=()):
+    """
+    Return the dataframe built by build_fn(path), going through the on-disk cache.
+    The cache entry is keyed by a fingerprint of the source file and of the source of build_fn,
+    so it is rebuilt automatically whenever either of them changes.
+
+    Args:
+        name (str): Name of the dataset, used for the cache directory.
+        path (str): Path of the source file, passed to build_fn.
+        build_fn (callable): Function loading and cleaning the source file.
+        depends (list): Other functions or modules used by build_fn, whose source also takes part in the fingerprint.
+        sources (list): Other files read by build_fn (e.g. a schema), whose content also takes part in the fingerprint.
+
+    Returns:
+        pd.DataFrame: The cleaned dataframe.
+    """
+    key = fingerprint([path, *sources], [build_fn, *depends])
+    dirpath = osp.join(CACHE_DIRPATH, f'{name}-{key}')
+    if osp.isdir(dirpath):
+        return load_frame(dirpath)
+
+    df = build_fn(path)
+    _publish(name, dirpath, lambda tmp_path: save_frame(df, tmp_path))
+    return df
+
+
+def cached_object(name: str, path: str, build_fn, depends: list=()):
+    """
+    Same as cached_frame, for any picklable object (e.g. the cleaned GeoJSON map data).
+    The object is stored as a single pickle file, which loads much faster than the source JSON.
+
+    Args:
+        name (str): Name of the artifact, used for the cache file.
+        path (str): Path of the source file, passed to build_fn.
+        build_fn (callable): Function loading and cleaning the source file.
+        depends (list): Other functions or modules used by build_fn, whose source also takes part in the fingerprint.
+
+    Returns:
+        object: The object returned by build_fn.
+    """
+    key = fingerprint([path], [build_fn, *depends])
+    fpath = osp.join(CACHE_DIRPATH, f'{name}-{key}.pickle')
+    if osp.isfile(fpath):
+        with open(fpath, 'rb') as f:
+            return pickle.load(f)
+
+    obj = build_fn(path)
+
+    def dump(tmp_path):
+        os.makedirs(CACHE_DIRPATH, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    _publish(name, fpath, dump)
+    return obj
+
+
+def cached_result(name: str, params: dict, build_fn, depends: list=(), keep: int=16):
+    """
+    Return build_fn(**params), going through the on-disk cache, keyed by a hash of the parameters
+    and of the source of build_fn, for results computed from parameters rather than from a file (e.g. a simulation).
+    Unlike cached_object, the entries of other parameters are kept, up to the keep most recent ones.
+
+    Args:
+        name (str): Name of the result, used for the cache files.
+        params (dict): Keyword arguments of build_fn : JSON-serializable values, which may contain numpy arrays.
+        build_fn (callable): Function computing the result.
+        depends (list): Other functions or modules used by build_fn, whose source also takes part in the hash.
+        keep (int): Number of entries of that name kept in the cache.
+
+    Returns:
+        object: The object returned by build_fn, which must be picklable.
+    """
+    def digest_array(value):
+        # Arrays, even nested in other values (e.g. the rings of decoded map data), are hashed by content
+        if not isinstance(value, np.ndarray):
+            raise TypeError(f'Cannot hash a parameter of type {type(value).__name__}')
+        return hashlib.sha256(f'{value.dtype.str}{value.shape}'.encode('utf-8') + np.ascontiguousarray(value).tobytes()).hexdigest()
+
+    h = hashlib.sha256()
+    for key in sorted(params):
+        h.update(key.encode('utf-8'))
+        h.update(json.dumps(params[key], sort_keys=True, default=digest_array).encode('utf-8'))
+    for fn in [build_fn, *depends]:
+        h.update(inspect.getsource(fn).encode('utf-8'))
+    fpath = osp.join(CACHE_DIRPATH, f'{name}-{h.hexdigest()[:16]}.pickle')
+    if osp.isfile(fpath):
+        with open(fpath, 'rb') as f:
+            return pickle.load(f)
+
+    obj = build_fn(**params)
+
+    def dump(tmp_path):
+        os.makedirs(CACHE_DIRPATH, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    _publish(name, fpath, dump, keep=keep)
+    return obj
+
+
+def _publish(name: str, path: str, write_fn, keep: int=1):
+    """
+    Write a cache entry through write_fn in a private temporary path, then rename it to its final path,
+    so that concurrent workers never see a partial entry. Stale entries of the same name are then dropped,
+    except the keep - 1 most recent ones.
+    Errors (read-only filesystem, another process won the race) are ignored: the caller still has its data.
+    """
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    try:
+        write_fn(tmp_path)
+        os.rename(tmp_path, path)
+    except OSError:
+        if osp.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif osp.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    # Another worker may be dropping the same stale entries : the ones already gone are skipped
+    stale_paths = []
+    for fname in os.listdir(CACHE_DIRPATH):
+        if re.fullmatch(re.escape(name) + r'-[0-9a-f]{16}(\.\w+)?', fname) and fname != osp.basename(path):
+            try:
+                stale_paths.append((osp.getmtime(osp.join(CACHE_DIRPATH, fname)), osp.join(CACHE_DIRPATH, fname)))
+            except FileNotFoundError:
+                pass
+    stale_paths.sort(reverse=True)
+    for _, stale_path in stale_paths[keep - 1:]:
+        if osp.isdir(stale_path):
+            shutil.rmtree(stale_path, ignore_errors=True)
+        else:
+            try:
+                os.remove(stale_path)
+            except FileNotFoundError:
+                pass
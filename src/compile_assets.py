@@ -0,0 +1,25 @@
+"""
+Offline compile step : build every cached artifact ahead of time (cleaned tables, compiled map data),
+e.g. before starting the gunicorn workers. The loaders rebuild stale artifacts by themselves,
+this only moves that cost out of the first request. Run from the root of the project :
+
+    python -m src.compile_assets
+"""
+import time
+
+from src.preprocess import get_demographics_data, get_elections_data
+from src.maps import get_districts_mapdata, get_boroughs_mapdata, get_countries_mapdata
+
+ARTIFACTS = {
+    'demographics': get_demographics_data,
+    'elections': get_elections_data,
+    'mapdata-districts': get_districts_mapdata,
+    'mapdata-boroughs': get_boroughs_mapdata,
+    'mapdata-countries': get_countries_mapdata,
+}
+
+if __name__ == '__main__':
+    for name, loader in ARTIFACTS.items():
+        start = time.perf_counter()
+        loader()
+        print(f'{name:<24} {time.perf_counter() - start:.3f} s')
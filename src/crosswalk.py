@@ -0,0 +1,206 @@
+import numpy as np
+
+from src.cache import cached_result
+from src.keys import get_ids
+from src.topology import get_polygons
+
+# Size of a degree of latitude, and of a degree of longitude at the equator, in meters
+METERS_PER_DEGREE_LAT = 110574
+METERS_PER_DEGREE_LON = 111320
+
+
+def get_layers(districts_mapdata: dict, boroughs_mapdata: dict, keys: dict):
+    """
+    The geographic layers of the crosswalks : for every kind of entity of the key tables (c.f. keys.py),
+    its map data and the ID of every feature (-1 for the features that are not such an entity).
+    Boroughs and quartiers share the same map : a borough is the union of its quartiers.
+    """
+    borough_names = [f['properties']['nom_arr'] for f in boroughs_mapdata['features']]
+    boroughs = np.full(len(borough_names), -1)
+    known = np.array([name is not None for name in borough_names], dtype=bool)
+    boroughs[known] = get_ids(keys['borough'], [name for name in borough_names if name is not None])
+    return {
+        'circonscription': (districts_mapdata, get_ids(keys['circonscription'], [f['properties']['NM_CEP'] for f in districts_mapdata['features']])),
+        'quartier': (boroughs_mapdata, get_ids(keys['quartier'], [f['properties']['nom_qr'] for f in boroughs_mapdata['features']])),
+        'borough': (boroughs_mapdata, boroughs),
+    }
+
+def get_bounds(feature: dict):
+    """Bounding box of a feature : (min lon, min lat, max lon, max lat)."""
+    points = np.concatenate([np.asarray(ring, dtype=float)[:, :2] for polygon in get_polygons(feature['geometry']) for ring in polygon])
+    return (*points.min(axis=0), *points.max(axis=0))
+
+def rasterize(feature: dict, grid: dict):
+    """
+    Cells of a regular grid whose center falls inside a feature (even-odd rule, so holes are left out), by scanlines :
+    the crossings of all the edges with all the rows of cells are computed at once, then filled with a cumulative sum.
+
+    Args:
+        feature (dict): GeoJSON feature, Polygon or MultiPolygon.
+        grid (dict): {'x0', 'y0' : center of the first cell, 'dx', 'dy' : size of the cells, 'nx', 'ny' : number of columns and rows}.
+
+    Returns:
+        tuple: Row and column of every cell inside the feature.
+    """
+    edges = []
+    for polygon in get_polygons(feature['geometry']):
+        for ring in polygon:
+            ring = np.asarray(ring, dtype=float)[:, :2]
+            edges.append(np.concatenate([ring[:-1], ring[1:]], axis=1))
+    xa, ya, xb, yb = np.concatenate(edges).T
+
+    # Rows whose center is in [min(ya, yb), max(ya, yb)), so that a vertex is only counted once
+    low = np.clip(np.ceil((np.minimum(ya, yb) - grid['y0']) / grid['dy']), 0, grid['ny']).astype(int)
+    high = np.clip(np.ceil((np.maximum(ya, yb) - grid['y0']) / grid['dy']), 0, grid['ny']).astype(int)
+    counts = high - low
+    edge = np.repeat(np.arange(len(counts)), counts)
+    rows = low[edge] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    y = grid['y0'] + rows * grid['dy']
+    x = xa[edge] + (y - ya[edge]) * (xb[edge] - xa[edge]) / (yb[edge] - ya[edge])
+    columns = np.clip(np.ceil((x - grid['x0']) / grid['dx']), 0, grid['nx']).astype(int)
+    if len(rows) == 0:
+        return rows, columns
+
+    # Every crossing toggles inside / outside for the cells to its right, within a window around the feature
+    row_min, row_max = rows.min(), rows.max() + 1
+    column_min, column_max = columns.min(), columns.max() + 1
+    toggles = np.zeros((row_max - row_min, column_max - column_min + 1), dtype=np.int32)
+    np.add.at(toggles, (rows - row_min, columns - column_min), 1)
+    inside = np.cumsum(toggles, axis=1)[:, :-1] % 2 == 1
+    cell_rows, cell_columns = np.nonzero(inside)
+    return cell_rows + row_min, cell_columns + column_min
+
+def build_overlay(layers: dict, resolution: float=50):
+    """
+    Rasterize every layer on a common regular grid, covering the Montréal layers and the districts they touch.
+    Use get_overlay to go through the cache.
+
+    Args:
+        layers (dict): Kind -> (map data, ID of every feature), c.f. get_layers.
+        resolution (float): Size of the cells, in meters.
+
+    Returns:
+        dict: {'grid' : c.f. rasterize, 'cell_area' : area of the cells of every row (km²),
+            'labels' : kind -> ID of the entity covering every cell (-1 for none), 'sizes' : kind -> number of entities}.
+    """
+    bounds = {kind: np.array([get_bounds(f) for f in map_data['features']]) for kind, (map_data, _) in layers.items()}
+    montreal = np.concatenate([bounds['quartier'], bounds['borough']])
+    x_min, y_min = montreal[:, :2].min(axis=0)
+    x_max, y_max = montreal[:, 2:].max(axis=0)
+    # Extend the grid to the whole of the districts touching Montréal, so that their areas are complete
+    touching = (bounds['circonscription'][:, 0] < x_max) & (bounds['circonscription'][:, 2] > x_min) \
+        & (bounds['circonscription'][:, 1] < y_max) & (bounds['circonscription'][:, 3] > y_min)
+    extended = np.concatenate([montreal, bounds['circonscription'][touching]])
+    x_min, y_min = extended[:, :2].min(axis=0)
+    x_max, y_max = extended[:, 2:].max(axis=0)
+
+    dy = resolution / METERS_PER_DEGREE_LAT
+    dx = resolution / (METERS_PER_DEGREE_LON * np.cos(np.radians((y_min + y_max) / 2)))
+    grid = {
+        'x0': x_min + dx / 2, 'y0': y_min + dy / 2, 'dx': dx, 'dy': dy,
+        'nx': int(np.ceil((x_max - x_min) / dx)), 'ny': int(np.ceil((y_max - y_min) / dy)),
+    }
+    latitudes = grid['y0'] + np.arange(grid['ny']) * dy
+    cell_area = (dx * METERS_PER_DEGREE_LON * np.cos(np.radians(latitudes))) * (dy * METERS_PER_DEGREE_LAT) / 1e6
+
+    labels = {}
+    for kind, (map_data, ids) in layers.items():
+        labels[kind] = np.full((grid['ny'], grid['nx']), -1, dtype=np.int16)
+        for feature, i in zip(map_data['features'], ids):
+            if i >= 0:
+                labels[kind][rasterize(feature, grid)] = i
+    return {
+        'grid': grid,
+        'cell_area': cell_area,
+        'labels': labels,
+        'sizes': {kind: int(max(ids.max() + 1, 0)) for kind, (_, ids) in layers.items()},
+    }
+
+def get_overlay(districts_mapdata: dict, boroughs_mapdata: dict, keys: dict, resolution: float=50):
+    """
+    The rasterized layers of build_overlay, cached on disk by a hash of the map data and of the key tables.
+    """
+    return cached_result('overlay', {
+        'districts_mapdata': districts_mapdata,
+        'boroughs_mapdata': boroughs_mapdata,
+        'keys': keys,
+        'resolution': resolution,
+    }, _build_overlay, depends=[build_overlay, rasterize, get_layers, get_bounds])
+
+def _build_overlay(districts_mapdata, boroughs_mapdata, keys, resolution):
+    return build_overlay(get_layers(districts_mapdata, boroughs_mapdata, keys), resolution)
+
+def get_crosswalk(overlay: dict, source: str, target: str, population=None):
+    """
+    Sparse crosswalk from a layer to another : the overlap of every pair of entities, as COO arrays.
+    With population (people of every entity of a third layer, e.g. the circonscriptions), overlaps are weighted
+    by the density of that layer rather than by area, e.g. to split a borough where people actually live.
+
+    Args:
+        overlay (dict): Rasterized layers, c.f. get_overlay.
+        source (str): Kind of entity of the values to re-aggregate, e.g. 'borough'.
+        target (str): Kind of entity to re-aggregate them onto, e.g. 'circonscription'.
+        population (tuple): (kind, population of every entity by ID), to weight by population.
+
+    Returns:
+        dict: With keys
+            'source', 'target' : IDs of every overlapping pair,
+            'overlap' : its area (km²) or population,
+            'extensive' : share of the source in the target (for counts, e.g. a number of immigrants),
+            'intensive' : share of the target in the source (for rates and means, e.g. a share of immigrants),
+            'shape' : (number of targets, number of sources). C.f. reaggregate.
+    """
+    labels = overlay['labels']
+    weights = np.broadcast_to(overlay['cell_area'][:, None], labels[source].shape)
+    if population is not None:
+        kind, values = population
+        density_labels = labels[kind]
+        areas = np.bincount(density_labels[density_labels >= 0], weights=weights[density_labels >= 0], minlength=len(values))
+        density = np.asarray(values, dtype=float) / np.where(areas > 0, areas, 1)
+        weights = np.where(density_labels >= 0, weights * density[density_labels], 0)
+
+    n_source, n_target = overlay['sizes'][source], overlay['sizes'][target]
+    inside = (labels[source] >= 0) & (labels[target] >= 0)
+    pairs = labels[target][inside].astype(np.int64) * n_source + labels[source][inside]
+    overlap = np.bincount(pairs, weights=weights[inside], minlength=n_target * n_source)
+    pairs = np.flatnonzero(overlap)
+    overlap = overlap[pairs]
+    target_ids, source_ids = pairs // n_source, pairs % n_source
+
+    # Totals over the whole of every entity, including the parts outside the other layer
+    source_totals = np.bincount(labels[source][labels[source] >= 0], weights=weights[labels[source] >= 0], minlength=n_source)
+    target_totals = np.bincount(labels[target][labels[target] >= 0], weights=weights[labels[target] >= 0], minlength=n_target)
+    return {
+        'source': source_ids,
+        'target': target_ids,
+        'overlap': overlap,
+        'extensive': overlap / source_totals[source_ids],
+        'intensive': overlap / target_totals[target_ids],
+        'shape': (n_target, n_source),
+    }
+
+def reaggregate(crosswalk: dict, values, intensive: bool=False):
+    """
+    Re-aggregate the values of the source entities (by ID) onto the target ones, as a single sparse matrix-vector product.
+    Counts are split between the targets (extensive), rates and means are averaged over the targets (intensive).
+    Targets outside the source layer get 0 (extensive) or NaN (intensive).
+    """
+    weights = crosswalk['intensive' if intensive else 'extensive']
+    result = np.bincount(
+        crosswalk['target'], weights=weights * np.asarray(values, dtype=float)[crosswalk['source']], minlength=crosswalk['shape'][0])
+    if intensive:
+        covered = np.bincount(crosswalk['target'], weights=weights, minlength=crosswalk['shape'][0])
+        result = np.where(covered > 0, result / np.where(covered > 0, covered, 1), np.nan)
+    return result
+
+def get_crosswalks(overlay: dict):
+    """
+    Area-weighted crosswalks between every pair of layers of the overlay, c.f. get_crosswalk.
+
+    Returns:
+        dict: (source, target) -> crosswalk, e.g. crosswalks['borough', 'circonscription'].
+    """
+    return {
+        (source, target): get_crosswalk(overlay, source, target)
+        for source in overlay['labels'] for target in overlay['labels'] if source != target}
@@ -0,0 +1,140 @@
+import numpy as np
+
+from src.keys import get_ids
+from src.maps import circo_subsets
+from src.montecarlo import get_regions
+from src.votes import UNDECIDED
+
+# Electoral systems : the current one (first-past-the-post), two list proportional ones (highest averages),
+# and a mixed-member proportional one, where list seats compensate the district seats (c.f. get_seat_outcomes)
+SYSTEMS = ['fptp', 'dhondt', 'sainte-lague', 'mmp']
+# Highest averages method -> (a, b) : the divisor of a party with s seats is a * s + b
+DIVISORS = {
+    'dhondt': (1, 1),
+    'sainte-lague': (2, 1),
+}
+# Thresholds (% of the valid votes, province-wide) below which a party gets no proportional seat
+THRESHOLDS = [0, 5, 10]
+# Share of the seats elected in the districts with the mixed-member system (80 of 125, as in the 2019 bill)
+DISTRICT_SHARE = 80 / 125
+
+
+def get_groupings(vote_matrix: dict, keys: dict):
+    """
+    Regional groupings of the districts, in which the proportional seats are allocated.
+
+    Returns:
+        dict: Grouping -> (region of every district, as an int array, and name of every region). Groupings are
+            'province' : a single region,
+            'subsets' : the cities of circo_subsets (Montréal, Québec) and the rest of the province,
+            'regions' : the hundreds of the district numbers (c.f. montecarlo.get_regions).
+    """
+    table = keys['circonscription']
+    n_districts = len(table['names'])
+
+    subsets = np.full(n_districts, len(circo_subsets))
+    for i, names in enumerate(circo_subsets.values()):
+        subsets[get_ids(table, names)] = i
+    numbers, regions = np.unique(get_regions(vote_matrix), return_inverse=True)
+
+    return {
+        'province': (np.zeros(n_districts, dtype=int), ['Québec']),
+        'subsets': (subsets, [*circo_subsets, 'Reste du Québec']),
+        'regions': (regions, [f'Circonscriptions {n}xx' for n in numbers]),
+    }
+
+def highest_averages(votes, seats, start=None, method: str='dhondt'):
+    """
+    Allocate seats with a highest averages method, for many independent allocations at once (e.g. every region of every system) :
+    the quotients of all the rows are ranked in a single sort, and every row gets its seats best quotients.
+
+    Args:
+        votes (np.ndarray): Allocations x party votes.
+        seats (np.ndarray): Number of seats to allocate in every row.
+        start (np.ndarray): Allocations x party seats already won (e.g. in the districts, for compensatory list seats).
+        method (str): One of DIVISORS.
+
+    Returns:
+        np.ndarray: Allocations x party seats allocated, not including start.
+    """
+    votes = np.asarray(votes, dtype=float)
+    seats = np.asarray(seats, dtype=int)
+    start = np.zeros(votes.shape, dtype=int) if start is None else start
+    n_rows, n_parties = votes.shape
+    a, b = DIVISORS[method]
+
+    # Quotient of the k-th next seat of every party, then rank of every quotient within its row
+    k = np.arange(max(seats.max(), 1))
+    quotients = votes[:, :, None] / (a * (start[:, :, None] + k) + b)
+    quotients = quotients.reshape(n_rows, -1)
+    order = np.argsort(-quotients, axis=1, kind='stable')
+    elected = order[:, :seats.max()] // len(k)
+    elected_rows = np.broadcast_to(np.arange(n_rows)[:, None], elected.shape)
+    won = np.arange(elected.shape[1]) < seats[:, None]
+    return np.bincount(
+        (elected_rows * n_parties + elected)[won], minlength=n_rows * n_parties).reshape(n_rows, n_parties)
+
+def largest_remainders(counts, seats):
+    """
+    Scale the rows of counts (allocations x party) to the given numbers of seats, with the largest remainders.
+    """
+    counts = np.asarray(counts, dtype=float)
+    totals = counts.sum(axis=1, keepdims=True)
+    quotas = counts * seats[:, None] / np.where(totals > 0, totals, 1)
+    allocated = np.floor(quotas).astype(int)
+    rank = np.argsort(np.argsort(allocated - quotas, axis=1, kind='stable'), axis=1)
+    return allocated + (rank < (seats - allocated.sum(axis=1))[:, None])
+
+def get_seat_outcomes(vote_matrix: dict, keys: dict, thresholds: list=THRESHOLDS, district_share: float=DISTRICT_SHARE):
+    """
+    Seats of every party under every electoral system, regional grouping and threshold, from the vote matrix (c.f. votes.py).
+    The proportional allocations of all the combinations are computed in a single batch (c.f. highest_averages).
+    Every region has as many seats as it has districts, so that the house keeps its 125 seats (none until the region has votes).
+
+    - 'fptp' : the winner of every district, as today (regardless of the grouping and the threshold).
+    - 'dhondt', 'sainte-lague' : list proportional in every region.
+    - 'mmp' : district_share of the seats of a region are elected in districts, as many per party as its district wins
+        scaled to that number (largest remainders), then the list seats compensate them (D'Hondt from the district seats).
+        A party winning more districts than its proportional share keeps them.
+
+    Returns:
+        dict: (system, grouping, threshold) -> {'seats', 'district_seats', 'regions'} : region x party seats,
+            of which won in districts, and the names of the regions (c.f. get_groupings). The parties are the columns of the vote matrix.
+    """
+    votes = vote_matrix['votes']
+    province_shares = 100 * votes.sum(axis=0) / max(votes.sum(), 1)
+    wins = np.zeros(votes.shape, dtype=int)
+    decided = np.flatnonzero(vote_matrix['winners'] != UNDECIDED)
+    wins[decided, vote_matrix['winners'][decided]] = 1
+
+    outcomes = {}
+    # Proportional allocations to batch : (key, method, votes, seats, start, names of the regions)
+    batch = []
+    for grouping, (regions, names) in get_groupings(vote_matrix, keys).items():
+        region_votes = np.zeros((len(names), votes.shape[1]), dtype=np.int64)
+        np.add.at(region_votes, regions, votes)
+        region_wins = np.zeros((len(names), votes.shape[1]), dtype=int)
+        np.add.at(region_wins, regions, wins)
+        # The seats of a region without any vote yet (e.g. on election night) are not allocated
+        seats = np.bincount(regions, minlength=len(names)) * (region_votes.sum(axis=1) > 0)
+        district_seats = largest_remainders(region_wins, np.round(seats * district_share).astype(int))
+
+        for threshold in thresholds:
+            eligible_votes = region_votes * (province_shares >= threshold)
+            outcomes['fptp', grouping, threshold] = {'seats': region_wins, 'district_seats': region_wins, 'regions': names}
+            for method in DIVISORS:
+                batch.append(((method, grouping, threshold), method, eligible_votes, seats, np.zeros_like(region_wins), names))
+            batch.append((
+                ('mmp', grouping, threshold), 'dhondt', eligible_votes, seats - district_seats.sum(axis=1), district_seats, names))
+
+    for method in DIVISORS:
+        items = [item for item in batch if item[1] == method]
+        allocated = highest_averages(
+            np.concatenate([item[2] for item in items]),
+            np.concatenate([item[3] for item in items]),
+            np.concatenate([item[4] for item in items]),
+            method)
+        offsets = np.cumsum([0] + [len(item[3]) for item in items])
+        for (key, _, _, _, start, names), i, j in zip(items, offsets[:-1], offsets[1:]):
+            outcomes[key] = {'seats': start + allocated[i:j], 'district_seats': start, 'regions': names}
+    return outcomes
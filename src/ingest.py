@@ -0,0 +1,211 @@
+import codecs
+import hashlib
+import json
+import os
+import os.path as osp
+
+import pandas as pd
+import requests
+
+from src.cache import CACHE_DIRPATH
+from src.preprocess import get_elections_data
+
+RESULTS_URL = 'https://donnees.electionsquebec.qc.ca/production/provincial/resultats/archives/gen2022-10-03/resultats.json'
+
+# Columns of resultats.csv -> key in resultats.json : fields of the circonscription, repeated on every row, then of the candidate
+CIRCONSCRIPTION_FIELDS = {
+    'numeroCirconscription': 'numeroCirconscription',
+    'nomCirconscription': 'nomCirconscription',
+    'nbBureauComplete': 'nbBureauComplete',
+    'nbBureauTotal': 'nbBureauTotal',
+    'nbVoteValide': 'nbVoteValide',
+    'nbVoteRejete': 'nbVoteRejete',
+    'nbVoteExerce': 'nbVoteExerce',
+    'nbElecteurInscrit': 'nbElecteurInscrit',
+    'tauxVoteValide': 'tauxVoteValide',
+    'tauxVoteRejete': 'tauxVoteRejete',
+    'tauxParticipation': 'tauxParticipation',
+}
+CANDIDATE_FIELDS = {
+    'numeroCandidat': 'numeroCandidat',
+    'nomCandidat': 'nom',
+    'prenomCandidat': 'prenom',
+    'numeroPartiPolitique': 'numeroPartiPolitique',
+    'abreviationPartiPolitique': 'abreviationPartiPolitique',
+    'nbVoteTotal': 'nbVoteTotal',
+    'tauxVote': 'tauxVote',
+    'nbVoteAvance': 'nbVoteAvance',
+}
+
+
+def iter_json_array(chunks, key: str):
+    """
+    Parse a JSON document as a stream, yielding the items of the array under the given key of the top-level object
+    one at a time (e.g. the circonscriptions of resultats.json), as soon as they are received.
+    Only the item being parsed is kept in memory, the other top-level values are parsed and dropped.
+
+    Args:
+        chunks (iterable): The document, as chunks of UTF-8 bytes (e.g. response.iter_content()).
+        key (str): Key of the array in the top-level object.
+
+    Raises:
+        ValueError: If the document is not valid JSON, is truncated, or has no such array.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = next(chunks, None)
+        eof = chunk is None
+        buffer = buffer[pos:] + text.decode(chunk or b'', final=eof)
+        pos = 0
+
+    def peek():
+        # Next character that is not whitespace ('' at the end of the document)
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos:pos + 1]
+            fill()
+
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f'Expected {char!r} at {buffer[pos:pos + 20]!r}')
+        pos += 1
+
+    def decode():
+        # A value is only complete once something follows it (e.g. '12' could be the start of '123')
+        nonlocal pos
+        while True:
+            peek()
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError('Truncated or invalid JSON document')
+            fill()
+
+    expect('{')
+    while peek() != '}':
+        if peek() == ',':
+            expect(',')
+        name = decode()
+        expect(':')
+        if name != key:
+            decode()
+            continue
+
+        expect('[')
+        while peek() != ']':
+            if peek() == ',':
+                expect(',')
+            yield decode()
+        return
+    raise ValueError(f'No array {key!r} in the JSON document')
+
+def flatten_results(circonscriptions):
+    """
+    Flatten the circonscriptions of resultats.json into the rows of resultats.csv (one per candidate), as a dataframe.
+    Values are kept as received (missing ones as None), so the CSV written from it matches the former csv.DictWriter output.
+
+    Args:
+        circonscriptions (iterable): The circonscriptions, e.g. from iter_json_array.
+
+    Returns:
+        pd.DataFrame: One object column per column of resultats.csv.
+    """
+    columns = {name: [] for name in [*CIRCONSCRIPTION_FIELDS, *CANDIDATE_FIELDS]}
+    for circonscription in circonscriptions:
+        candidats = circonscription.get('candidats', [])
+        for name, field in CIRCONSCRIPTION_FIELDS.items():
+            columns[name] += [circonscription.get(field)] * len(candidats)
+        for name, field in CANDIDATE_FIELDS.items():
+            columns[name] += [candidat.get(field) for candidat in candidats]
+    return pd.DataFrame(columns, dtype=object)
+
+def ingest_results(url: str=RESULTS_URL, path: str='assets/data/resultats.csv', session: requests.Session=None, timeout: float=30):
+    """
+    Update resultats.csv from the results feed of Élections Québec, and the cleaned elections data in the cache (c.f. get_elections_data).
+    Cheap enough to call every few seconds :
+    - the request is conditional (ETag / Last-Modified of the previous response), so an unchanged feed is not downloaded again,
+    - the JSON is parsed as it is received, one circonscription at a time,
+    - the CSV and the cache are only rewritten if the results actually changed.
+    The validators of the last response are kept in the cache directory, next to a digest of the CSV they produced :
+    if the CSV is modified or removed, the next call downloads everything again.
+
+    Args:
+        url (str): URL of resultats.json.
+        path (str): Path of the CSV file to update.
+        session (requests.Session): Session to reuse its connection between calls.
+        timeout (float): Timeout of the request, in seconds.
+
+    Returns:
+        bool: Whether the results changed.
+
+    Raises:
+        requests.HTTPError: If the feed answers with an error.
+        ValueError: If the feed is not a valid results document.
+    """
+    state_path = osp.join(CACHE_DIRPATH, f'ingest-{osp.splitext(osp.basename(path))[0]}.json')
+    state = _load_state(state_path)
+    digest = _file_digest(path)
+
+    headers = {}
+    if state.get('url') == url and state.get('digest') == digest and digest is not None:
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
+    with (session or requests).get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+        df = flatten_results(iter_json_array(response.iter_content(chunk_size=1 << 16), 'circonscriptions'))
+        validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+    content = df.to_csv(index=False, lineterminator='\n').encode('utf-8')
+    new_digest = hashlib.sha256(content).hexdigest()
+    changed = new_digest != digest
+    if changed:
+        # Replace the file at once, so that readers never see a partial CSV
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        # Clean and store the new data in the cache now, rather than on the next load
+        get_elections_data(path)
+
+    _save_state(state_path, {'url': url, 'digest': new_digest, **validators})
+    return changed
+
+def _file_digest(path: str):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def _load_state(path: str):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_state(path: str, state: dict):
+    # Several processes may poll the feed at once (c.f. live.py) : replace the file at once
+    os.makedirs(osp.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,128 @@
+import re
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+from src.maps import circo_subsets, repair_mojibake
+
+
+def normalize(name: str):
+    """
+    Normalized form of a name, shared by all its spellings across the sources :
+    repaired encoding, no accents, lower case, no spaces around dashes and single spaces.
+    e.g. 'Côte-des-Neiges – Notre-Dame-de-Grâce ' -> 'cote-des-neiges-notre-dame-de-grace'
+    """
+    s = unidecode(repair_mojibake(name)).lower()
+    s = re.sub(r'\s*[-–—]\s*', '-', s)
+    return re.sub(r'\s+', ' ', s).strip()
+
+def build_key_table(names: list, sources: dict=None):
+    """
+    Assign stable integer IDs to a set of entities (e.g. the circonscriptions), and precompute their aliases.
+    IDs follow the alphabetical order of the normalized names, so they only change if the set of entities changes.
+
+    Args:
+        names (list): Canonical name of every entity.
+        sources (dict): Source name -> names used by that source (e.g. the features of a map).
+            Every spelling becomes an alias, and every name must match an entity once normalized.
+
+    Returns:
+        dict: With keys 'names' (ID -> canonical name) and 'ids' (any known spelling, normalized or not -> ID).
+
+    Raises:
+        ValueError: If two entities share the same normalized name, or if a source uses unknown names.
+    """
+    canonical = {}
+    for name in names:
+        key = normalize(name)
+        if key in canonical and canonical[key] != name:
+            raise ValueError(f'Ambiguous names : {canonical[key]!r} and {name!r}')
+        canonical[key] = name
+
+    keys = sorted(canonical)
+    ids = {key: i for i, key in enumerate(keys)}
+    ids.update({canonical[key]: i for i, key in enumerate(keys)})
+
+    errors = []
+    for source, source_names in (sources or {}).items():
+        unknown = []
+        for name in source_names:
+            key = normalize(name)
+            if key in ids:
+                ids[name] = ids[key]
+            else:
+                unknown.append(name)
+        if unknown:
+            errors.append(f'{source}: {unknown}')
+    if errors:
+        raise ValueError('Unknown names :\n' + '\n'.join(errors))
+
+    return {'names': [canonical[key] for key in keys], 'ids': ids}
+
+def get_ids(table: dict, names):
+    """
+    IDs of the given names, with any spelling. Known spellings are a single dictionary lookup,
+    only unknown ones are normalized.
+
+    Args:
+        table (dict): Key table, c.f. build_key_table.
+        names (iterable): Names to look up.
+
+    Returns:
+        np.ndarray: The IDs, as an int array.
+
+    Raises:
+        KeyError: Listing the names matching no entity.
+    """
+    ids = []
+    unknown = []
+    for name in names:
+        i = table['ids'].get(name)
+        if i is None:
+            i = table['ids'].get(normalize(name))
+            if i is None:
+                unknown.append(name)
+        ids.append(i)
+    if unknown:
+        raise KeyError(f'Unknown names : {unknown}')
+    return np.array(ids, dtype=int)
+
+def get_rows(table: dict, names):
+    """
+    Inverse of get_ids : for every ID, the position of that entity in names (-1 if it is not there).
+    Used to join two sources, c.f. match.
+    """
+    rows = np.full(len(table['names']), -1)
+    rows[get_ids(table, names)] = np.arange(len(names))
+    return rows
+
+def match(table: dict, names, other_names):
+    """
+    Join two sources through the IDs : for every name, the position of the same entity in other_names (-1 if it is not there).
+    e.g. df_b.iloc[match(table, df_a['name'], df_b['name'])] aligns the rows of df_b on the rows of df_a.
+    """
+    return get_rows(table, other_names)[get_ids(table, names)]
+
+def get_keys(df_demographics: pd.DataFrame, df_elections: pd.DataFrame, districts_mapdata: dict,
+             borough_df: pd.DataFrame, boroughs_mapdata: dict):
+    """
+    Key tables of all the entities joined across the sources, checking that every source agrees with them.
+
+    Returns:
+        dict: Kind of entity -> key table, c.f. build_key_table. Kinds are
+            'circonscription' : electoral districts, named as in the elections data.
+            'borough' : boroughs of Montréal (arrondissements), named as in the boroughs data.
+            'quartier' : the polygons of the boroughs map, named as in that map.
+    """
+    return {
+        'circonscription': build_key_table(df_elections['nomCirconscription'].unique(), {
+            'demographics': df_demographics['Circonscription'],
+            'districts map': [f['properties']['NM_CEP'] for f in districts_mapdata['features']],
+            **{f'circo_subsets[{k!r}]': v for k, v in circo_subsets.items()},
+        }),
+        'borough': build_key_table(borough_df['Arrondissement'], {
+            'boroughs map': [f['properties']['nom_arr'] for f in boroughs_mapdata['features'] if f['properties']['nom_arr'] is not None],
+        }),
+        'quartier': build_key_table([f['properties']['nom_qr'] for f in boroughs_mapdata['features']]),
+    }
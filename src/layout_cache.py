@@ -0,0 +1,74 @@
+import gzip
+import hashlib
+import threading
+
+import brotli
+import flask
+
+# The serialized layout and its compressed variants : {'version', 'etag', 'identity', 'gzip', 'br'}, 'etag' being encoding -> ETag
+_cache = {}
+_lock = threading.Lock()
+
+
+def install_layout_cache(app, get_version):
+    """
+    Serve the /_dash-layout response from a cache instead of serializing the whole layout on every page view.
+    The JSON is serialized once by Dash, compressed once with gzip and brotli, and every encoding is tagged with its own
+    strong ETag (the bodies differ, so they cannot share one). It is only rebuilt when get_version() changes,
+    i.e. when the figures or data read by the layout change.
+
+    Args:
+        app (dash.Dash): The Dash app.
+        get_version (callable): Returns a value that changes whenever the layout would change, 
+            e.g. the registry.get_versions of the values read by the layout.
+    """
+    path = f'{app.config.routes_pathname_prefix}_dash-layout'
+
+    @app.server.before_request
+    def serve_cached_layout():
+        if flask.request.path != path or flask.request.method != 'GET':
+            return None
+
+        entry = get_layout_entry(app, get_version)
+        encoding = flask.request.accept_encodings.best_match(['br', 'gzip', 'identity'], default='identity')
+        if entry['etag'][encoding] in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            response = flask.Response(entry[encoding], mimetype='application/json')
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(entry['etag'][encoding])
+        response.headers['Vary'] = 'Accept-Encoding'
+        # Browsers keep the response but revalidate it on every page view, which costs a 304 at most
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+def get_layout_entry(app, get_version):
+    """
+    Return the cached serialized layout, rebuilding it if the version changed.
+    """
+    entry = _cache.get('entry')
+    if entry is not None and entry['version'] == get_version():
+        return entry
+
+    with _lock:
+        # Another thread may have rebuilt it while we were waiting
+        entry = _cache.get('entry')
+        if entry is not None and entry['version'] == get_version():
+            return entry
+
+        # Let Dash serialize the layout (and apply its layout hooks), then read back the version :
+        # building the layout may itself build figures, which changes the version
+        body = app.serve_layout().get_data()
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        # Moderate levels : the rebuild holds the lock, and brotli's highest quality costs ~1.5 s for ~20 % less
+        entry = {
+            'version': get_version(),
+            'etag': {encoding: f'{digest}-{encoding}' for encoding in ('identity', 'gzip', 'br')},
+            'identity': body,
+            'gzip': gzip.compress(body, compresslevel=6),
+            'br': brotli.compress(body, quality=5),
+        }
+        _cache['entry'] = entry
+        return entry
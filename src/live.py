@@ -0,0 +1,170 @@
+import gzip
+import json
+import logging
+import threading
+import time
+
+import brotli
+import flask
+import plotly
+
+from src import registry
+from src.cache import fingerprint
+from src.ingest import RESULTS_URL, ingest_results
+from src.patches import get_figure_updates
+from src.preprocess import get_elections_data
+from src.votes import update_vote_matrix
+
+logger = logging.getLogger(__name__)
+
+# Graph ID -> (registered figure, trace properties and layout paths changing with the results, c.f. get_figure_updates)
+# The hypothetical waffle is left out : it shows the scenario selected in the browser, recomputed from the latest results on every change
+LIVE_FIGURES = {
+    'stacked-bar-most': ('fig_most', ['x', 'y'], [('annotations',)]),
+    'stacked-bar-least': ('fig_least', ['x', 'y'], [('annotations',)]),
+    'immigrant-voting-scatter': ('fig_immigrant_voting', ['x', 'y', 'customdata'], []),
+    'waffle_quebec': ('fig_quebec', ['z', 'customdata'], []),
+    'waffle_montreal': ('fig_montreal', ['z', 'customdata'], []),
+    'waffle_upper_median_immigration': ('fig_upper_median_immigration', ['z', 'customdata'], []),
+    'waffle_lower_median_immigration': ('fig_lower_median_immigration', ['z', 'customdata'], []),
+}
+# Store ID -> (registered table of figure updates per selection, c.f. the clientside callbacks, graph showing the selection,
+# IDs of the components whose values make the key of the selection in the table, joined by '/'), also sent to the browsers
+LIVE_TABLES = {
+    'party-income-table': ('party_income_table', 'party-income-chart', ['party-dropdown']),
+    'connected-dot-plot-table': ('connected_dot_plot_table', 'connected-dot-plot', ['language-dropdown']),
+    'electoral-system-table': (
+        'electoral_system_table', 'waffle_electoral_system', ['electoral-system', 'electoral-system-grouping', 'electoral-system-threshold']),
+}
+# Registered values sent to the browsers : the updates are only rebuilt when one of them changes
+LIVE_VALUES = ['vote_matrix'] + [name for name, _, _ in LIVE_FIGURES.values()] + [name for name, _, _ in LIVE_TABLES.values()]
+
+# The serialized updates and their compressed variants : {'registry_version', 'key', 'identity', 'gzip', 'br'}, c.f. get_live_updates
+_cache = {}
+_lock = threading.Lock()
+# Fingerprint of the results file last applied by this process, c.f. poll_results
+_applied = {}
+
+
+def get_live_version(vote_matrix: dict):
+    """
+    Version of the results, sent to the browsers with the updates : [reported polling stations, votes].
+    Both only grow during the night, so a browser can tell which of two versions is the most recent,
+    even if they come from different workers that did not poll the feed at the same time.
+    """
+    return [int(vote_matrix['reported'].sum()), int(vote_matrix['votes'].sum())]
+
+def poll_results(url: str=RESULTS_URL, path: str='assets/data/resultats.csv', warm_up_values: list=()):
+    """
+    Fetch the results feed once (c.f. ingest_results) and apply the changes :
+    only the rows of the changed districts are updated in the vote matrix (c.f. update_vote_matrix),
+    then only the figures depending on it are rebuilt, along with the updates sent to the browsers.
+    The registered values in warm_up_values (e.g. those of the layout, among them the seat projection) are rebuilt too,
+    so that no request has to wait for them.
+
+    The results file may also have been updated by another process (e.g. another gunicorn worker),
+    so the changes are detected from its content rather than from the response of the feed.
+
+    Returns:
+        np.ndarray or None: Rows (i.e. IDs) of the changed districts, None if the results did not change.
+    """
+    ingest_results(url, path)
+    key = fingerprint([path])
+    if _applied.get('key') == key:
+        return None
+
+    vote_matrix, rows = update_vote_matrix(registry.get('vote_matrix'), get_elections_data(path), registry.get('keys'))
+    if len(rows):
+        registry.replace('vote_matrix', vote_matrix)
+    # Recorded only once applied : if reading or applying the results fails, the next poll tries again
+    _applied['key'] = key
+    if len(rows):
+        # Rebuild the figures here rather than on the next request
+        registry.warm_up(warm_up_values)
+        get_live_updates()
+    return rows
+
+def start_polling(url: str=RESULTS_URL, path: str='assets/data/resultats.csv', interval: float=5, warm_up_values: list=()):
+    """
+    Poll the results feed in a daemon thread, every interval seconds (c.f. poll_results, and warm_up_values there).
+    Errors (network, invalid feed) are logged, and the next poll tries again.
+
+    Returns:
+        threading.Thread: The polling thread.
+    """
+    _applied['key'] = fingerprint([path])
+
+    def poll():
+        while True:
+            start = time.perf_counter()
+            try:
+                rows = poll_results(url, path, warm_up_values)
+                if rows is not None:
+                    logger.info('%d districts changed, updated in %.2f s', len(rows), time.perf_counter() - start)
+            except Exception:
+                logger.exception('Could not update the results')
+            time.sleep(max(0, interval - (time.perf_counter() - start)))
+
+    thread = threading.Thread(target=poll, name='live-results', daemon=True)
+    thread.start()
+    return thread
+
+def get_live_updates():
+    """
+    Return the cached updates of the live figures, rebuilding them if the registered values changed.
+    The JSON has the keys 'version' (c.f. get_live_version), 'figures' ([graph ID, figure updates] in the order of LIVE_FIGURES)
+    and 'tables' ([store ID, number of selection components, data] in the order of LIVE_TABLES).
+    It is serialized and compressed once per version, whatever the number of browsers.
+    """
+    entry = _cache.get('entry')
+    if entry is not None and entry['registry_version'] == registry.get_versions(LIVE_VALUES):
+        return entry
+
+    with _lock:
+        entry = _cache.get('entry')
+        if entry is not None and entry['registry_version'] == registry.get_versions(LIVE_VALUES):
+            return entry
+
+        version = get_live_version(registry.get('vote_matrix'))
+        updates = {
+            'version': version,
+            'figures': [
+                [graph_id, get_figure_updates(registry.get(name), trace_keys, layout_paths)]
+                for graph_id, (name, trace_keys, layout_paths) in LIVE_FIGURES.items()],
+            'tables': [
+                [store_id, len(selections), registry.get(name)] for store_id, (name, _, selections) in LIVE_TABLES.items()],
+        }
+        body = json.dumps(updates, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+        # Building the figures changes their versions, read them back once they are built
+        entry = {
+            'registry_version': registry.get_versions(LIVE_VALUES),
+            'key': '-'.join(map(str, version)),
+            'identity': body,
+            # Moderate levels, as for the layout (c.f. layout_cache.py) : this is rebuilt on every change of the results
+            'gzip': gzip.compress(body, compresslevel=6),
+            'br': brotli.compress(body, quality=5),
+        }
+        _cache['entry'] = entry
+        return entry
+
+def install_live_updates(server: flask.Flask, path: str='/_live'):
+    """
+    Add the route polled by the browsers for the updates of the live figures (c.f. assets/clientside.js).
+    A browser already up to date (?since=<its version>) gets an empty 204 response : with thousands of browsers
+    polling every few seconds, almost every request is one of those, and costs no serialization.
+    The responses only depend on the URL, so a cache in front of the server can share them for a second.
+    """
+
+    @server.route(path)
+    def live_updates():
+        entry = get_live_updates()
+        if flask.request.args.get('since') == entry['key']:
+            response = flask.Response(status=204)
+        else:
+            encoding = flask.request.accept_encodings.best_match(['br', 'gzip', 'identity'], default='identity')
+            response = flask.Response(entry[encoding], mimetype='application/json')
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'public, max-age=1'
+        return response
@@ -2,8 +2,12 @@ import plotly.graph_objects as go
 import pandas as pd
 from unidecode import unidecode
 import json
+import functools
 import numpy as np
 
+from src import topology
+from src.cache import cached_object
+
 
 circo_subsets = {
     'Montréal': [
@@ -48,10 +52,22 @@ circo_subsets = {
         'Vanier-Les Rivieres'], 
 }
 
+# Simplification tolerance (in degrees) of the map data for each zoom level, about a quarter of a pixel.
+# 'auto' is not listed, it keeps the full resolution.
+LOD_TOLERANCES = {
+    'montreal': 0.0005,
+    'quebec': 0.01,
+    'world': 0.1,
+}
+
+# Encoding and decoded levels of detail of the map data returned by the loaders : id(map_data) -> (encoded, {tolerance: map_data})
+_mapdata_lods = {}
+
 def get_map(
     map_data: dict, 
     color: list=None,
     zoom: str='auto',
+    tolerance: float=None,
     **kwargs):
     """
     Returns a choropleth map of Quebec or Montreal with the specified demographic variable.
@@ -62,6 +78,8 @@ def get_map(
         opacity (float): Opacity of the map markers (0 to 1).
         contour_width (int): Width of the contour lines.
         zoom (str): 'world' or 'quebec' or 'montreal'.
+        tolerance (float): Simplification tolerance of the polygons, in degrees. 
+            Defaults to the one of the zoom level (c.f. LOD_TOLERANCES), 0 keeps the full resolution.
         
     Returns:
         go.Figure: Choropleth map to plot.
@@ -71,10 +89,15 @@ def get_map(
     if color is None:
         color = [0]*len(map_data['features'])
     
+    # Pick the level of detail
+    zoom = unidecode(zoom).lower()
+    if tolerance is None:
+        tolerance = LOD_TOLERANCES.get(zoom, 0)
+    
     # Plot the choropleth
     fig = go.Figure(
         go.Choroplethmap(
-            geojson=map_data,
+            geojson=get_mapdata_lod(map_data, tolerance),
             featureidkey='properties.ID',
             locations=[f['properties']['ID'] for f in map_data['features']],
             z=color,
@@ -83,7 +106,6 @@ def get_map(
             ))
     
     # Set the zoom level
-    zoom = unidecode(zoom).lower()
     if zoom == 'world':
         pass # Default zoom, maybe change it laters
     elif zoom == 'quebec':
@@ -108,30 +130,135 @@ def get_map(
       
     return fig
 
+def get_mapdata_lod(map_data: dict, tolerance: float):
+    """
+    Return map data simplified at the given tolerance, keeping shared borders gap-free (c.f. topology.py).
+    For the map data returned by the loaders, the simplification is precomputed in the compiled artifact
+    and each level of detail is decoded once. Other map data are simplified on the fly.
+    
+    Args:
+        map_data (dict): GeoJSON data.
+        tolerance (float): Simplification tolerance, in degrees. 0 returns map_data itself.
+        
+    Returns:
+        dict: Simplified GeoJSON data, with the same features and properties as map_data.
+    """
+    if tolerance <= 0:
+        return map_data
+    
+    if id(map_data) not in _mapdata_lods:
+        return topology.simplify_mapdata(map_data, [tolerance])[tolerance]
+    
+    encoded, lods = _mapdata_lods[id(map_data)]
+    if tolerance not in lods:
+        lods[tolerance] = topology.decode_mapdata(encoded, tolerance)
+    return lods[tolerance]
+
 def get_districts_mapdata(path:str='assets/maps/districts_QC.geojson'):
     """
     Map data for the electoral districts.
-    Load the map data from the GeoJSON file and clean it.
+    Load the cleaned map data from the compiled artifact, c.f. compile_districts_mapdata.
+    """
+    return load_compiled_mapdata('districts', path, compile_districts_mapdata)['map_data']
+
+def get_countries_mapdata(path:str='assets/maps/countries.geojson'):
+    """
+    Load the cleaned countries data from the compiled artifact, c.f. compile_countries_mapdata.
+    """
+    return load_compiled_mapdata('countries', path, compile_countries_mapdata)['map_data']
+
+def get_boroughs_mapdata(path:str='assets/maps/arrondissements_montreal.geojson'):
+    """
+    Load the cleaned borough data from the compiled artifact, c.f. compile_boroughs_mapdata.
+    """
+    return load_compiled_mapdata('boroughs', path, compile_boroughs_mapdata)['map_data']
+
+def get_districts_ids(path:str='assets/maps/districts_QC.geojson'):
+    """
+    Index of the electoral districts map data : cleaned name (NM_CEP) -> ID.
+    """
+    return load_compiled_mapdata('districts', path, compile_districts_mapdata)['ids']
+
+def get_countries_ids(path:str='assets/maps/countries.geojson'):
+    """
+    Index of the countries map data : cleaned name -> ID.
+    """
+    return load_compiled_mapdata('countries', path, compile_countries_mapdata)['ids']
+
+def get_boroughs_ids(path:str='assets/maps/arrondissements_montreal.geojson'):
+    """
+    Index of the borough map data : cleaned neighborhood name (nom_qr) -> ID.
+    """
+    return load_compiled_mapdata('boroughs', path, compile_boroughs_mapdata)['ids']
+
+@functools.lru_cache(maxsize=None)
+def load_compiled_mapdata(name: str, path: str, compile_fn):
+    """
+    Load the compiled artifact of a GeoJSON file, compiling it first if the file or the compile code changed.
+    The artifact stores the map data as quantized shared arcs (c.f. topology.encode_mapdata),
+    which are decoded back to GeoJSON here.
+    The artifact is only read once per process, so the returned map data is shared and must not be modified.
+    
+    Args:
+        name (str): Name of the map layer, used for the cache file.
+        path (str): Path of the GeoJSON file.
+        compile_fn (callable): One of the compile_*_mapdata functions.
+        
+    Returns:
+        dict: {'map_data': cleaned GeoJSON, 'ids': name -> ID index}
+    """
+    artifact = cached_object(f'mapdata-{name}', path, compile_fn, depends=[encode_mapdata, repair_mojibake, topology])
+    map_data = topology.decode_mapdata(artifact['encoded'])
+    _mapdata_lods[id(map_data)] = (artifact['encoded'], {})
+    return {'map_data': map_data, 'ids': artifact['ids']}
+
+def encode_mapdata(map_data: dict):
+    """
+    Encode cleaned map data for the compiled artifact, and make sure the encoding is lossless
+    at its precision (6 decimals, about 10 cm).
+    """
+    encoded = topology.encode_mapdata(map_data, precision=6)
+    topology.check_encoding(map_data, encoded)
+    return encoded
+
+def repair_mojibake(s: str):
+    """
+    Undo the classic encoding error of UTF-8 text decoded as latin-1 (e.g. 'Sauvé' read as 'SauvÃ©').
+    Strings that are not mojibake are returned unchanged.
+    """
+    for encoding in ('latin-1', 'cp1252'):
+        try:
+            return s.encode(encoding).decode('utf-8')
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return s
+
+def compile_districts_mapdata(path:str):
+    """
+    Load the districts map data from the GeoJSON file and clean it.
+    Use get_districts_mapdata to go through the compiled artifact.
     """
     
     with open(path, 'r', encoding='utf-8-sig') as f:
         map_data = json.load(f)
 
-    # Clean the names
+    # Clean the names (the file has UTF-8 names decoded as latin-1, e.g. 'SauvÃ©')
     for i in range(len(map_data['features'])):
-        map_data['features'][i]['properties']['NM_CEP'] = unidecode(map_data['features'][i]['properties']['NM_CEP'])
-    # Roughly sort. NOT RELIABLE for 1-to-1 matching
+        map_data['features'][i]['properties']['NM_CEP'] = unidecode(repair_mojibake(map_data['features'][i]['properties']['NM_CEP']))
+    # Sort by name. Use the key tables (c.f. keys.py) to match the features with the other sources
     map_data['features'].sort(key=lambda x: x['properties']['NM_CEP'].lower())
     
     # Add unique IDs to use as primary key (and also row order)
     for i in range(len(map_data['features'])):
         map_data['features'][i]['properties']['ID'] = i
         
-    return map_data
+    ids = {f['properties']['NM_CEP']: f['properties']['ID'] for f in map_data['features']}
+    return {'encoded': encode_mapdata(map_data), 'ids': ids}
 
-def get_countries_mapdata(path:str='assets/maps/countries.geojson'):
+def compile_countries_mapdata(path:str):
     """
-    Load the countries data from the GeoJSON
+    Load the countries data from the GeoJSON and clean it.
+    Use get_countries_mapdata to go through the compiled artifact.
     """
     
     with open(path, 'r', encoding='utf-8-sig') as f:
@@ -145,11 +272,13 @@ def get_countries_mapdata(path:str='assets/maps/countries.geojson'):
     for i in range(len(countries_map_data['features'])):
         countries_map_data['features'][i]['properties']['ID'] = i
     
-    return countries_map_data
+    ids = {f['properties']['name']: f['properties']['ID'] for f in countries_map_data['features']}
+    return {'encoded': encode_mapdata(countries_map_data), 'ids': ids}
 
-def get_boroughs_mapdata(path:str='assets/maps/arrondissements_montreal.geojson'):
+def compile_boroughs_mapdata(path:str):
     """
-    Load the borough data from the GeoJSON
+    Load the borough data from the GeoJSON and clean it.
+    Use get_boroughs_mapdata to go through the compiled artifact.
     """
     
     with open(path, 'r', encoding='utf-8-sig') as f:
@@ -167,7 +296,8 @@ def get_boroughs_mapdata(path:str='assets/maps/arrondissements_montreal.geojson'
     for i in range(len(boroughs_map_data['features'])):
         boroughs_map_data['features'][i]['properties']['ID'] = i
     
-    return boroughs_map_data
+    ids = {f['properties']['nom_qr']: f['properties']['ID'] for f in boroughs_map_data['features']}
+    return {'encoded': encode_mapdata(boroughs_map_data), 'ids': ids}
 
 def get_subset_mask(set: list, subset:list):
     """
@@ -186,22 +316,21 @@ def get_subset_mask(set: list, subset:list):
     """
     return np.array([s in subset for s in set])
         
-def get_countries_of_origin(
-    borough: str, 
-    df: pd.DataFrame, 
-    mapdata: dict):
+def get_countries_of_origin_matrix(df: pd.DataFrame, mapdata: dict):
     """
-    Find where people come from in a given borough.
-    This is meant return the "color" variable to use with get_map,
-    to plot on a choropleth map the accurate number of people coming from each country.
-    
+    Number of immigrants of each borough coming from each country of the world map, computed once for all boroughs.
+    Countries that are not listed in the dataframe (e.g. Antarctica) get 0.
+
     Args:
-        borough (str): Name of the borough.
         df (pd.DataFrame): Dataframe with the boroughs data (also called "immigration data" in the project).
-        mapdata (dict): GeoJSON data for the boroughs.
-        
+        mapdata (dict): GeoJSON data for the countries.
+
     Returns:
-        str: Name of the country of origin.
+        dict: With keys
+            'values' (np.ndarray): Matrix of shape (number of boroughs, number of country features),
+                with the same order as the rows of df and the features of mapdata.
+            'countries' (list): Formatted name of each country feature.
+            'boroughs' (dict): Borough name -> row of the matrix.
     """
 
     # Those are the indices of the columns containing "country of origin" info in the dataframe
@@ -238,35 +367,49 @@ def get_countries_of_origin(
         'irak': 'iraq'
     }
 
-    # Already get the subdataframe 
-    df = df[df['Arrondissement']==borough]
-
-    # Prepare some lists for optimization purposes
-    countries = df.columns[
-        np.concatenate((indices['Americas']['main'], indices['Europe']['main'], indices['Africa']['main'], indices['Asia']['main']), axis=0)
-        ].map(lambda s: unidecode(s).lower()).values
-
-    # Always have to format everything......
+    # Formatted name -> index of the first column with that name, for the "country of origin" columns only
     formatted_columns = df.columns.map(lambda s: unidecode(s).lower()).to_list()
+    main_indices = np.concatenate((indices['Americas']['main'], indices['Europe']['main'], indices['Africa']['main'], indices['Asia']['main']), axis=0)
+    country_columns = {formatted_columns[i]: formatted_columns.index(formatted_columns[i]) for i in main_indices}
 
-    # Iteratively fill this list of values
-    color = []
+    # Column of the dataframe feeding each country feature, -1 if the country is not in the dataframe
     country_names = []
+    columns = []
     for feature in mapdata['features']:
-        
-        # Format the country name
         country_name = unidecode(feature['properties']['name_fr']).lower()
-        if country_name in to_change.keys():
-            country_name = to_change[country_name]
-            
-        # If country name is in the dataframe, use the listed value
-        if country_name in countries:
-            idx = formatted_columns.index(country_name)
-            color.append(df.iloc[0, idx])
-            country_names.append(country_name)
-        # Else we don't plot the country (e.g. for Antarctica)
-        else:
-            color.append(0)
-            country_names.append(country_name)
+        country_name = to_change.get(country_name, country_name)
+        country_names.append(country_name)
+        columns.append(country_columns.get(country_name, -1))
+
+    columns = np.array(columns)
+    found = columns >= 0
+    data = df.iloc[:, columns[found]].to_numpy()
+    values = np.zeros((len(df), len(columns)), dtype=data.dtype)
+    values[:, found] = data
 
-    return color, country_names
+    return {
+        'values': values,
+        'countries': country_names,
+        'boroughs': {borough: i for i, borough in enumerate(df['Arrondissement'])},
+    }
+
+def get_countries_of_origin(
+    borough: str, 
+    df: pd.DataFrame, 
+    mapdata: dict):
+    """
+    Find where people come from in a given borough.
+    This is meant return the "color" variable to use with get_map,
+    to plot on a choropleth map the accurate number of people coming from each country.
+    To query several boroughs, compute get_countries_of_origin_matrix once and take its rows instead.
+    
+    Args:
+        borough (str): Name of the borough.
+        df (pd.DataFrame): Dataframe with the boroughs data (also called "immigration data" in the project).
+        mapdata (dict): GeoJSON data for the boroughs.
+        
+    Returns:
+        tuple: Number of immigrants from each country feature, and formatted name of each country feature.
+    """
+    matrix = get_countries_of_origin_matrix(df, mapdata)
+    return list(matrix['values'][matrix['boroughs'][borough]]), matrix['countries']
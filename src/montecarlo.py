@@ -0,0 +1,187 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.cache import cached_result
+
+# Uncertainty level -> standard deviations of the noise on the log of the vote shares, c.f. simulate_elections
+UNCERTAINTY_LEVELS = {
+    'low': {'national': 0.05, 'regional': 0.05, 'district': 0.05},
+    'medium': {'national': 0.10, 'regional': 0.08, 'district': 0.08},
+    'high': {'national': 0.20, 'regional': 0.15, 'district': 0.12},
+}
+# Largest process pool of the simulations, whatever the number of cores
+MAX_PROCESSES = 4
+
+# Process pool of the simulations, c.f. get_pool
+_pool = {}
+
+
+def get_regions(vote_matrix: dict):
+    """
+    Region of every district : the hundreds of its number (e.g. 3xx for the island of Montréal, 7xx for the Capitale-Nationale).
+    """
+    return vote_matrix['number'] // 100
+
+def _simulate_batch(log_shares, regions, sigmas, n_sims, seed):
+    """
+    Simulate n_sims elections at once (c.f. simulate_elections).
+
+    Returns:
+        tuple: Seat counts histogram (party x seats) and number of wins (district x party) over the batch.
+    """
+    rng = np.random.default_rng(seed)
+    n_districts, n_parties = log_shares.shape
+    n_regions = regions.max() + 1
+
+    # One swing per party for the whole province, one per region, and one per district
+    noise = rng.standard_normal((n_sims, n_districts, n_parties), dtype=np.float32)
+    noise *= sigmas['district']
+    noise += sigmas['regional'] * rng.standard_normal((n_sims, n_regions, n_parties), dtype=np.float32)[:, regions]
+    noise += sigmas['national'] * rng.standard_normal((n_sims, 1, n_parties), dtype=np.float32)
+    # The shares do not need to be normalized again to find the winners
+    winners = (log_shares + noise).argmax(axis=2)
+    # Districts without any vote yet are won by nobody
+    decided = np.broadcast_to(np.isfinite(log_shares).any(axis=1), winners.shape).ravel()
+
+    seats = np.bincount(
+        (winners + n_parties * np.arange(n_sims)[:, None]).ravel()[decided], minlength=n_sims * n_parties).reshape(n_sims, n_parties)
+    seats_histogram = np.bincount(
+        (seats + (n_districts + 1) * np.arange(n_parties)).ravel(),
+        minlength=n_parties * (n_districts + 1)).reshape(n_parties, n_districts + 1)
+    wins = np.bincount(
+        (winners + n_parties * np.arange(n_districts)).ravel()[decided], minlength=n_districts * n_parties).reshape(n_districts, n_parties)
+    return seats_histogram, wins
+
+def get_pool(processes: int):
+    """
+    The process pool of the simulations, shared by all the calls and created on first use.
+    Its processes are spawned rather than forked, so that it can be created from a process running other threads
+    without inheriting their locks. Call shutdown_pool before forking (e.g. the gunicorn workers), so that no pool is inherited.
+    """
+    if _pool.get('processes') != processes:
+        shutdown_pool()
+        _pool['executor'] = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        _pool['processes'] = processes
+    return _pool['executor']
+
+def shutdown_pool():
+    """Stop the process pool of the simulations, if any."""
+    executor = _pool.pop('executor', None)
+    _pool.pop('processes', None)
+    if executor is not None:
+        executor.shutdown()
+
+def simulate_elections(shares, regions, national: float, regional: float, district: float, n_sims: int=100_000,
+                       batch_size: int=5_000, seed: int=0, processes: int=1):
+    """
+    Monte Carlo simulation of the elections : the vote shares of every district are perturbed by a noise on their log,
+    the sum of a national swing per party, a regional swing per party shared by the districts of a region
+    (so that neighbouring districts move together), and a swing per district, all normal.
+    The simulations run in batches of arrays, in the calling process by default, or spread across the process pool (c.f. get_pool).
+    Every batch has its own random stream derived from the seed, so the results do not depend on the number of processes.
+
+    Args:
+        shares (np.ndarray): District x party vote shares (%), 0 where a party had no candidate.
+        regions (np.ndarray): Region of every district, as integers.
+        national (float): Standard deviation of the national swing.
+        regional (float): Standard deviation of the regional swings.
+        district (float): Standard deviation of the district swings.
+        n_sims (int): Number of simulated elections, rounded up to a multiple of batch_size.
+        batch_size (int): Number of elections simulated at once by a process.
+        seed (int): Seed of the random streams.
+        processes (int): Number of processes, at most MAX_PROCESSES. With a single one, nothing is spawned :
+            request handlers should keep it that way, and leave the pool to the warm-up (c.f. warm_up_seat_projections).
+
+    Returns:
+        dict: With keys
+            'seats' : party x seats probabilities, i.e. the distribution of the number of seats of every party,
+            'win_probability' : district x party probability of winning the district (0 for all the parties of a district without any vote),
+            'n_sims' : number of simulated elections.
+    """
+    log_shares = np.log(np.where(shares > 0, shares, np.nan)).astype(np.float32)
+    log_shares[np.isnan(log_shares)] = -np.inf
+    regions = np.unique(regions, return_inverse=True)[1]
+    sigmas = {'national': national, 'regional': regional, 'district': district}
+    n_batches = -(-n_sims // batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    args = [(log_shares, regions, sigmas, batch_size, s) for s in seeds]
+
+    processes = min(processes, MAX_PROCESSES, n_batches)
+    if processes <= 1:
+        results = [_simulate_batch(*a) for a in args]
+    else:
+        results = list(get_pool(processes).map(_simulate_batch, *zip(*args)))
+
+    n_sims = n_batches * batch_size
+    return {
+        'seats': sum(r[0] for r in results) / n_sims,
+        'win_probability': sum(r[1] for r in results) / n_sims,
+        'n_sims': n_sims,
+    }
+
+def get_seat_projection(vote_matrix: dict, uncertainty: str='medium', n_sims: int=100_000, min_share: float=10, seed: int=0,
+                        processes: int=1):
+    """
+    Seat projection from the vote matrix (c.f. votes.py and simulate_elections), cached on disk by a hash of the shares and parameters.
+    Parties never reaching min_share (%) in a district are left out of the simulation : they cannot win a seat.
+
+    Args:
+        vote_matrix (dict): The vote matrix.
+        uncertainty (str): Level of noise, one of UNCERTAINTY_LEVELS.
+        n_sims (int): Number of simulated elections.
+        min_share (float): Minimal share (%) of the simulated parties.
+        seed (int): Seed of the random streams.
+        processes (int): Number of processes of the simulation, if not cached yet (c.f. simulate_elections).
+
+    Returns:
+        dict: The result of simulate_elections, plus
+            'parties' : abbreviation of the simulated parties, in the order of the columns,
+            'majority' : probability of every party to win a majority of the seats,
+            'bands' : party x 2, 5th and 95th percentiles of the number of seats of every party,
+            'mean_seats' : expected number of seats of every party.
+    """
+    columns = np.flatnonzero(vote_matrix['shares'].max(axis=0) >= min_share)
+    if len(columns) == 0:
+        # No results yet : every party is kept, and every seat stays undecided
+        columns = np.arange(len(vote_matrix['parties']))
+    # The number of processes does not change the result, so it is not part of the cache key
+    def simulate(**params):
+        return simulate_elections(**params, processes=processes)
+
+    projection = cached_result('seat-projection', {
+        'shares': vote_matrix['shares'][:, columns],
+        'regions': get_regions(vote_matrix),
+        **UNCERTAINTY_LEVELS[uncertainty],
+        'n_sims': n_sims,
+        'seed': seed,
+    }, simulate, depends=[simulate_elections, _simulate_batch])
+
+    seats = projection['seats']
+    n_districts = seats.shape[1] - 1
+    cumulative = seats.cumsum(axis=1)
+    return {
+        **projection,
+        'parties': [vote_matrix['parties'][i] for i in columns],
+        'majority': seats[:, n_districts // 2 + 1:].sum(axis=1),
+        'bands': np.stack([(cumulative < q).sum(axis=1) for q in (0.05, 0.95)], axis=1),
+        'mean_seats': seats @ np.arange(n_districts + 1),
+    }
+
+def warm_up_seat_projections(vote_matrix: dict, processes: int=None):
+    """
+    Simulate every uncertainty level ahead of the requests, across the process pool, then stop it.
+    Meant for the gunicorn master before the workers are forked : the request handlers then read the projections
+    from the cache, and only simulate in their own process if the results changed since (e.g. on election night).
+
+    Args:
+        vote_matrix (dict): The vote matrix.
+        processes (int): Number of processes, os.cpu_count() by default (at most MAX_PROCESSES).
+    """
+    try:
+        for uncertainty in UNCERTAINTY_LEVELS:
+            get_seat_projection(vote_matrix, uncertainty, processes=processes or os.cpu_count() or 1)
+    finally:
+        shutdown_pool()
@@ -0,0 +1,49 @@
+from dash import Patch
+
+
+def get_figure_updates(fig, trace_keys: list=(), layout_paths: list=()):
+    """
+    Extract the parts of a figure that change from one selection to the next (e.g. the values of a choropleth),
+    so that a callback can send them alone instead of the whole figure (c.f. to_patch).
+    Everything else (geometry, styling, ...) is expected to already be in the browser.
+
+    Args:
+        fig (go.Figure or dict): The figure, as it would be sent in full.
+        trace_keys (list): Properties to take from every trace that has them, e.g. ['x', 'text'].
+        layout_paths (list): Paths of layout properties, e.g. [('title', 'text'), ('annotations', 0, 'text')].
+
+    Returns:
+        list: (path, value) pairs, with paths starting from the root of the figure.
+    """
+    fig = fig if isinstance(fig, dict) else fig.to_plotly_json()
+    updates = []
+    for i, trace in enumerate(fig['data']):
+        for key in trace_keys:
+            if key in trace:
+                updates.append((('data', i, key), _to_json_value(trace[key])))
+    for path in layout_paths:
+        value = fig['layout']
+        for key in path:
+            value = value[key]
+        updates.append((('layout', *path), _to_json_value(value)))
+    return updates
+
+def to_patch(updates: list):
+    """
+    Turn the (path, value) pairs of get_figure_updates into a Dash Patch, to return from a callback.
+    """
+    patch = Patch()
+    for path, value in updates:
+        target = patch
+        for key in path[:-1]:
+            target = target[key]
+        target[path[-1]] = value
+    return patch
+
+def _to_json_value(value):
+    # Arrays (and tuples) become lists, so that the updates can be cached and sent as is
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, tuple):
+        return list(value)
+    return value
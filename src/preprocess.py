@@ -1,7 +1,11 @@
+import fnmatch
+
 import numpy as np
 import pandas as pd
 from unidecode import unidecode
 
+from src.cache import cached_frame
+
 # Constants
 
 political_parties = {
@@ -11,11 +15,34 @@ political_parties = {
     4: "Parti québécois"
     }
 
-def get_demographics_data(path:str='assets/data/donneesSocio2021.csv'):
+# Declared type, unit and number format of every column of the demographics CSV, c.f. parse_columns
+DEMOGRAPHICS_SCHEMA_PATH = 'assets/data/donneesSocio2021.schema.csv'
+
+# Unit -> (symbol written after the values, range of valid values)
+UNITS = {
+    '%': ('%', (0, 100)),
+    '$': ('', (0, np.inf)),
+    'count': ('', (0, np.inf)),
+    'years': ('', (0, np.inf)),
+    '': ('', (-np.inf, np.inf)),
+}
+
+def get_demographics_data(path:str='assets/data/donneesSocio2021.csv', schema_path:str=DEMOGRAPHICS_SCHEMA_PATH):
     """
     Load the demographics data from the CSV file and clean it.
+    The cleaned data is cached on disk and only re-cleaned when the CSV, its schema or the cleaning code changes.
     """
-    df_dem = pd.read_csv(path, sep=';')
+    return cached_frame(
+        'demographics', path, lambda path: clean_demographics_data(path, schema_path),
+        depends=[clean_demographics_data, parse_columns], sources=[schema_path])
+
+def clean_demographics_data(path:str, schema_path:str=DEMOGRAPHICS_SCHEMA_PATH):
+    """
+    Parse and clean the raw demographics CSV. Use get_demographics_data to go through the cache.
+    """
+    schema = pd.read_csv(schema_path, sep=';', dtype=str, keep_default_na=False)
+    df_dem = pd.read_csv(path, sep=';', dtype=str, keep_default_na=False)
+    df_dem = parse_columns(df_dem, schema)
     
     # Clean the names
     df_dem.rename(columns={s:unidecode(s) for s in df_dem.columns}, inplace=True)
@@ -31,12 +58,84 @@ def get_demographics_data(path:str='assets/data/donneesSocio2021.csv'):
     df_dem.sort_values(by='Circonscription', inplace=True, key=lambda x: x.str.lower())
     df_dem = df_dem.reset_index(drop=True)  
     
-    # Convert the percentages from str to float
-    for i in range(len(df_dem.columns)):
-        if df_dem.dtypes.iloc[i] == 'object' and df_dem.columns[i] not in ['Circonscription']:
-            df_dem.iloc[:,i] = df_dem.iloc[:,i].str[:-1].map(lambda s: float(s.replace(',', '.').replace(' ', '')) if s else 0)
-    
     return df_dem
+
+def parse_columns(df: pd.DataFrame, schema: pd.DataFrame):
+    """
+    Parse the raw text columns of a CSV (read with dtype=str) according to a declared schema.
+    All the numeric columns sharing the same separators are parsed at once.
+    Every problem found (missing or undeclared column, unparsable value, wrong unit, value out of range, ...)
+    is reported, column by column, in a single error.
+
+    Args:
+        df (pd.DataFrame): The CSV, read with dtype=str and keep_default_na=False.
+        schema (pd.DataFrame): One row per column, with
+            'column': the name of the column, as read by pandas.
+            'dtype': 'str', 'int64' or 'float64'. Empty values become NaN, so they are only allowed in float64 columns.
+            'unit': A key of UNITS, e.g. '%' for values written as '12,5%'.
+            'decimal', 'thousands': The decimal and thousands separators of the values.
+
+    Returns:
+        pd.DataFrame: The parsed columns, in the order of the schema.
+
+    Raises:
+        ValueError: Listing the problems of each column.
+    """
+    errors = [f'{c!r}: missing from the file' for c in schema['column'] if c not in df.columns]
+    errors += [f'{c!r}: not declared in the schema' for c in df.columns if c not in set(schema['column'])]
+    errors += [f'{c!r}: unknown unit {u!r}' for c, u in zip(schema['column'], schema['unit']) if u not in UNITS]
+    if errors:
+        raise ValueError('Invalid columns:\n' + '\n'.join(errors))
+
+    columns = {c: df[c].to_numpy() for c in schema.loc[schema['dtype'] == 'str', 'column']}
+    numeric = schema[schema['dtype'] != 'str']
+    for (decimal, thousands), group in numeric.groupby(['decimal', 'thousands'], sort=False):
+        text = np.char.strip(df[group['column']].to_numpy(dtype=str))
+
+        # Strip the unit symbols, checking that each column has the symbol of its unit
+        for symbol in {UNITS[u][0] for u in UNITS if UNITS[u][0]}:
+            has_symbol = np.char.endswith(text, symbol)
+            expected = (group['unit'].map(lambda u: UNITS[u][0]) == symbol).to_numpy()
+            for j in np.where((has_symbol & ~expected).any(axis=0) | ((~has_symbol & (text != '')) & expected).any(axis=0))[0]:
+                errors.append(f'{group["column"].iloc[j]!r}: values {"without" if expected[j] else "with"} the unit {symbol!r}')
+            text = np.char.rstrip(np.char.rstrip(text, symbol))
+
+        if thousands:
+            text = np.char.replace(text, thousands, '')
+        if decimal and decimal != '.':
+            text = np.char.replace(text, decimal, '.')
+        empty = text == ''
+        text = np.where(empty, 'nan', text)
+
+        try:
+            values = text.astype(np.float64)
+        except ValueError:
+            # Find the culprits
+            values = np.empty(text.shape)
+            for j in range(text.shape[1]):
+                parsed = pd.to_numeric(pd.Series(text[:, j]), errors='coerce').to_numpy(dtype=np.float64)
+                bad = np.isnan(parsed) & ~empty[:, j] & (text[:, j] != 'nan')
+                if bad.any():
+                    errors.append(f'{group["column"].iloc[j]!r}: unparsable values {sorted({str(v) for v in text[bad, j]})[:5]}')
+                values[:, j] = parsed
+
+        for j, (column, dtype, unit) in enumerate(group[['column', 'dtype', 'unit']].itertuples(index=False)):
+            low, high = UNITS[unit][1]
+            valid = values[~np.isnan(values[:, j]), j]
+            if ((valid < low) | (valid > high)).any():
+                errors.append(f'{column!r}: values out of [{low}, {high}] for the unit {unit!r}')
+            if dtype == 'int64':
+                if empty[:, j].any():
+                    errors.append(f'{column!r}: {empty[:, j].sum()} missing values in an int64 column')
+                    continue
+                if (valid != np.round(valid)).any():
+                    errors.append(f'{column!r}: non-integer values in an int64 column')
+                    continue
+            columns[column] = values[:, j].astype(dtype)
+
+    if errors:
+        raise ValueError('Invalid columns:\n' + '\n'.join(errors))
+    return pd.DataFrame({c: columns[c] for c in schema['column']}, index=df.index)
     
 def get_boroughs_data(path:str='assets/data/arrondissements.csv'):
     """
@@ -50,8 +149,14 @@ def get_elections_data(path:str='assets/data/resultats.csv'):
     """
     Load the elections data from the CSV file and clean it.
     Group by district for easy plotting on a map.
+    The cleaned data is cached on disk and only re-cleaned when the CSV or the cleaning code changes.
+    """
+    return cached_frame('elections', path, clean_elections_data)
+
+def clean_elections_data(path:str):
+    """
+    Parse and clean the raw elections CSV. Use get_elections_data to go through the cache.
     """
-    
     df = pd.read_csv(path, sep=',')
     
     # Clean
@@ -66,25 +171,72 @@ def nb_candidates_per_circo(df:pd.DataFrame):
     df_grouped = df.groupby('nomCirconscription').apply(lambda x: x.shape[0])
     return df_grouped
 
+# How vote_summary_by_circo summarizes each column, c.f. aggregate_by
+VOTE_SUMMARY_SPEC = {
+    'taux*': 'mean',
+    'nbBureauTotal': 'mean',
+    'nbVoteValide': 'mean',
+    'nbVoteRejete': 'mean',
+    'nbVoteExerce': 'mean',
+    'nbElecteurInscrit': 'mean',
+    'nbVoteTotal': 'sum',
+    'nbVoteAvance': 'sum',
+}
+
+def aggregate_by(df:pd.DataFrame, by:str, spec:dict, weights:str='nbElecteurInscrit'):
+    """
+    Group the rows of df by a column and aggregate every other column as declared in spec, in a single groupby pass.
+
+    Args:
+        df (pd.DataFrame): The data.
+        by (str): Column to group by.
+        spec (dict): Column name or fnmatch pattern (e.g. 'taux*') -> aggregation, among
+            'sum', 'mean', 'first' and 'weighted_mean' (mean weighted by the weights column).
+            Exact names take precedence over patterns.
+        weights (str): Column of the weights, for 'weighted_mean'.
+
+    Returns:
+        pd.DataFrame: One row per group, sorted by key, with the key as a column followed by the aggregated columns in their original order.
+
+    Raises:
+        ValueError: If a column matches no entry of spec, or an aggregation is unknown.
+    """
+    columns = [c for c in df.columns if c != by]
+    aggregations = {}
+    for col in columns:
+        if col in spec:
+            aggregations[col] = spec[col]
+        else:
+            patterns = [p for p in spec if fnmatch.fnmatchcase(col, p)]
+            if not patterns:
+                raise ValueError(f'Unknown column type : {col}. Expected one of {list(spec)}')
+            aggregations[col] = spec[patterns[0]]
+    unknown = set(aggregations.values()) - {'sum', 'mean', 'first', 'weighted_mean'}
+    if unknown:
+        raise ValueError(f'Unknown aggregations : {sorted(unknown)}')
+
+    # Weighted means are a ratio of two sums : sum(x * w) / sum(w), both computed in the same pass as the rest
+    weighted = [c for c in columns if aggregations[c] == 'weighted_mean']
+    named = {c: (c, aggregations[c]) for c in columns if c not in weighted}
+    df = df.assign(
+        **{f'{c}*w': df[c] * df[weights] for c in weighted},
+        **({'*w': df[weights]} if weighted else {}))
+    named.update({f'{c}*w': (f'{c}*w', 'sum') for c in weighted})
+    if weighted:
+        named['*w'] = ('*w', 'sum')
+
+    df_grouped = df.groupby(by).agg(**named)
+    for c in weighted:
+        df_grouped[c] = df_grouped[f'{c}*w'] / df_grouped['*w']
+    return df_grouped[columns].reset_index()
+
 def vote_summary_by_circo(df:pd.DataFrame):
     """
     Group the elections data by circonscription, making a summary.
-    Columns starting with "nb" are summed, columns starting with "taux" are averaged.
+    Columns are summed or averaged as declared in VOTE_SUMMARY_SPEC.
     If you want info for a specific party only, you can just pass as argument the sub-dataframe 
     contaiing only the data from that party, e.g. df[df['abreviationPartiPolitique']=='P.L.Q/L.P.Q']
     """
-    
-    def reduction_fn(x):
-        out = []
-        for col in x.columns:
-            if col.startswith('taux') or col in ['nbBureauTotal', 'nbVoteValide', 'nbVoteRejete', 'nbVoteExerce', 'nbElecteurInscrit' ]:
-                out.append(x[col].mean())
-            elif col in ['nbVoteTotal', 'nbVoteAvance']:
-                out.append(x[col].sum())
-            else:
-                raise ValueError(f'Unknown column type : {col}. Only processing columns starting with "taux" or "nb"')
-        return pd.DataFrame(data=[out], columns=x.columns)
-
     df_dropped = df.drop(columns=[
         'numeroCirconscription', 
         'numeroCandidat', 
@@ -93,12 +245,13 @@ def vote_summary_by_circo(df:pd.DataFrame):
         'abreviationPartiPolitique', 
         'numeroPartiPolitique', 
         'nbBureauComplete'])
-    df_grouped = df_dropped.groupby('nomCirconscription').apply(reduction_fn, include_groups=False).reset_index()
+    df_grouped = aggregate_by(df_dropped, 'nomCirconscription', VOTE_SUMMARY_SPEC)
+    # Kept for compatibility with the former groupby-apply output, which had one row (0) per district
+    df_grouped.insert(1, 'level_1', 0)
     df_grouped = df_grouped.sort_values(by='nomCirconscription', key=lambda x: x.str.lower()).reset_index(drop=True)
 
     return df_grouped
 
-
 def group_elections_data_as_party(df, circonscription=None, party='Q.S.'):
     """
     return the vote rate of a specific party in a specific circonscription
@@ -133,12 +286,11 @@ def get_taux_vote_per_district(df):
 
 def get_elections_data_by_winning_party(df):
     """
-    Group the elections data by winning party.
+    Group the elections data by winning party : the row of the candidate with the most votes in every circonscription.
     """
     
-    df_grouped =  df.groupby('nomCirconscription').agg({'abreviationPartiPolitique': 'first', 'nbVoteAvance': 'first'}).reset_index()
-    # only keep the winning party
-    df_grouped['nbVoteAvance'] == df_grouped.groupby('nomCirconscription')['nbVoteAvance'].transform("max")
+    winners = df.groupby('nomCirconscription')['nbVoteTotal'].idxmax()
+    df_grouped = df.loc[winners, ['nomCirconscription', 'abreviationPartiPolitique', 'nbVoteAvance']].reset_index(drop=True)
     
     return df_grouped
 
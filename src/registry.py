@@ -0,0 +1,133 @@
+import threading
+import time
+
+# name -> (builder, names of the dependencies)
+_builders = {}
+# name -> built value
+_values = {}
+# name -> lock, so that a value is never built twice concurrently (e.g. by a request and the warm-up thread)
+_locks = {}
+# Incremented every time a value is built or invalidated, c.f. get_version
+_version = 0
+# name -> value of _version when it was last built, replaced or dropped, c.f. get_versions
+_versions = {}
+_version_lock = threading.Lock()
+
+
+def register(name: str, builder, depends: list=()):
+    """
+    Declare a dataset or a figure. Nothing is built here : the value is built on first request (c.f. get),
+    by calling builder with the values of its dependencies as positional arguments.
+
+    Args:
+        name (str): Unique name of the value.
+        builder (callable): Function building the value.
+        depends (list): Names of the registered values passed to builder, in order.
+    """
+    _builders[name] = (builder, list(depends))
+    _locks[name] = threading.Lock()
+    _values.pop(name, None)
+
+def get(name: str):
+    """
+    Return a registered value, building it (and its dependencies) if needed.
+    """
+    if name in _values:
+        return _values[name]
+
+    builder, depends = _builders[name]
+    args = [get(d) for d in depends]
+    with _locks[name]:
+        # Another thread may have built it while we were waiting
+        if name not in _values:
+            _values[name] = builder(*args)
+            _bump_version([name])
+    return _values[name]
+
+def invalidate(names: list):
+    """
+    Drop the built values with the given names, and the ones depending on them (directly or not).
+    They will be rebuilt on next request.
+    """
+    dropped = set(names) | _get_dependents(names)
+    for name in dropped:
+        _values.pop(name, None)
+    _bump_version(dropped)
+
+def replace(name: str, value):
+    """
+    Set a registered value directly (e.g. updated incrementally instead of rebuilt from its dependencies),
+    and drop the values depending on it, which will be rebuilt on next request.
+    """
+    with _locks[name]:
+        dependents = _get_dependents([name])
+        for dependent in dependents:
+            _values.pop(dependent, None)
+        _values[name] = value
+    _bump_version(dependents | {name})
+
+def _get_dependents(names: list):
+    # Names of the values depending on the given ones, directly or not
+    dependents = set()
+    changed = True
+    while changed:
+        changed = False
+        for name, (_, depends) in _builders.items():
+            if name not in dependents and (dependents.union(names)).intersection(depends):
+                dependents.add(name)
+                changed = True
+    return dependents
+
+def get_version():
+    """
+    Counter incremented every time a value is built or invalidated.
+    Anything derived from the registered values (e.g. a serialized layout) is stale once it changes.
+    """
+    return _version
+
+def get_versions(names: list):
+    """
+    Versions of the given values : unlike get_version, they only change when one of these values is built, replaced or dropped
+    (e.g. because a dependency was replaced), so that anything derived from them is not made stale by unrelated values.
+    """
+    return tuple(_versions.get(name, 0) for name in names)
+
+def _bump_version(names: list):
+    global _version
+    with _version_lock:
+        _version += 1
+        for name in names:
+            _versions[name] = _version
+
+def is_built(name: str):
+    """
+    Whether a registered value has already been built.
+    """
+    return name in _values
+
+def warm_up(names: list=None):
+    """
+    Build the given registered values (all of them by default), in registration order.
+
+    Returns:
+        dict: name -> build time in seconds, for the values built by this call.
+    """
+    timings = {}
+    for name in (list(_builders) if names is None else names):
+        if not is_built(name):
+            start = time.perf_counter()
+            get(name)
+            timings[name] = time.perf_counter() - start
+    return timings
+
+def warm_up_in_background(names: list=None):
+    """
+    Same as warm_up, in a daemon thread, so that the server can accept connections meanwhile.
+    Requests needing a value that is being built simply wait for it.
+
+    Returns:
+        threading.Thread: The warm-up thread.
+    """
+    thread = threading.Thread(target=warm_up, args=(names,), name='warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,75 @@
+import numpy as np
+
+from src.votes import UNDECIDED
+
+# Scenarios of apply_swing, in the order of the dashboard
+SCENARIOS = ['montreal', 'uniform', 'proportional']
+
+
+def get_vote_profile(vote_matrix: dict, rows=None):
+    """
+    Share of the valid votes (%) of every party over the given districts (e.g. Montréal's), or all of them.
+    """
+    votes = vote_matrix['votes'] if rows is None else vote_matrix['votes'][rows]
+    votes = votes.sum(axis=0)
+    return 100 * votes / votes.sum()
+
+def apply_swing(vote_matrix: dict, scenario: str, amount: float, source: str=None, target: str=None, profile_rows=None):
+    """
+    Shares of the votes of every party in every district after a swing, computed for all the districts at once
+    from the vote matrix (c.f. votes.py), so that a scenario costs a few array operations rather than a pandas pipeline.
+
+    Args:
+        vote_matrix (dict): The vote matrix.
+        scenario (str): One of SCENARIOS :
+            'montreal' : every party gains amount % of the gap between its share of the votes in the profile_rows districts
+                (e.g. Montréal) and province-wide, in every district (uniform swing towards that vote profile),
+            'uniform' : amount points of the share of the source party go to the target party in every district
+                (at most the share of the source),
+            'proportional' : amount % of the share of the source party goes to the target party in every district.
+        amount (float): Size of the swing, c.f. scenario.
+        source (str): Abbreviation of the party losing votes, for the transfers.
+        target (str): Abbreviation of the party gaining votes, for the transfers.
+        profile_rows (np.ndarray): Rows of the districts whose vote profile is applied, for 'montreal'.
+
+    Returns:
+        np.ndarray: District x party shares (%). Votes only go to the parties with a candidate in the district.
+
+    Raises:
+        ValueError: If the scenario is unknown.
+    """
+    shares = vote_matrix['shares'].copy()
+    ran = vote_matrix['ran']
+
+    if scenario == 'montreal':
+        shares += amount / 100 * (get_vote_profile(vote_matrix, profile_rows) - get_vote_profile(vote_matrix))
+        shares[~ran] = 0
+        np.clip(shares, 0, None, out=shares)
+    elif scenario in ('uniform', 'proportional'):
+        s, t = vote_matrix['columns'][source], vote_matrix['columns'][target]
+        if scenario == 'uniform':
+            moved = np.minimum(amount, shares[:, s])
+        else:
+            moved = shares[:, s] * amount / 100
+        # Without a candidate of the target party, the votes stay where they are
+        moved *= ran[:, t]
+        shares[:, s] -= moved
+        shares[:, t] += moved
+    else:
+        raise ValueError(f'Unknown scenario : {scenario!r}')
+    return shares
+
+def get_scenario_winners(vote_matrix: dict, shares):
+    """
+    Column of the party winning every district with the given shares (c.f. apply_swing),
+    like vote_matrix['winners'] for the actual results : the districts without any vote stay UNDECIDED.
+    """
+    winners = np.where(vote_matrix['ran'], shares, -np.inf).argmax(axis=1)
+    return np.where(vote_matrix['votes'].sum(axis=1) > 0, winners, UNDECIDED)
+
+def get_seat_totals(vote_matrix: dict, winners):
+    """
+    Number of seats of every party, as abbreviation -> seats, for the parties winning at least one (undecided districts left out).
+    """
+    seats = np.bincount(winners[winners != UNDECIDED], minlength=len(vote_matrix['parties']))
+    return {vote_matrix['parties'][i]: int(seats[i]) for i in np.flatnonzero(seats)}
@@ -0,0 +1,83 @@
+import gc
+import json
+import os
+
+import flask
+
+# Fields of /proc/<pid>/smaps_rollup reported by get_memory_usage, in kB
+MEMORY_FIELDS = ['Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty']
+
+
+def freeze_shared_state():
+    """
+    To call in the gunicorn master once everything is loaded, right before forking the workers.
+    Moves every object allocated so far to the permanent generation of the garbage collector,
+    so that collections in the workers never write to them : their pages stay shared with the master.
+    """
+    gc.collect()
+    gc.freeze()
+
+def get_memory_usage(pid='self'):
+    """
+    Memory usage of a process, in kB (Linux only).
+    Rss is the resident memory, Pss splits the shared pages between the processes sharing them,
+    Shared_* are the pages also mapped by other processes (e.g. inherited from the gunicorn master).
+
+    Args:
+        pid (int or str): Process ID, 'self' for the current process.
+
+    Returns:
+        dict: Field -> kB, c.f. MEMORY_FIELDS. Empty if /proc is not available.
+    """
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                field, _, value = line.partition(':')
+                if field in MEMORY_FIELDS:
+                    usage[field] = int(value.split()[0])
+    except OSError:
+        return usage
+
+    usage['Shared'] = usage.get('Shared_Clean', 0) + usage.get('Shared_Dirty', 0)
+    usage['Private'] = usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0)
+    return usage
+
+def get_worker_pids(master_pid: int):
+    """
+    PIDs of the gunicorn workers, i.e. the children of the master (Linux only).
+    """
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children', 'r') as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+def format_memory_usage(pid='self'):
+    """
+    One-line summary of the memory usage of a process, for the logs.
+    """
+    usage = get_memory_usage(pid)
+    if not usage:
+        return f'pid {pid}: memory usage not available'
+    return 'pid {}: rss {:.1f} MB, pss {:.1f} MB, shared {:.1f} MB, private {:.1f} MB'.format(
+        os.getpid() if pid == 'self' else pid,
+        usage['Rss'] / 1024, usage['Pss'] / 1024, usage['Shared'] / 1024, usage['Private'] / 1024)
+
+def install_memory_report(server: flask.Flask, path: str='/_memory'):
+    """
+    Add a route reporting the memory usage of the gunicorn master and of every worker, as JSON.
+    Only answers requests coming from the machine itself.
+    """
+
+    @server.route(path)
+    def memory_report():
+        if flask.request.remote_addr not in ('127.0.0.1', '::1'):
+            flask.abort(404)
+        master_pid = os.getppid()
+        report = {
+            'worker': os.getpid(),
+            'master': {'pid': master_pid, **get_memory_usage(master_pid)},
+            'workers': [{'pid': pid, **get_memory_usage(pid)} for pid in get_worker_pids(master_pid)],
+        }
+        return flask.Response(json.dumps(report), mimetype='application/json')
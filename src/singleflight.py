@@ -0,0 +1,58 @@
+import functools
+import json
+import threading
+
+import plotly
+
+
+def single_flight(fn):
+    """
+    Decorator coalescing concurrent identical calls : while a call is running, the calls with the same arguments
+    wait for it and return its result (or raise its exception) instead of computing it again.
+    Nothing is kept once the call is over, so this is not a cache : it only flattens bursts of identical requests,
+    e.g. many users picking the same party or scenario at once.
+
+    The arguments must be JSON-serializable (like the inputs of a Dash callback), they are compared by value.
+    The result is serialized once, and every waiting caller gets its own copy decoded from that JSON
+    (e.g. the dict a Dash Patch is sent as), so that no caller can modify the result of another.
+    """
+    # key -> {'done', 'waiting', 'body', 'error'}, for the calls currently running
+    flights = {}
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        key = json.dumps(args, sort_keys=True)
+        with lock:
+            flight = flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = flights[key] = {'done': threading.Event(), 'waiting': 0, 'body': None, 'error': None}
+            else:
+                flight['waiting'] += 1
+
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return json.loads(flight['body'])
+
+        try:
+            result = fn(*args)
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            # No caller can join the flight once it is removed : the result is only serialized if some are waiting
+            with lock:
+                del flights[key]
+            try:
+                if flight['waiting'] and flight['error'] is None:
+                    flight['body'] = json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder)
+            except Exception as e:
+                flight['error'] = e
+            finally:
+                flight['done'].set()
+        return result
+
+    return wrapper
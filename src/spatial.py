@@ -0,0 +1,166 @@
+import numpy as np
+
+from src.cache import cached_result
+from src.crosswalk import get_bounds, get_layers, rasterize
+from src.topology import get_polygons
+
+
+def build_index(map_data: dict, ids, resolution: int=1024):
+    """
+    Uniform grid index of a map layer for point-in-polygon queries (c.f. locate_many).
+    Every cell stores the feature containing its center, and the edges of the polygons passing through it :
+    a point is in the feature of the center of its cell, unless the short path from that center crosses some edges.
+
+    Args:
+        map_data (dict): GeoJSON feature collection of Polygons and MultiPolygons, not overlapping.
+        ids (np.ndarray): ID of every feature (e.g. from the key tables, c.f. crosswalk.get_layers), -1 to leave it out.
+        resolution (int): Number of cells along the longest side of the layer.
+
+    Returns:
+        dict: {'grid' : c.f. crosswalk.rasterize, 'labels' : ID of the feature at the center of every cell (-1 for none),
+            'offsets', 'edges' : edges of every cell, as CSR arrays, 'xa', 'ya', 'xb', 'yb', 'feature' : the edges}.
+    """
+    features = [(feature, i) for feature, i in zip(map_data['features'], ids) if i >= 0]
+    bounds = np.array([get_bounds(feature) for feature, _ in features])
+    x_min, y_min = bounds[:, :2].min(axis=0)
+    x_max, y_max = bounds[:, 2:].max(axis=0)
+    size = max(x_max - x_min, y_max - y_min) / resolution
+    grid = {
+        'x0': x_min + size / 2, 'y0': y_min + size / 2, 'dx': size, 'dy': size,
+        'nx': max(int(np.ceil((x_max - x_min) / size)), 1), 'ny': max(int(np.ceil((y_max - y_min) / size)), 1),
+    }
+
+    labels = np.full((grid['ny'], grid['nx']), -1, dtype=np.int32)
+    edges, edge_features = [], []
+    for feature, i in features:
+        labels[rasterize(feature, grid)] = i
+        for polygon in get_polygons(feature['geometry']):
+            for ring in polygon:
+                ring = np.asarray(ring, dtype=float)[:, :2]
+                edges.append(np.concatenate([ring[:-1], ring[1:]], axis=1))
+                edge_features.append(np.full(len(ring) - 1, i))
+    xa, ya, xb, yb = np.concatenate(edges).T
+    edge_features = np.concatenate(edge_features)
+
+    # Every edge goes in all the cells of its bounding box
+    column_low, column_high = (np.clip(np.floor((v - x_min) / size), 0, grid['nx'] - 1).astype(int) for v in (np.minimum(xa, xb), np.maximum(xa, xb)))
+    row_low, row_high = (np.clip(np.floor((v - y_min) / size), 0, grid['ny'] - 1).astype(int) for v in (np.minimum(ya, yb), np.maximum(ya, yb)))
+    widths, heights = column_high - column_low + 1, row_high - row_low + 1
+    counts = widths * heights
+    edge = np.repeat(np.arange(len(counts)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = (row_low[edge] + k // widths[edge]) * grid['nx'] + column_low[edge] + k % widths[edge]
+
+    order = np.argsort(cells, kind='stable')
+    offsets = np.zeros(grid['nx'] * grid['ny'] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=grid['nx'] * grid['ny']), out=offsets[1:])
+    return {
+        'grid': grid,
+        'labels': labels,
+        'offsets': offsets,
+        'edges': edge[order].astype(np.int32),
+        'xa': xa, 'ya': ya, 'xb': xb, 'yb': yb,
+        'feature': edge_features,
+    }
+
+def locate_many(index: dict, lat, lon, max_pairs: int=1 << 22):
+    """
+    Feature containing every point, e.g. to geocode addresses onto the circonscriptions in bulk.
+    Only the edges of the cell of every point are tested, for all the points at once : the path from the center of the cell
+    to the point goes horizontally, then vertically, and every edge it crosses toggles the point in or out of that edge's feature
+    (same even-odd rule as crosswalk.rasterize). Points in a cell without any edge cost a lookup.
+
+    Args:
+        index (dict): Index of a layer, c.f. build_index.
+        lat (array-like): Latitudes of the points.
+        lon (array-like): Longitudes of the points.
+        max_pairs (int): Number of point-edge pairs tested at once, to bound the memory used.
+
+    Returns:
+        np.ndarray: ID of the feature containing every point, -1 if none.
+    """
+    grid = index['grid']
+    y = np.atleast_1d(np.asarray(lat, dtype=float))
+    x = np.atleast_1d(np.asarray(lon, dtype=float))
+    columns = np.floor((x - grid['x0']) / grid['dx'] + 0.5)
+    rows = np.floor((y - grid['y0']) / grid['dy'] + 0.5)
+    points = np.flatnonzero((columns >= 0) & (columns < grid['nx']) & (rows >= 0) & (rows < grid['ny']))
+    columns, rows = columns[points].astype(np.int64), rows[points].astype(np.int64)
+
+    result = np.full(len(y), -1, dtype=np.int64)
+    result[points] = index['labels'][rows, columns]
+
+    # Only the points with edges in their cell need to be tested, in chunks of at most max_pairs pairs
+    cells = rows * grid['nx'] + columns
+    counts = index['offsets'][cells + 1] - index['offsets'][cells]
+    tested = np.flatnonzero(counts)
+    ends = np.cumsum(counts[tested])
+    start = 0
+    while start < len(tested):
+        stop = max(np.searchsorted(ends, (ends[start - 1] if start else 0) + max_pairs, side='right'), start + 1)
+        chunk = tested[start:stop]
+        result[points[chunk]] = _toggle(
+            index, x[points[chunk]], y[points[chunk]], rows[chunk], columns[chunk], result[points[chunk]])
+        start = stop
+    return result
+
+def _toggle(index: dict, x, y, rows, columns, labels):
+    """
+    Feature of the points, from the feature of the center of their cell (labels) and the edges of their cell, c.f. locate_many.
+    """
+    grid = index['grid']
+    cells = rows * grid['nx'] + columns
+    counts = index['offsets'][cells + 1] - index['offsets'][cells]
+    pair_points = np.repeat(np.arange(len(cells)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    edges = index['edges'][index['offsets'][cells][pair_points] + k]
+    xa, ya, xb, yb = index['xa'][edges], index['ya'][edges], index['xb'][edges], index['yb'][edges]
+    px, py = x[pair_points], y[pair_points]
+    cx = grid['x0'] + columns[pair_points] * grid['dx']
+    cy = grid['y0'] + rows[pair_points] * grid['dy']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Horizontal leg, from (cx, cy) to (px, cy)
+        spans = (np.minimum(ya, yb) <= cy) & (cy < np.maximum(ya, yb))
+        crossing = xa + (cy - ya) * (xb - xa) / (yb - ya)
+        crosses = spans & (np.minimum(cx, px) < crossing) & (crossing <= np.maximum(cx, px))
+        # Vertical leg, from (px, cy) to (px, py)
+        spans = (np.minimum(xa, xb) <= px) & (px < np.maximum(xa, xb))
+        crossing = ya + (px - xa) * (yb - ya) / (xb - xa)
+        crosses ^= spans & (np.minimum(cy, py) < crossing) & (crossing <= np.maximum(cy, py))
+
+    # Features toggled an odd number of times : the point left the feature of the center, or entered another one
+    n_features = int(index['feature'].max()) + 1
+    toggled, parity = np.unique(pair_points[crosses] * n_features + index['feature'][edges[crosses]], return_counts=True)
+    toggled = toggled[parity % 2 == 1]
+    point, feature = toggled // n_features, toggled % n_features
+    labels = labels.copy()
+    left = feature == labels[point]
+    labels[point[left]] = -1
+    labels[point[~left]] = feature[~left]
+    return labels
+
+def locate(index: dict, lat: float, lon: float):
+    """
+    ID of the feature containing a point (c.f. locate_many), -1 if none.
+    """
+    return int(locate_many(index, [lat], [lon])[0])
+
+def get_spatial_indexes(districts_mapdata: dict, boroughs_mapdata: dict, keys: dict, resolution: int=1024):
+    """
+    Index of the circonscriptions, quartiers and boroughs (c.f. crosswalk.get_layers and build_index), cached on disk.
+
+    Returns:
+        dict: Kind of entity -> index, e.g. locate(indexes['circonscription'], 45.5, -73.6) is the ID of a circonscription.
+    """
+    return cached_result('spatial-indexes', {
+        'districts_mapdata': districts_mapdata,
+        'boroughs_mapdata': boroughs_mapdata,
+        'keys': keys,
+        'resolution': resolution,
+    }, _build_indexes, depends=[build_index, get_layers, rasterize])
+
+def _build_indexes(districts_mapdata, boroughs_mapdata, keys, resolution):
+    return {
+        kind: build_index(map_data, ids, resolution)
+        for kind, (map_data, ids) in get_layers(districts_mapdata, boroughs_mapdata, keys).items()}
@@ -0,0 +1,315 @@
+import numpy as np
+
+
+def get_polygons(geometry: dict):
+    """
+    Return the polygons of a GeoJSON geometry as a list of polygons, each polygon being a list of rings.
+    Works for both Polygon and MultiPolygon geometries.
+    """
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    else:
+        raise ValueError(f'Unsupported geometry type : {geometry["type"]}. Only "Polygon" and "MultiPolygon" are supported.')
+
+def build_topology(map_data: dict):
+    """
+    Cut the rings of every feature into arcs, so that a border shared by two neighbors is stored only once.
+    Rings are cut at junctions, i.e. points where the neighboring points differ from one ring to the other.
+    A ring without any junction becomes a single closed arc.
+
+    Args:
+        map_data (dict): GeoJSON feature collection made of Polygons and MultiPolygons.
+
+    Returns:
+        dict: 'arcs' is the list of arcs, each an (n, 2) array of coordinates.
+            'features' gives, for every feature, the list of its polygons, each a list of rings,
+            each a list of arc indices. A negative index ~i means arc i is walked backwards.
+    """
+
+    # Rings without their closing point
+    rings = [[[tuple(p[:2]) for p in ring[:-1]] for ring in polygon]
+             for f in map_data['features'] for polygon in get_polygons(f['geometry'])]
+
+    # Find the junctions : points seen with two different pairs of neighbors
+    neighbors = {}
+    junctions = set()
+    for polygon in rings:
+        for ring in polygon:
+            n = len(ring)
+            for i, p in enumerate(ring):
+                pair = frozenset((ring[i-1], ring[(i+1) % n]))
+                if neighbors.setdefault(p, pair) != pair:
+                    junctions.add(p)
+
+    arcs = []
+    arc_ids = {}
+
+    def add_arc(points):
+        # Reuse the arc if it already exists, in either direction
+        key = tuple(points)
+        if key in arc_ids:
+            return arc_ids[key]
+        if key[::-1] in arc_ids:
+            return ~arc_ids[key[::-1]]
+        arc_ids[key] = len(arcs)
+        arcs.append(np.array(points, dtype=float))
+        return arc_ids[key]
+
+    topo_rings = []
+    for polygon in rings:
+        topo_polygon = []
+        for ring in polygon:
+            cuts = [i for i, p in enumerate(ring) if p in junctions]
+            if not cuts:
+                # Closed arc, rotated to start at its smallest point so that identical rings match
+                start = min(range(len(ring)), key=lambda i: ring[i])
+                points = ring[start:] + ring[:start]
+                topo_polygon.append([add_arc(points + points[:1])])
+            else:
+                # Rotate to start at the first junction, then cut at every junction
+                ring = ring[cuts[0]:] + ring[:cuts[0]]
+                cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+                ring = ring + ring[:1]
+                topo_polygon.append([add_arc(ring[a:b+1]) for a, b in zip(cuts[:-1], cuts[1:])])
+        topo_rings.append(topo_polygon)
+
+    # Regroup the polygons per feature
+    features = []
+    i = 0
+    for f in map_data['features']:
+        n = len(get_polygons(f['geometry']))
+        features.append(topo_rings[i:i+n])
+        i += n
+
+    return {'arcs': arcs, 'features': features}
+
+def get_arc_significance(arc: np.ndarray):
+    """
+    Douglas-Peucker significance of every point of an arc : a point is kept by Douglas-Peucker
+    with a given tolerance if and only if its significance is greater than the tolerance.
+    Endpoints are always kept (infinite significance), as well as the point of a closed arc
+    that is farthest from its start.
+    """
+    n = len(arc)
+    significance = np.zeros(n)
+    significance[[0, -1]] = np.inf
+    if n <= 2:
+        return significance
+
+    stack = [(0, n - 1, np.inf)]
+    if np.array_equal(arc[0], arc[-1]):
+        far = 1 + np.argmax(np.hypot(*(arc[1:-1] - arc[0]).T))
+        significance[far] = np.inf
+        stack = [(0, far, np.inf), (far, n - 1, np.inf)]
+
+    while stack:
+        a, b, parent = stack.pop()
+        if b - a < 2:
+            continue
+
+        # Distance of the interior points to the segment [a, b]
+        offsets = arc[a+1:b] - arc[a]
+        segment = arc[b] - arc[a]
+        norm = np.hypot(*segment)
+        if norm == 0:
+            distances = np.hypot(*offsets.T)
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / norm
+
+        i = np.argmax(distances)
+        # Cap by the parent so that a point is never kept without the points that made it kept
+        significance[a + 1 + i] = min(distances[i], parent)
+        stack.append((a, a + 1 + i, significance[a + 1 + i]))
+        stack.append((a + 1 + i, b, significance[a + 1 + i]))
+
+    return significance
+
+def get_kept_points(topology: dict, significances: list, tolerance: float):
+    """
+    Mask of the points of every arc kept at a given tolerance.
+    Rings that would degenerate (less than 3 distinct points) get back their most significant points,
+    and since arcs are shared, their neighbors get the same points : borders stay gap-free.
+    """
+    keep = [s > tolerance for s in significances]
+
+    for polygons in topology['features']:
+        for polygon in polygons:
+            for ring in polygon:
+                arcs = [~i if i < 0 else i for i in ring]
+                n_points = sum(keep[i].sum() - 1 for i in arcs)
+                if n_points >= 3:
+                    continue
+
+                # Candidates : the dropped points of the ring, most significant first
+                candidates = sorted(
+                    ((significances[i][j], i, j) for i in arcs for j in np.flatnonzero(~keep[i])),
+                    reverse=True)
+                for _, i, j in candidates[:3 - n_points]:
+                    keep[i][j] = True
+    return keep
+
+def assemble_features(topology: dict, keep: list=None):
+    """
+    Rebuild the GeoJSON coordinates of every feature from the arcs of a topology.
+
+    Args:
+        topology (dict): Topology, c.f. build_topology.
+        keep (list): Optional mask of the points to keep in every arc, c.f. get_kept_points.
+
+    Returns:
+        list: For every feature, the list of its polygons as GeoJSON coordinates, 
+            except that every ring is an (n, 2) array instead of a list of points.
+    """
+    arcs = topology['arcs']
+    if keep is not None:
+        arcs = [arc[k] for arc, k in zip(arcs, keep)]
+
+    features = []
+    for polygons in topology['features']:
+        coordinates = []
+        for polygon in polygons:
+            rings = []
+            for ring in polygon:
+                points = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in ring]
+                points = np.concatenate([points[0]] + [p[1:] for p in points[1:]])
+                rings.append(points)
+            coordinates.append(rings)
+        features.append(coordinates)
+    return features
+
+def encode_mapdata(map_data: dict, precision: int=6):
+    """
+    Encode a GeoJSON feature collection as quantized, delta-encoded shared arcs (the TopoJSON idea).
+    Coordinates are rounded to the given number of decimals, consecutive duplicates are dropped,
+    and every arc stores its first point followed by the differences between consecutive points, as int32.
+    The Douglas-Peucker significance of every point is stored too, so that any level of detail
+    can be decoded from the same encoding, c.f. decode_mapdata.
+
+    Args:
+        map_data (dict): GeoJSON feature collection made of Polygons and MultiPolygons.
+        precision (int): Number of decimals kept, at most 7 so that coordinates fit in int32.
+
+    Returns:
+        dict: The encoded map data, made of numpy arrays and small lists. Picklable.
+    """
+    if precision > 7:
+        raise ValueError(f'Invalid precision : {precision}. Coordinates are stored as int32, use at most 7 decimals.')
+
+    topology = build_topology(map_data)
+    scale = 10 ** precision
+
+    arcs = []
+    significances = []
+    for arc in topology['arcs']:
+        significance = get_arc_significance(arc)
+        arc = np.round(arc * scale).astype(np.int64)
+        # Drop the interior points equal to their predecessor once quantized
+        kept = np.ones(len(arc), dtype=bool)
+        kept[1:-1] = (arc[1:-1] != arc[:-2]).any(axis=1)
+        arcs.append(arc[kept])
+        significances.append(significance[kept])
+
+    lengths = np.array([len(arc) for arc in arcs])
+    deltas = np.concatenate(arcs)
+    deltas[1:] -= deltas[:-1].copy()
+    # The first point of every arc is absolute
+    starts = np.cumsum(lengths) - lengths
+    deltas[starts] = np.concatenate(arcs)[starts]
+
+    return {
+        'precision': precision,
+        'lengths': lengths.astype(np.int32),
+        'deltas': deltas.astype(np.int32),
+        'significances': np.concatenate(significances).astype(np.float32),
+        'features': topology['features'],
+        'types': [f['geometry']['type'] for f in map_data['features']],
+        'properties': [f['properties'] for f in map_data['features']],
+    }
+
+def decode_arcs(encoded: dict):
+    """
+    Decode the arcs of encoded map data, as arrays of quantized (integer) coordinates.
+    """
+    lengths = encoded['lengths'].astype(np.int64)
+    starts = np.cumsum(lengths) - lengths
+    points = np.cumsum(encoded['deltas'], axis=0, dtype=np.int64)
+    # Undo the running sum across arcs, since the first point of every arc is absolute
+    offsets = np.zeros_like(points[starts])
+    offsets[1:] = points[starts[1:] - 1]
+    points -= np.repeat(offsets, lengths, axis=0)
+    return np.split(points, starts[1:])
+
+def decode_mapdata(encoded: dict, tolerance: float=0):
+    """
+    Decode map data encoded with encode_mapdata back to the GeoJSON dict that plotly expects,
+    simplified at the given tolerance (0 keeps every point of the encoding).
+    Shared borders are simplified once, so neighbors stay gap-free.
+    Rings are (n, 2) float arrays rather than lists of points : plotly serializes them the same way,
+    and there is a single Python object per ring instead of one per coordinate
+    (much cheaper to copy, and pages shared between forked workers are not dirtied by refcounting).
+
+    Args:
+        encoded (dict): Encoded map data, c.f. encode_mapdata.
+        tolerance (float): Simplification tolerance, in degrees.
+
+    Returns:
+        dict: GeoJSON feature collection. Properties are shared with the encoded map data.
+    """
+    scale = 10 ** encoded['precision']
+    arcs = [np.round(arc / scale, encoded['precision']) for arc in decode_arcs(encoded)]
+    topology = {'arcs': arcs, 'features': encoded['features']}
+
+    keep = None
+    if tolerance > 0:
+        significances = np.split(encoded['significances'], np.cumsum(encoded['lengths'])[:-1])
+        keep = get_kept_points(topology, significances, tolerance)
+
+    features = []
+    for geometry_type, properties, coordinates in zip(encoded['types'], encoded['properties'], assemble_features(topology, keep)):
+        if geometry_type == 'Polygon':
+            geometry = {'type': 'Polygon', 'coordinates': coordinates[0]}
+        else:
+            geometry = {'type': 'MultiPolygon', 'coordinates': coordinates}
+        features.append({'type': 'Feature', 'properties': properties, 'geometry': geometry})
+    return {'type': 'FeatureCollection', 'features': features}
+
+def check_encoding(map_data: dict, encoded: dict):
+    """
+    Check that encoded map data decodes exactly to the original map data rounded to the precision of the encoding
+    (up to the starting point of the rings and consecutive duplicates). Raises a ValueError otherwise.
+    """
+    scale = 10 ** encoded['precision']
+    decoded = assemble_features({'arcs': decode_arcs(encoded), 'features': encoded['features']})
+
+    def dedup(ring):
+        # Drop the closing point and the points equal to their predecessor
+        ring = np.asarray(ring)[:-1]
+        return ring[(ring != np.roll(ring, 1, axis=0)).any(axis=1)]
+
+    for f, coordinates in zip(map_data['features'], decoded):
+        for polygon, decoded_polygon in zip(get_polygons(f['geometry']), coordinates):
+            for ring, decoded_ring in zip(polygon, decoded_polygon):
+                expected = dedup(np.round(np.array(ring)[:, :2] * scale).astype(np.int64))
+                actual = dedup(decoded_ring)
+                same = len(expected) == len(actual) and any(
+                    np.array_equal(np.roll(actual, -i, axis=0), expected)
+                    for i in np.flatnonzero((actual == expected[0]).all(axis=1)))
+                if not same:
+                    raise ValueError(f'Lossy encoding of feature {f["properties"]}')
+
+def simplify_mapdata(map_data: dict, tolerances: list):
+    """
+    Compute several levels of detail of a GeoJSON feature collection,
+    with a topology-preserving Douglas-Peucker simplification (shared borders are simplified once).
+
+    Args:
+        map_data (dict): GeoJSON feature collection made of Polygons and MultiPolygons.
+        tolerances (list): Tolerances of the levels of detail, in the units of the coordinates (degrees).
+
+    Returns:
+        dict: tolerance -> simplified GeoJSON feature collection. Properties are shared with map_data.
+    """
+    encoded = encode_mapdata(map_data)
+    return {tolerance: decode_mapdata(encoded, tolerance) for tolerance in tolerances}
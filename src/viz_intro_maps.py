@@ -1,27 +1,24 @@
 import numpy as np
 import plotly.express as px
 
-from src.maps import get_map, get_countries_of_origin
+from src.keys import match
+from src.maps import get_map, get_mapdata_lod, LOD_TOLERANCES
 
 # get the map of montreal
-def get_montreal_boroughs_map(montreal_boroughs_mapdata, borough_df):
+def get_montreal_boroughs_map(montreal_boroughs_mapdata, borough_df, keys):
     """
     Create a map of Montreal boroughs
     """
-    # Get the values used later for the color scale
-    mtl_map_color = []
-    unique_edges = []
-    for f in montreal_boroughs_mapdata['features']:
-        if f['properties']['nom_arr'] is not None: # Some names are missing
-            edge = borough_df.loc[borough_df['Arrondissement']==f['properties']['nom_arr'], 'Immigrante'].values[0]
-            mtl_map_color.append(edge)
-            if edge not in unique_edges:
-                unique_edges.append(edge)
-        else:
-            mtl_map_color.append(None)
+    # Get the values used later for the color scale, matching the features and the rows through the borough IDs (c.f. keys.py)
+    table = keys['borough']
+    names = [f['properties']['nom_arr'] for f in montreal_boroughs_mapdata['features']]
+    has_borough = [name is not None for name in names] # Some names are missing
+    rows = match(table, [name for name in names if name is not None], borough_df['Arrondissement'])
+    edges = iter(borough_df['Immigrante'].to_numpy()[rows])
+    mtl_map_color = [next(edges) if b else None for b in has_borough]
   
     # Setup the "discrete" color scale (they are not possible with choropleths by default, so we cheat)
-    unique_edges = np.sort(np.array(unique_edges, dtype=float))
+    unique_edges = np.unique(np.array([e for e in mtl_map_color if e is not None], dtype=float))
     unique_edges -= unique_edges.min()
     unique_edges /= unique_edges.max()
     colors = px.colors.qualitative.Pastel1
@@ -55,8 +52,16 @@ def express_choropleth(map_data, color):
     """
     Create a map of the world
     """
+    # The geometry is only sent once (the callbacks only update the values) : use the world level of detail,
+    # and drop the properties other than the ID, which the browser never reads
+    geometry = {
+        'type': 'FeatureCollection',
+        'features': [
+            {'type': 'Feature', 'geometry': f['geometry'], 'properties': {'ID': f['properties']['ID']}}
+            for f in get_mapdata_lod(map_data, LOD_TOLERANCES['world'])['features']]}
+
     fig = px.choropleth(
-        geojson=map_data,
+        geojson=geometry,
         color=color,
         featureidkey='properties.ID',
         locations=[f['properties']['ID'] for f in map_data['features']],
@@ -67,28 +72,38 @@ def express_choropleth(map_data, color):
 
     return fig
 
-def get_world_immigrants_map(
-    montreal_boroughs_mapdata,
-    world_mapdata,
-    borough_df,
-    clickdata=None):
+def get_borough_countries_of_origin(montreal_boroughs_mapdata, countries_of_origin, clickdata=None):
+    """
+    Number of immigrants from each country of the world map, for the clicked borough (for the whole city by default).
+    countries_of_origin is the matrix returned by get_countries_of_origin_matrix, so that a click only takes one of its rows.
+
+    Returns:
+        tuple: The values (None for the polygons with no associated borough) and the name of the borough.
+    """
     # Case when no borough is selected, showing for the whole of Montréal by default
     if clickdata is None:
-        color, country_names = get_countries_of_origin('Ville de Montréal', borough_df, world_mapdata)
-        world_map = express_choropleth(world_mapdata, color=color)
         borough_name = 'Ville de Montréal'
     # Case when a borough is selected
     else:
         idx = clickdata['points'][0]['pointNumber']
         borough_name = montreal_boroughs_mapdata['features'][idx]['properties']['nom_arr']
 
-        # Some choropleth polygons actually have no associated borough
-        if borough_name is None:
-            world_map = express_choropleth(world_mapdata, color=[None]*len(world_mapdata['features']))
-            
-        else:
-            color, country_names = get_countries_of_origin(borough_name, borough_df, world_mapdata)
-            world_map = express_choropleth(world_mapdata, color)
+    # Some choropleth polygons actually have no associated borough
+    if borough_name is None:
+        return [None]*len(countries_of_origin['countries']), borough_name
+    return countries_of_origin['values'][countries_of_origin['boroughs'][borough_name]], borough_name
+
+def get_world_immigrants_map(
+    montreal_boroughs_mapdata,
+    world_mapdata,
+    countries_of_origin,
+    clickdata=None):
+    """
+    Create the map of the countries of origin of the immigrants of the clicked borough (of the whole city by default).
+    """
+    color, borough_name = get_borough_countries_of_origin(montreal_boroughs_mapdata, countries_of_origin, clickdata)
+    world_map = express_choropleth(world_mapdata, color)
+    country_names = countries_of_origin['countries']
  
     hovertemplate = "<b>%{customdata[0]} :</b> %{z}<extra></extra>"
     
@@ -111,4 +126,35 @@ def get_world_immigrants_map(
     
     world_map.update_coloraxes(colorbar_title='Immigrants')
     
-    return world_map, f'Pays d\'origine : {borough_name}'
\ No newline at end of file
+    return world_map, f'Pays d\'origine : {borough_name}'
+
+def get_world_immigrants_map_updates(montreal_boroughs_mapdata, countries_of_origin, clickdata=None):
+    """
+    Same as get_world_immigrants_map, but only returns what changes from one borough to the other : the values of the choropleth.
+    The geometry and the rest of the figure stay in the browser (c.f. src/patches.py).
+
+    Returns:
+        tuple: The figure updates, c.f. get_figure_updates, and the title of the map.
+    """
+    color, borough_name = get_borough_countries_of_origin(montreal_boroughs_mapdata, countries_of_origin, clickdata)
+    return [(('data', 0, 'z'), np.asarray(color).tolist())], f'Pays d\'origine : {borough_name}'
+
+def get_world_immigrants_map_table(montreal_boroughs_mapdata, countries_of_origin):
+    """
+    Precompute get_world_immigrants_map_updates for every borough, to ship them to the browser once (c.f. assets/clientside.js).
+
+    Returns:
+        dict: With keys
+            'boroughs' (list): Borough of each polygon of the Montreal map, '' when it has none.
+            'updates' (dict): Borough -> figure updates of the world map.
+            'titles' (dict): Borough -> title of the world map.
+    """
+    table = {'boroughs': [], 'updates': {}, 'titles': {}}
+    for i, f in enumerate(montreal_boroughs_mapdata['features']):
+        borough = f['properties']['nom_arr'] or ''
+        table['boroughs'].append(borough)
+        if borough not in table['updates']:
+            clickdata = {'points': [{'pointNumber': i}]}
+            table['updates'][borough], table['titles'][borough] = get_world_immigrants_map_updates(
+                montreal_boroughs_mapdata, countries_of_origin, clickdata)
+    return table
@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
+from src.keys import get_ids
+from src.patches import get_figure_updates
+
 def get_district_names(df, num, criteria):
     """
     Get the district names that are in the top num of the criteria
@@ -9,7 +13,8 @@ def get_district_names(df, num, criteria):
     :param criteria: the criteria to use
     :return: the neighbourhoods names
     """
-    df = df.sort_values(criteria, ascending=False)
+    # Stable sort : ties are broken by the order of the dataframe (alphabetical), whatever the dtype
+    df = df.sort_values(criteria, ascending=False, kind='stable')
     neighbourhoods = df['Circonscription'][:num].tolist()
     return neighbourhoods
 
@@ -42,53 +47,45 @@ def generate_districts_annotation(districts_dict, lang1, lang2):
     return text
 
 
-def prepare_dataframes(df_demo, df_elec):
+def prepare_dataframes(df_demo, vote_matrix, keys):
+    """
+    Average vote of the main parties in the districts with the most francophones, anglophones, bilinguals and neither.
+    The votes are read from the rows of those districts in the vote matrix (c.f. votes.py), found through their IDs (c.f. keys.py).
+    """
     # Get distict names with most francophones, anglophones, bilinguals and neither
     NUM_DISTRICTS = 4
-    districts_fr = get_district_names(df_demo, NUM_DISTRICTS, "Francais")
-    districts_en = get_district_names(df_demo, NUM_DISTRICTS, "Anglais")
-    districts_both = get_district_names(df_demo, NUM_DISTRICTS, "Francais et anglais (pourcentage)")
-    districts_neither = get_district_names(df_demo, NUM_DISTRICTS, "Ni l'anglais ni le francais (pourcentage)")
-
-    # Create districts dictionary
     districts_dict = {
-        'Francophones': districts_fr,
-        'Anglophones': districts_en,
-        'Allophones': districts_both,
-        'Ni francophones ni anglophones': districts_neither
+        'Francophones': get_district_names(df_demo, NUM_DISTRICTS, "Francais"),
+        'Anglophones': get_district_names(df_demo, NUM_DISTRICTS, "Anglais"),
+        'Allophones': get_district_names(df_demo, NUM_DISTRICTS, "Francais et anglais (pourcentage)"),
+        'Ni francophones ni anglophones': get_district_names(df_demo, NUM_DISTRICTS, "Ni l'anglais ni le francais (pourcentage)")
     }
 
-    # Rename parties ('C.A.Q.-E.F.L.' to 'C.A.Q.', 'P.C.Q-E.E.D.' to 'P.C.Q.', 'P.L.Q./Q.L.P.' to 'P.L.Q.')
-    rename_dict = {'C.A.Q.-E.F.L.': 'C.A.Q.', 'P.C.Q-E.E.D.': 'P.C.Q.', 'P.L.Q./Q.L.P.': 'P.L.Q.'}
-    df_elec['abreviationPartiPolitique'] = df_elec['abreviationPartiPolitique'].replace(rename_dict)
-
-    # Filter and sort the elections data for the selected districts and parties
-    parties = ['C.A.Q.', 'P.C.Q.', 'P.L.Q.', 'P.Q.', 'Q.S.']
-    df_elec_fr = df_elec[(df_elec['nomCirconscription'].isin(districts_fr)) & (df_elec['abreviationPartiPolitique'].isin(parties))]
-    df_elec_fr = df_elec_fr.sort_values(['nomCirconscription', 'numeroPartiPolitique'])
-    df_elec_en = df_elec[(df_elec['nomCirconscription'].isin(districts_en)) & (df_elec['abreviationPartiPolitique'].isin(parties))]
-    df_elec_en = df_elec_en.sort_values(['nomCirconscription', 'numeroPartiPolitique'])
-    df_elec_both = df_elec[(df_elec['nomCirconscription'].isin(districts_both)) & (df_elec['abreviationPartiPolitique'].isin(parties))]
-    df_elec_both = df_elec_both.sort_values(['nomCirconscription', 'numeroPartiPolitique'])
-    df_elec_neither = df_elec[(df_elec['nomCirconscription'].isin(districts_neither)) & (df_elec['abreviationPartiPolitique'].isin(parties))]
-    df_elec_neither = df_elec_neither.sort_values(['nomCirconscription', 'numeroPartiPolitique'])
-
-    # Get the average votes for each party
-    df_elec_fr = get_average_votes(df_elec_fr)
-    df_elec_en = get_average_votes(df_elec_en)
-    df_elec_both = get_average_votes(df_elec_both)
-    df_elec_neither = get_average_votes(df_elec_neither)
-
-    # Add the language column to each dataframe
-    df_elec_fr['Langue'] = 'Francophones'
-    df_elec_en['Langue'] = 'Anglophones'
-    df_elec_both['Langue'] = 'Allophones'
-    df_elec_neither['Langue'] = 'Ni francophones ni anglophones'
-    df_elec = pd.concat([df_elec_fr, df_elec_en, df_elec_both, df_elec_neither], ignore_index=True)
-    df_elec = df_elec.rename(columns={'abreviationPartiPolitique': 'Parti politique', 'tauxVote': 'Taux de vote'})
-    df_elec = df_elec[['Langue', 'Parti politique', 'Taux de vote']]
-
-    return districts_dict, df_elec
+    # Short names of the parties ('C.A.Q.-E.F.L.' as 'C.A.Q.', 'P.C.Q-E.E.D.' as 'P.C.Q.', 'P.L.Q./Q.L.P.' as 'P.L.Q.')
+    parties = {'C.A.Q.': 'C.A.Q.-E.F.L.', 'P.C.Q.': 'P.C.Q-E.E.D.', 'P.L.Q.': 'P.L.Q./Q.L.P.', 'P.Q.': 'P.Q.', 'Q.S.': 'Q.S.'}
+
+    # Shares of the parties in the districts of every group, averaged by a groupby (its compensated sums give the same values as before)
+    votes = []
+    for lang, districts in districts_dict.items():
+        rows = np.sort(get_ids(keys['circonscription'], districts))
+        for party, name in parties.items():
+            column = vote_matrix['columns'][name]
+            ran = vote_matrix['ran'][rows, column]
+            votes += [(lang, party, share) for share in vote_matrix['shares'][rows, column][ran]]
+    df = pd.DataFrame(votes, columns=['Langue', 'Parti politique', 'Taux de vote'])
+
+    return districts_dict, df.groupby(['Langue', 'Parti politique'])['Taux de vote'].mean().reset_index()
+
+def get_language_votes(df_demo, vote_matrix, keys):
+    """
+    Compute once everything the connected dot plots need, for all the language groups.
+
+    Returns:
+        dict: With keys 'districts' (language group -> names of its districts)
+            and 'pivot' (average vote, with the parties as rows and the language groups as columns).
+    """
+    districts_dict, df = prepare_dataframes(df_demo, vote_matrix, keys)
+    return {'districts': districts_dict, 'pivot': create_pivot_data(df)}
 
 def get_language_dropdown_options():
     options = [
@@ -102,17 +99,19 @@ def get_language_dropdown_options():
     return options
 
 # Create vizualization
-def create_interactive_connected_dot_plot(df_demo, df_elec, lang_option):
-    
-    districts_dict, df = prepare_dataframes(df_demo, df_elec)
+def create_interactive_connected_dot_plot(df_demo, vote_matrix, keys, lang_option):
+    return create_connected_dot_plot(get_language_votes(df_demo, vote_matrix, keys), lang_option)
+
+def create_connected_dot_plot(language_votes, lang_option):
+    """
+    Create the connected dot plot of a language pairing, from the result of get_language_votes.
+    """
+    districts_dict, df_pivot = language_votes['districts'], language_votes['pivot']
     
     # Create a figure
     fig = go.Figure()
     
     lang1, lang2 = lang_option.split(" VS. ")
- 
-    # Create pivot table
-    df_pivot = create_pivot_data(df)
         
     # Add connecting lines
     for parti in df_pivot.index:
@@ -213,4 +212,33 @@ def create_interactive_connected_dot_plot(df_demo, df_elec, lang_option):
         title_x=0.5,
         margin=dict(t=100)
     )
-    return fig
\ No newline at end of file
+    return fig
+
+def get_connected_dot_plots(language_votes):
+    """
+    Create the connected dot plot of every dropdown option at once.
+
+    Returns:
+        dict: Option -> figure. They are shared, so they must not be modified.
+    """
+    return {option: create_connected_dot_plot(language_votes, option) for option in get_language_dropdown_options()}
+
+def get_connected_dot_plot_updates(dot_plots, lang_option):
+    """
+    Only returns what changes in the dot plot from one option to the other :
+    the positions and texts of the points, the legend and the districts annotation (c.f. src/patches.py).
+
+    Args:
+        dot_plots (dict): Figures returned by get_connected_dot_plots.
+        lang_option (str): Selected option.
+    """
+    return get_figure_updates(dot_plots[lang_option], trace_keys=['x', 'text', 'name'], layout_paths=[('annotations', 0, 'text')])
+
+def get_connected_dot_plot_table(dot_plots):
+    """
+    get_connected_dot_plot_updates for every dropdown option, to ship them to the browser once (c.f. assets/clientside.js).
+
+    Returns:
+        dict: Option -> figure updates.
+    """
+    return {option: get_connected_dot_plot_updates(dot_plots, option) for option in dot_plots}
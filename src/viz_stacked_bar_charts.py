@@ -1,44 +1,46 @@
-import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 
+from src.keys import get_ids, get_rows
 from src.maps import get_map, circo_subsets
 
 
-def stacked_bar_chart_most(df1, df):
-    """df1 = demographics data
-    df = elections data"""
+# Short labels of the parties in the stacked bar charts
+PARTY_LABELS = {'C.A.Q.-E.F.L.': 'C.A.Q.', 'P.C.Q-E.E.D.': 'P.C.Q.', 'P.L.Q./Q.L.P.': 'P.L.Q.'}
+
+
+def get_stacked_bar_data(vote_matrix, rows, num_parties=5):
+    """
+    Shares of the votes in the given districts, for the parties with a candidate in the most districts
+    and for all the others together.
+
+    Args:
+        vote_matrix (dict): c.f. votes.py.
+        rows (np.ndarray): Rows of the districts (i.e. their IDs), one bar each.
+        num_parties (int): Number of parties shown on their own.
+
+    Returns:
+        tuple: The labels of the parties (ending with 'Others') and, for every district, the shares rounded to 0.1 %.
+    """
+    # Stable sort : ties are broken by order of first appearance in the data, like value_counts
+    top = np.argsort(-vote_matrix['ran'].sum(axis=0), kind='stable')[:num_parties]
+    others = np.ones(len(vote_matrix['parties']), dtype=bool)
+    others[top] = False
+
+    shares = vote_matrix['shares'][rows]
+    shares = np.column_stack([shares[:, top], shares[:, others].sum(axis=1)])
+    top_labels = [PARTY_LABELS.get(vote_matrix['parties'][i], vote_matrix['parties'][i]) for i in top] + ['Others']
+    return top_labels, [[round(float(share), 1) for share in row] for row in shares]
 
-    df1['Immigrants'] = pd.to_numeric(df1['Immigrants'])
 
-    y_data = df1.nlargest(10, 'Immigrants').set_index('Circonscription')['Immigrants'].keys().tolist()
+def stacked_bar_chart_most(df1, vote_matrix, keys):
+    """df1 = demographics data
+    vote_matrix = c.f. votes.py, keys = key tables (c.f. keys.py)"""
+
+    y_data = df1.nlargest(10, 'Immigrants')['Circonscription'].tolist()
     y_data.reverse()
 
-    df['abreviationPartiPolitique'] = df['abreviationPartiPolitique'].replace('C.A.Q.-E.F.L.', 'C.A.Q.')
-    df['abreviationPartiPolitique'] = df['abreviationPartiPolitique'].replace('P.C.Q-E.E.D.', 'P.C.Q.')
-    df['abreviationPartiPolitique'] = df['abreviationPartiPolitique'].replace('P.L.Q./Q.L.P.', 'P.L.Q.')
-
-    top_labels = df['abreviationPartiPolitique'].value_counts().nlargest(5).keys().tolist()
-    top_labels.append('Others')
-
-    x_data = []
-    for circ in y_data:
-        circ_data = []
-        for party in top_labels:
-            if party != 'Others':
-                try:
-                    vote_percentage = df.loc[
-                        (df['abreviationPartiPolitique'] == party) & (
-                                df['nomCirconscription'] == circ), 'tauxVote'].values[
-                        0]
-                    circ_data.append(round(float(vote_percentage), 1))
-                except IndexError:
-                    circ_data.append(0.0)  # Default value if party not found
-            else:  # Handle the 'Others' category
-                other_parties_votes = df.loc[
-                    (df['nomCirconscription'] == circ) & (
-                        ~df['abreviationPartiPolitique'].isin(top_labels[:-1])), 'tauxVote'].sum()
-                circ_data.append(round(float(other_parties_votes), 1))
-        x_data.append(circ_data)
+    top_labels, x_data = get_stacked_bar_data(vote_matrix, get_ids(keys['circonscription'], y_data))
 
     colors = ['rgba(0, 169, 230, 0.8)', 'rgba(35, 41, 100, 0.8)',
               'rgba(20, 41, 80, 0.8)', 'rgba(236, 25, 44, 0.8)',
@@ -134,41 +136,14 @@ def stacked_bar_chart_most(df1, df):
     return fig
 
 
-def stacked_bar_chart_least(df1, df):
+def stacked_bar_chart_least(df1, vote_matrix, keys):
     """df1 = demographics data
-    df = elections data"""
-
-    df1['Immigrants'] = pd.to_numeric(df1['Immigrants'])
+    vote_matrix = c.f. votes.py, keys = key tables (c.f. keys.py)"""
 
-    y_data = df1.nsmallest(10, 'Immigrants').set_index('Circonscription')['Immigrants'].keys().tolist()
+    y_data = df1.nsmallest(10, 'Immigrants')['Circonscription'].tolist()
     y_data.reverse()
 
-    df['abreviationPartiPolitique'] = df['abreviationPartiPolitique'].replace('C.A.Q.-E.F.L.', 'C.A.Q.')
-    df['abreviationPartiPolitique'] = df['abreviationPartiPolitique'].replace('P.C.Q-E.E.D.', 'P.C.Q.')
-    df['abreviationPartiPolitique'] = df['abreviationPartiPolitique'].replace('P.L.Q./Q.L.P.', 'P.L.Q.')
-
-    top_labels = df['abreviationPartiPolitique'].value_counts().nlargest(5).keys().tolist()
-    top_labels.append('Others')
-
-    x_data = []
-    for circ in y_data:
-        circ_data = []
-        for party in top_labels:
-            if party != 'Others':
-                try:
-                    vote_percentage = df.loc[
-                        (df['abreviationPartiPolitique'] == party) & (
-                                df['nomCirconscription'] == circ), 'tauxVote'].values[
-                        0]
-                    circ_data.append(round(float(vote_percentage), 1))
-                except IndexError:
-                    circ_data.append(0.0)  # Default value if party not found
-            else:  # Handle the 'Others' category
-                other_parties_votes = df.loc[
-                    (df['nomCirconscription'] == circ) & (
-                        ~df['abreviationPartiPolitique'].isin(top_labels[:-1])), 'tauxVote'].sum()
-                circ_data.append(round(float(other_parties_votes), 1))
-        x_data.append(circ_data)
+    top_labels, x_data = get_stacked_bar_data(vote_matrix, get_ids(keys['circonscription'], y_data))
 
     colors = ['rgba(0, 169, 230, 0.8)', 'rgba(35, 41, 100, 0.8)',
               'rgba(20, 41, 80, 0.8)', 'rgba(236, 25, 44, 0.8)',
@@ -264,18 +239,24 @@ def stacked_bar_chart_least(df1, df):
     return fig
 
 
-def linguistic_map(df, map_data):
-    """df = demographics data, map_data for districts"""
+def get_montreal_districts_values(df, map_data, keys, column):
+    """
+    Values of a column of the demographics data for every feature of the districts map,
+    None outside of the island of Montréal. The rows are matched through the circonscription IDs (c.f. keys.py).
+    """
+    table = keys['circonscription']
+    feature_ids = get_ids(table, [f['properties']['NM_CEP'] for f in map_data['features']])
+    rows = get_rows(table, df['Circonscription'])[feature_ids]
+    in_montreal = np.isin(feature_ids, get_ids(table, circo_subsets['Montréal'])) & (rows >= 0)
 
-    district_mapping = {row['Circonscription']: i for i, row in df.iterrows()}
-    color = [None] * len(map_data['features'])
+    values = df[column].to_numpy()
+    return [values[row] if inside else None for row, inside in zip(rows, in_montreal)]
 
-    for i, feature in enumerate(map_data['features']):
-        district_name = feature['properties']['NM_CEP']
-        district_name = district_name.replace("A(c)", "e")
-        district_name = district_name.replace("AC/ce", "ace")
-        if district_name in district_mapping and district_name in circo_subsets['Montréal']:
-            color[i] = df.loc[district_mapping[district_name], "Ni l'anglais ni le francais (pourcentage)"]
+
+def linguistic_map(df, map_data, keys):
+    """df = demographics data, map_data for districts, keys = key tables (c.f. keys.py)"""
+
+    color = get_montreal_districts_values(df, map_data, keys, "Ni l'anglais ni le francais (pourcentage)")
 
     fig = get_map(map_data, color, zoom='montreal')
     fig.update_layout(
@@ -290,18 +271,10 @@ def linguistic_map(df, map_data):
     return fig
 
 
-def immigrants_map(df, map_data):
-    """df = demographics data, map_data for districts"""
-
-    district_mapping = {row['Circonscription']: i for i, row in df.iterrows()}
-    color = [None] * len(map_data['features'])
+def immigrants_map(df, map_data, keys):
+    """df = demographics data, map_data for districts, keys = key tables (c.f. keys.py)"""
 
-    for i, feature in enumerate(map_data['features']):
-        district_name = feature['properties']['NM_CEP']
-        district_name = district_name.replace("A(c)", "e")
-        district_name = district_name.replace("AC/ce", "ace")
-        if district_name in district_mapping and district_name in circo_subsets['Montréal']:
-            color[i] = df.loc[district_mapping[district_name], "Immigrants"]
+    color = get_montreal_districts_values(df, map_data, keys, "Immigrants")
 
     fig = get_map(map_data, color, zoom='montreal')
     fig.update_layout(
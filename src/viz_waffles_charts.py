@@ -1,8 +1,15 @@
+import functools
+import json
+
 import plotly.graph_objects as go
 import numpy as np
+import pandas as pd
 import plotly.express as px
-from src.preprocess import get_participation_per_district, group_elections_data_as_party, get_elections_data_by_winning_party
-from src.visual_helper import set_customdata_montreal, set_customdata_Quebec
+from src.patches import get_figure_updates
+from src.keys import get_ids, get_rows
+from src.maps import circo_subsets
+from src.votes import UNDECIDED, get_party_rows
+from src.scenarios import apply_swing, get_scenario_winners
 
 # Define political party colors and names
 political_parties = {
@@ -10,262 +17,343 @@ political_parties = {
     1: "Coalition avenir Québec",
     2: "Parti libéral du Québec",
     3: "Québec solidaire",
-    4: "Parti québécois"
+    4: "Parti québécois",
+    5: "Autre parti"
+}
+# Abbreviation in the elections data -> code of the party in the waffles (5 for any other party)
+waffle_codes = {
+    "C.A.Q.-E.F.L.": 1,
+    "P.L.Q./Q.L.P.": 2,
+    "Q.S.": 3,
+    "P.Q.": 4
+}
+# Order of the parties in the waffles, filled column after column
+waffle_order = [2, 4, 3, 1, 5]
+# One color per code, as a discrete colorscale (c.f. waffle_chart)
+waffle_colors = ["#FFFFFF", "#1E90FF", "#b52121", "#FF8040", "#004A9A", "#A9A9A9"]
+# Names of the electoral systems and of the regional groupings, c.f. electoral_systems.py
+electoral_system_names = {
+    "fptp": "Scrutin majoritaire uninominal à un tour (actuel)",
+    "dhondt": "Proportionnelle (D'Hondt)",
+    "sainte-lague": "Proportionnelle (Sainte-Laguë)",
+    "mmp": "Mixte compensatoire (80 sièges de circonscription, 45 de liste)"
+}
+grouping_names = {
+    "province": "à l'échelle du Québec",
+    "subsets": "par ville (Montréal, Québec, reste du Québec)",
+    "regions": "par région"
 }
-
-def set_customdata(z, customdata, m, n, political_parties):
-    """Set custom hover data for waffle charts"""
-    for i in range(m):
-        for j in range(n):
-            customdata[i, j] = political_parties[z[i, j]]
-    return customdata
 
 
-def get_quebec_waffle_chart():
-    """Create a waffle chart for all of Quebec's National Assembly seats"""
-    m = 5  # Rows
-    n = 25  # Columns
-    z = np.ones((m, n))
-
-    # Set party values (1=CAQ, 2=PLQ, 3=QS, 4=PQ)
-    z[0:5, 0:4] = 2
-    z[0, 4] = 2
-    z[4, 4] = 3
-    z[0:5, 5:7] = 3
-    z[1:4, 4] = 4
-
-    # Create custom data for hover info
-    M = max([len(s) for s in political_parties.values()])
-    customdata = np.empty((m, n), dtype=f'<U{M}')
-    customdata = set_customdata_Quebec(z, customdata, m, n, political_parties)
-
-    # Define color scale
+def get_seat_codes(vote_matrix, winners=None):
+    """
+    Code of the party (c.f. political_parties) winning every district, i.e. with the most votes (c.f. votes.py),
+    0 ("Vide") for the undecided districts.
+    winners are the columns of the winning parties, the actual ones by default (otherwise e.g. of a scenario, c.f. scenarios.py).
+    """
+    codes = np.array([waffle_codes.get(party, 5) for party in vote_matrix['parties']] + [0])
+    winners = vote_matrix['winners'] if winners is None else winners
+    return codes[np.where(winners == UNDECIDED, len(codes) - 1, winners)]
+
+def get_waffle_subsets(df_demographics, keys):
+    """
+    Rows of the districts (c.f. keys.py) shown by the waffles : name -> sorted rows.
+    The median split leaves out the districts at the median share of immigrants.
+    """
+    table = keys['circonscription']
+    rows = get_ids(table, df_demographics['Circonscription'])
+    immigrants = df_demographics['Immigrants'].to_numpy()
+    median = np.median(immigrants)
+    return {
+        'quebec': np.arange(len(table['names'])),
+        'montreal': np.sort(get_ids(table, circo_subsets['Montréal'])),
+        'upper_median_immigration': np.sort(rows[immigrants > median]),
+        'lower_median_immigration': np.sort(rows[immigrants < median]),
+    }
+
+def get_waffle_grid(codes, labels, m):
+    """
+    Lay out seats in a grid of m rows : grouped by party (c.f. waffle_order), sorted by label within a party,
+    and filled column after column. The cells left over in the last column are empty (code 0).
+
+    Args:
+        codes (np.ndarray): Code of the party of every seat.
+        labels (array-like): Hover label of every seat, e.g. its district.
+        m (int): Number of rows.
+
+    Returns:
+        tuple: z (codes) and customdata (labels), as m x n arrays.
+    """
+    codes = np.asarray(codes)
+    # The empty seats (e.g. undecided districts) come last
+    rank = np.where(codes > 0, np.argsort(waffle_order)[codes - 1], len(waffle_order))
+    order = np.lexsort((labels, rank))
+    n = -(-len(codes) // m)
+
+    z = np.zeros(m * n, dtype=int)
+    z[:len(codes)] = codes[order]
+    customdata = np.full(m * n, political_parties[0], dtype=object)
+    customdata[:len(codes)] = np.asarray(labels, dtype=object)[order]
+    return z.reshape(n, m).T, customdata.reshape(n, m).T
+
+@functools.lru_cache(maxsize=32)
+def _waffle_chart(codes, labels, m, layout):
+    z, customdata = get_waffle_grid(np.frombuffer(codes, dtype=int), labels, m)
     colorscale = [
-        [0, "#1E90FF"],      # CAQ - Blue 
-        [0.33, "#00cc96"],   # PLQ - Green
-        [0.33, "#b52121"],   # QS - Red
-        [0.66, "#FF8040"],   # PQ - Orange
-        [0.66, "#FF8040"],
-        [1, "#004A9A"]
-    ]
-
-    # Create figure
-    fig = go.Figure(go.Heatmap(
-        z=z,
-        customdata=customdata, 
-        xgap=3, 
-        ygap=3,
-        colorscale=colorscale, 
-        showscale=False,
-        hovertemplate="%{customdata}<extra></extra>"
-    ))
+        [(code + offset) / len(waffle_colors), color]
+        for code, color in enumerate(waffle_colors) for offset in (0, 1)]
 
-    fig.update_layout(
+    fig = go.Figure(go.Heatmap(z=z, zmin=-0.5, zmax=len(waffle_colors) - 0.5,
+                            customdata=customdata, xgap=3, ygap=3,
+                            colorscale=colorscale, showscale=False,
+                            hovertemplate="%{customdata}<extra></extra>"))
+    fig.update_layout(**json.loads(layout))
+    fig.update_layout(yaxis_autorange='reversed', title_x=0.5)
+    fig.update_xaxes(showticklabels=False)
+    fig.update_yaxes(showticklabels=False)
+    return fig
+
+def waffle_chart(codes, labels, m, **layout):
+    """
+    Waffle chart of the given seats, c.f. get_waffle_grid. Cached per seats and layout : a subset of districts
+    is only laid out again if its winners changed (e.g. on election night, c.f. live.py).
+    The returned figure is shared, and must not be modified.
+
+    Args:
+        codes (np.ndarray): Code of the party of every seat.
+        labels (array-like): Hover label of every seat.
+        m (int): Number of rows.
+        layout: Layout of the figure, e.g. title, width, height.
+    """
+    codes = np.asarray(codes, dtype=int)
+    return _waffle_chart(codes.tobytes(), tuple(labels), m, json.dumps(layout, sort_keys=True))
+
+def get_district_waffle_chart(vote_matrix, rows, m, winners=None, **layout):
+    """Waffle chart of the seats of the given districts, labelled with their names (c.f. get_seat_codes for winners)."""
+    return waffle_chart(
+        get_seat_codes(vote_matrix, winners)[rows], np.asarray(vote_matrix['districts'], dtype=object)[rows], m, **layout)
+
+def get_quebec_waffle_chart(vote_matrix, waffle_subsets):
+    """Create a waffle chart for all of Quebec's National Assembly seats"""
+    return get_district_waffle_chart(
+        vote_matrix, waffle_subsets['quebec'], 5,
         width=1200,
-        height=300, 
-        yaxis_autorange='reversed',
+        height=300,
         title="Sièges par parti politique à l'Assemblée nationale du Québec aux élections 2022",
-        title_x=0.5,
         margin=dict(l=10, r=10, t=50, b=10),
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)'
     )
-    fig.update_xaxes(showticklabels=False)
-    fig.update_yaxes(showticklabels=False)
-    
-    return fig
-
-def get_montreal_waffle_chart():
-    """Create a waffle chart for Montreal's National Assembly seats"""
-    m = 3 
-    n = 9  
-    z = np.ones((m, n))
-
-    z[0:, 0:5] = 2
-    z[0, 5] = 2
-    z[1, 5] = 4
-    z[2, 5] = 3
-    z[0:, 6:8] = 3
-    z[0, 8] = 3
 
-    M = max([len(s) for s in political_parties.values()])
-    customdata = np.empty((m, n), dtype=f'<U{M}')  
-
-    customdata = set_customdata_montreal(z, customdata, m, n, political_parties)
-
-    # Définition de la palette de couleurs
-    colorscale = [[0, "#1E90FF"], 
-                [0.33, "#00cc96"], 
-                [0.33, "#b52121"], 
-                [0.66,  "#FF8040"],
-                [0.66, "#FF8040"],
-                [1,"#004A9A"]] 
-
-
-    fig = go.Figure(go.Heatmap(z=z,
-                            customdata=customdata, xgap=3, ygap=3,
-                            colorscale=colorscale, showscale=False,
-                            hovertemplate="%{customdata}<extra></extra>"))
-
-    fig.update_layout(width=800, height=400, yaxis_autorange='reversed')
-    fig.update_layout(
-        title="Sièges par parti politique selon les circonscriptions de Montréal aux élections 2022",
-        title_x=0.5  # Centers the title
+def get_party_name(party):
+    """Name of a party in the waffles, from its abbreviation (the abbreviation itself for the other parties)"""
+    code = waffle_codes.get(party, 5)
+    return political_parties[code] if code != 5 else party
+
+def get_projection_waffle_chart(vote_matrix, waffle_subsets, projection):
+    """Create a waffle chart of the most likely winner of every seat, from a seat projection (c.f. montecarlo.py)"""
+    rows = waffle_subsets['quebec']
+    winners = projection['win_probability'].argmax(axis=1)[rows]
+    probabilities = projection['win_probability'].max(axis=1)[rows]
+    parties = np.array(projection['parties'], dtype=object)[winners]
+    # Districts without any vote are never won in the simulations (c.f. montecarlo.py)
+    decided = probabilities > 0
+    labels = [
+        f"{district} : {get_party_name(party)} ({probability:.0%})" if won else district
+        for district, party, probability, won in zip(np.asarray(vote_matrix['districts'])[rows], parties, probabilities, decided)]
+    return waffle_chart(
+        np.where(decided, [waffle_codes.get(party, 5) for party in parties], 0), labels, 5,
+        width=1200,
+        height=300,
+        title=f"Vainqueur le plus probable de chaque siège sur {projection['n_sims']:,} élections simulées".replace(',', ' '),
+        margin=dict(l=10, r=10, t=50, b=10),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
     )
-    fig.update_xaxes(showticklabels=False)
-    fig.update_yaxes(showticklabels=False)
-    
-    return fig
-
-def get_hypothetical_waffle_chart():
-    """Create a waffle chart showing what Quebec's National Assembly would look like 
-    if Montreal's voting patterns were applied to the entire province"""
-    m = 5  # Rows
-    n = 25  # Columns
-    z = np.ones((m, n))
-
-    # Set party values (1=CAQ, 2=PLQ, 3=QS, 4=PQ)
-    z[0:5, 0:15] = 2
-    z[4, 14] = 4
-    z[0:4, 15] = 4
-    z[4, 15] = 3
-    z[0:5, 16:23] = 3
-    z[0, 23] = 3
-
-    # Create custom data for hover info
-    M = max([len(s) for s in political_parties.values()])
-    customdata = np.empty((m, n), dtype=f'<U{M}')
-    customdata = set_customdata(z, customdata, m, n, political_parties)
-
-    # Define color scale
-    colorscale = [
-        [0, "#1E90FF"],      # CAQ - Blue
-        [0.33, "#00cc96"],   # PLQ - Green
-        [0.33, "#b52121"],   # QS - Red
-        [0.66, "#FF8040"],   # PQ - Orange
-        [0.66, "#FF8040"],
-        [1, "#004A9A"]
-    ]
-
-    # Create figure
-    fig = go.Figure(go.Heatmap(
-        z=z,
-        customdata=customdata, 
-        xgap=3, 
-        ygap=3,
-        colorscale=colorscale, 
-        showscale=False,
-        hovertemplate="%{customdata}<extra></extra>"
-    ))
 
+def get_seat_histogram(projection):
+    """Create a histogram of the number of seats of every party over the simulated elections (c.f. montecarlo.py)"""
+    seats = projection['seats']
+    majority = seats.shape[1] // 2 + 1
+    # Only show the numbers of seats reached by some party
+    x = np.arange(np.flatnonzero(seats.any(axis=0)).max() + 1)
+
+    fig = go.Figure()
+    for i, party in enumerate(projection['parties']):
+        low, high = projection['bands'][i]
+        fig.add_trace(go.Bar(
+            x=x,
+            y=100 * seats[i, :len(x)],
+            name=f"{get_party_name(party)} : {low} à {high} sièges",
+            marker_color=waffle_colors[waffle_codes.get(party, 5)],
+            opacity=0.75,
+            hovertemplate=f"{get_party_name(party)}<br>%{{x}} sièges : %{{y:.1f}} %<extra></extra>"
+        ))
+    fig.add_vline(x=majority - 0.5, line_dash='dash', line_color='grey',
+                  annotation_text=f"Majorité ({majority} sièges)", annotation_position='top right')
+
+    leader = int(np.argmax(projection['majority']))
     fig.update_layout(
         width=1200,
-        height=300, 
-        yaxis_autorange='reversed',
-        title="Sièges par parti politique à l'Assemblée nationale du Québec aux élections 2022 <br> si Montréal était tout le Québec",
+        height=400,
+        barmode='overlay',
+        bargap=0,
+        title=f"Distribution des sièges par parti (intervalles à 90 %) <br> "
+              f"Probabilité d'une majorité : {get_party_name(projection['parties'][leader])} {projection['majority'][leader]:.0%}",
         title_x=0.5,
-        margin=dict(l=10, r=10, t=50, b=10),
+        xaxis_title="Nombre de sièges",
+        yaxis_title="Probabilité (%)",
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)'
     )
-    fig.update_xaxes(showticklabels=False)
-    fig.update_yaxes(showticklabels=False)
-    
     return fig
 
-def get_upper_median_immigration_waffle():
-    m = 4  
-    n = 16  
-    z = np.ones((m, n))
-    # Sets values for waffle chart
-    z[0:4, 0:5] = 2
-    z[2, 5] = 2
-    z[3, 5] = 2
-    z[0, 5] = 3
-    z[1,5] = 3
-    z[0:4, 6:8] = 3
-    z[3, 8] = 3
-    z[1, -1] = 0 
-    z[0, -1] = 0  
-
-
-    M = max([len(s) for s in political_parties.values()])
-    customdata = np.empty((m, n), dtype=f'<U{M}')  
-
-    customdata = set_customdata(z, customdata, m, n, political_parties)
-
-    colorscale = [
-        [0.0, "#FFFFFF"],   # white
-        [0.33, "#1E90FF"],  # blue
-        [0.66, "#b52121"],  # orange
-        [1.0, "#FF8040"]    # red
-    ]
-
-    fig = go.Figure(go.Heatmap(z=z,  zmin=0, zmax=3,
-                            customdata=customdata, xgap=3, ygap=3,
-                            colorscale=colorscale, showscale=False,
-                            hovertemplate="%{customdata}<extra></extra>"))
-
-    fig.update_layout(width=1200, height=400)
-
+def get_montreal_waffle_chart(vote_matrix, waffle_subsets):
+    """Create a waffle chart for Montreal's National Assembly seats"""
+    return get_district_waffle_chart(
+        vote_matrix, waffle_subsets['montreal'], 3,
+        width=800,
+        height=400,
+        title="Sièges par parti politique selon les circonscriptions de Montréal aux élections 2022"
+    )
 
-    fig.update_layout(
-        title="Sièges par parti politique médianne d'immigration supérieur 2022",
-        title_x=0.5  # Centers the title
+def get_scenario_title(scenario, amount, source=None, target=None):
+    """Title of the hypothetical waffle chart for a scenario, c.f. scenarios.apply_swing"""
+    title = "Sièges par parti politique à l'Assemblée nationale du Québec aux élections 2022 <br> "
+    if scenario == 'montreal':
+        if amount == 100:
+            return title + "si Montréal était tout le Québec"
+        return title + f"si le Québec votait à {amount} % comme Montréal"
+    source, target = (political_parties[waffle_codes.get(party, 5)] for party in (source, target))
+    if scenario == 'uniform':
+        return title + f"si {amount} points de {source} passaient à {target}"
+    return title + f"si {amount} % des votes de {source} passaient à {target}"
+
+def get_hypothetical_waffle_chart(vote_matrix, waffle_subsets, scenario='montreal', amount=100, source=None, target=None):
+    """Create a waffle chart showing what Quebec's National Assembly would look like 
+    if Montreal's voting patterns were applied to the entire province, or after another swing of the votes
+    (c.f. scenarios.apply_swing)"""
+    shares = apply_swing(vote_matrix, scenario, amount, source, target, profile_rows=waffle_subsets['montreal'])
+    return get_district_waffle_chart(
+        vote_matrix, waffle_subsets['quebec'], 5,
+        winners=get_scenario_winners(vote_matrix, shares),
+        width=1200,
+        height=300,
+        title=get_scenario_title(scenario, amount, source, target),
+        margin=dict(l=10, r=10, t=50, b=10),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
     )
-    fig.update_xaxes(showticklabels=False)
-    fig.update_yaxes(showticklabels=False)
-    return fig
 
-def get_lower_median_immigration_waffle():
-    m = 4  
-    n = 16 
-    z = np.ones((m, n))
+def get_hypothetical_waffle_updates(vote_matrix, waffle_subsets, scenario, amount, source, target):
+    """
+    Updates of the hypothetical waffle chart for a scenario (c.f. get_figure_updates) : seats, labels and title.
+    """
+    fig = get_hypothetical_waffle_chart(vote_matrix, waffle_subsets, scenario, amount, source, target)
+    return get_figure_updates(fig, ['z', 'customdata'], [('title', 'text')])
+
+def get_electoral_system_title(system, grouping, threshold):
+    """Title of the electoral system waffle chart, c.f. electoral_systems.get_seat_outcomes"""
+    title = "Sièges par parti politique à l'Assemblée nationale du Québec aux élections 2022 <br> "
+    if system == 'fptp':
+        return title + electoral_system_names[system]
+    return title + f"{electoral_system_names[system]}, {grouping_names[grouping]}, seuil de {threshold} %"
+
+def get_electoral_system_waffle(vote_matrix, seat_outcomes, system='mmp', grouping='subsets', threshold=10):
+    """Create a waffle chart of the seats under an electoral system (c.f. electoral_systems.get_seat_outcomes),
+    every seat being labelled with its region, and whether it is a district or a list seat"""
+    outcome = seat_outcomes[system, grouping, threshold]
+    # Region x party x (district seats, list seats), then one entry per seat
+    counts = np.stack([outcome['district_seats'], outcome['seats'] - outcome['district_seats']], axis=-1)
+    regions, parties, kinds = np.unravel_index(np.repeat(np.arange(counts.size), counts.ravel()), counts.shape)
+    party_codes = np.array([waffle_codes.get(party, 5) for party in vote_matrix['parties']])
+    labels = [
+        f"{get_party_name(vote_matrix['parties'][p])} : {outcome['regions'][r]} ({'circonscription' if k == 0 else 'liste'})"
+        for r, p, k in zip(regions, parties, kinds)]
+    # Seats of the regions without any vote yet stay empty (c.f. get_seat_outcomes)
+    unallocated = len(vote_matrix['districts']) - len(parties)
+    return waffle_chart(
+        np.concatenate([party_codes[parties], np.zeros(unallocated, dtype=int)]), labels + ["Siège non attribué"] * unallocated, 5,
+        width=1200,
+        height=300,
+        title=get_electoral_system_title(system, grouping, threshold),
+        margin=dict(l=10, r=10, t=50, b=10),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
 
-    z[3, 0:3] = 4
-    z[1, -1] = 0 
-    z[0, -1] = 0  
-    M = max([len(s) for s in political_parties.values()])
-    customdata = np.empty((m, n), dtype=f'<U{M}')  
+def get_electoral_system_updates(vote_matrix, seat_outcomes, maxsize=64):
+    """
+    Memoized updates of get_electoral_system_waffle for the electoral system callback, c.f. get_party_income_updates.
 
-    customdata = set_customdata(z, customdata, m, n, political_parties)
+    Returns:
+        callable: (system, grouping, threshold) -> figure updates : seats, labels and title. Must not be modified.
+    """
 
-    # colors
-    colorscale = [[0, "#FFFFFF"], 
-                [0.33, "#1E90FF"],
-                [0.33, "#b52121"], 
-                [0.66,  "#FF8040"], 
-                [0.66, "#FF8040"],
-                [1,"#004A9A"]] 
+    @functools.lru_cache(maxsize=maxsize)
+    def get_updates(system, grouping, threshold):
+        fig = get_electoral_system_waffle(vote_matrix, seat_outcomes, system, grouping, threshold)
+        return get_figure_updates(fig, ['z', 'customdata'], [('title', 'text')])
 
-    fig = go.Figure(go.Heatmap(z=z,
-                            customdata=customdata, xgap=3, ygap=3,
-                            colorscale=colorscale, showscale=False,
-                            hovertemplate="%{customdata}<extra></extra>"))
+    return get_updates
 
-    fig.update_layout(width=1200, height=400)
+def get_electoral_system_table(vote_matrix, seat_outcomes):
+    """
+    Precompute the updates of get_electoral_system_updates for every combination, to ship them to the browser once
+    (c.f. assets/clientside.js).
 
+    Returns:
+        dict: 'system/grouping/threshold' -> figure updates.
+    """
+    get_updates = get_electoral_system_updates(vote_matrix, seat_outcomes, maxsize=len(seat_outcomes))
+    return {'/'.join(map(str, key)): get_updates(*key) for key in seat_outcomes}
 
-    fig.update_layout(
-        title="Sièges par parti politique médianne d'immigration inférieur 2022",
-        title_x=0.5  # Centers the title
+def get_upper_median_immigration_waffle(vote_matrix, waffle_subsets):
+    """Create a waffle chart for the seats of the districts above the median share of immigrants"""
+    return get_district_waffle_chart(
+        vote_matrix, waffle_subsets['upper_median_immigration'], 4,
+        width=1200,
+        height=400,
+        title="Sièges par parti politique médianne d'immigration supérieur 2022"
     )
-    fig.update_xaxes(showticklabels=False)
-    fig.update_yaxes(showticklabels=False)
 
-    return fig
+def get_lower_median_immigration_waffle(vote_matrix, waffle_subsets):
+    """Create a waffle chart for the seats of the districts below the median share of immigrants"""
+    return get_district_waffle_chart(
+        vote_matrix, waffle_subsets['lower_median_immigration'], 4,
+        width=1200,
+        height=400,
+        title="Sièges par parti politique médianne d'immigration inférieur 2022"
+    )
 
 ################## end of Waffle charts ##################
 ################# start of scatter charts ##################
 
-def get_immigrant_voting_scatter(df_demographics, df_election):
+def get_district_frame(vote_matrix, keys, df_demographics, rows, **columns):
+    """
+    Per-circonscription dataframe for the scatter plots, with one row for every given row of the vote matrix (c.f. votes.py),
+    sorted by name. The given demographics column is matched through the circonscription IDs (c.f. keys.py),
+    and districts without demographics are dropped, like an inner join.
+
+    Args:
+        vote_matrix (dict): c.f. votes.py.
+        keys (dict): Key tables, c.f. keys.py.
+        df_demographics (pd.DataFrame): Demographics data.
+        rows (np.ndarray): Rows of the vote matrix, i.e. circonscription IDs.
+        columns: Column name -> values aligned with rows, or name of a demographics column -> None.
+    """
+    demographics_rows = get_rows(keys['circonscription'], df_demographics['Circonscription'])[rows]
+    df = pd.DataFrame({
+        'Circonscription': np.array(vote_matrix['districts'], dtype=object)[rows],
+        **{name: df_demographics[name].to_numpy()[demographics_rows] if values is None else values
+           for name, values in columns.items()}})
+    return df[demographics_rows >= 0].sort_values('Circonscription').reset_index(drop=True)
+
+def get_immigrant_voting_scatter(df_demographics, vote_matrix, keys):
     """Create a scatter plot showing relationship between immigration percentage and voter participation"""
-    immigration_rate = df_demographics[['Circonscription', 'Immigrants']]
-    
-    df_election = get_participation_per_district(df_election)
-    
-    df_election.rename(columns={'nomCirconscription': 'Circonscription'}, inplace=True)
-    df_election = df_election.merge(right=immigration_rate, how='inner', on='Circonscription')
+    rows = np.arange(len(vote_matrix['districts']))
+    df_election = get_district_frame(
+        vote_matrix, keys, df_demographics, rows, tauxParticipation=vote_matrix['turnout'], Immigrants=None)
     
     fig = px.scatter(
         df_election, 
@@ -289,14 +377,11 @@ def get_immigrant_voting_scatter(df_demographics, df_election):
     
     return fig
 
-def get_party_income_relation(df_demographics, df_election,  party='Q.S.'):
+def get_party_income_relation(df_demographics, vote_matrix, keys, party='Q.S.'):
     """Create a scatter plot showing relationship between median household income and votes for a specific party"""
-    income_data = df_demographics[['Circonscription', "Revenu median des menages $"]]
-    
-    df_election_filtered = group_elections_data_as_party(df_election, None, party)
-    
-    df_election_filtered.rename(columns={'nomCirconscription': 'Circonscription'}, inplace=True)
-    df_election_filtered = df_election_filtered.merge(right=income_data, how='inner', on='Circonscription')
+    rows, shares = get_party_rows(vote_matrix, party)
+    df_election_filtered = get_district_frame(
+        vote_matrix, keys, df_demographics, rows, tauxVote=shares, **{"Revenu median des menages $": None})
     df_election_filtered = df_election_filtered.sort_values("Revenu median des menages $")
     
     fig = px.scatter(
@@ -319,4 +404,40 @@ def get_party_income_relation(df_demographics, df_election,  party='Q.S.'):
         plot_bgcolor='rgba(0,0,0,0)'
     )
     
-    return fig
\ No newline at end of file
+    return fig
+
+def get_party_income_updates(df_demographics, vote_matrix, keys, maxsize=16):
+    """
+    Memoized version of get_party_income_relation, for the party dropdown callback.
+    It only keeps what changes from one party to the other : the points and the titles (c.f. src/patches.py).
+    Each party's updates are built once, then served from a bounded LRU cache (safe to share between threads).
+
+    Args:
+        df_demographics (pd.DataFrame): Demographics data, c.f. get_party_income_relation.
+        vote_matrix (dict): Elections data, c.f. votes.py.
+        keys (dict): Key tables, c.f. keys.py.
+        maxsize (int): Maximum number of parties kept in the cache.
+
+    Returns:
+        callable: party -> figure updates, c.f. get_figure_updates. Must not be modified.
+    """
+
+    @functools.lru_cache(maxsize=maxsize)
+    def get_updates(party):
+        fig = get_party_income_relation(df_demographics, vote_matrix, keys, party)
+        return get_figure_updates(
+            fig,
+            trace_keys=['x', 'y', 'customdata', 'hovertemplate'],
+            layout_paths=[('title', 'text'), ('yaxis', 'title', 'text')])
+
+    return get_updates
+
+def get_party_income_table(df_demographics, vote_matrix, keys, parties):
+    """
+    Precompute the updates of get_party_income_updates for every party, to ship them to the browser once (c.f. assets/clientside.js).
+
+    Returns:
+        dict: Party -> figure updates.
+    """
+    get_updates = get_party_income_updates(df_demographics, vote_matrix, keys, maxsize=len(parties))
+    return {party: get_updates(party) for party in parties}
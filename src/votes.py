@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from src.keys import get_ids
+
+# Per-district columns of the elections data (repeated on every candidate row), as vote_matrix key -> column
+DISTRICT_COLUMNS = {
+    'number': 'numeroCirconscription',
+    'reported': 'nbBureauComplete',
+    'stations': 'nbBureauTotal',
+    'registered': 'nbElecteurInscrit',
+    'cast': 'nbVoteExerce',
+    'valid': 'nbVoteValide',
+    'rejected': 'nbVoteRejete',
+    'turnout': 'tauxParticipation',
+}
+# Winner of a district without any vote yet (e.g. on election night, before its first results)
+UNDECIDED = -1
+
+
+def get_vote_matrix(df_elections: pd.DataFrame, keys: dict):
+    """
+    Dense district x party view of the elections data, built once and shared by every chart.
+    Rows are the circonscription IDs (c.f. keys.py), so the rows of a set of districts are simply get_ids(...).
+    Columns are the parties, in order of first appearance in the data (i.e. the main parties first).
+
+    Args:
+        df_elections (pd.DataFrame): Elections data, one row per candidate.
+        keys (dict): Key tables, c.f. keys.py.
+
+    Returns:
+        dict: With keys
+            'districts' : row -> name of the circonscription,
+            'parties' : column -> abbreviation of the party, and 'columns' : abbreviation -> column,
+            'votes' : votes of every party in every district (0 without candidate),
+            'shares' : same as percentages of the valid votes, as published (0 without candidate),
+            'ran' : whether the party had a candidate in the district,
+            'winners' : column of the party with the most votes in every district (UNDECIDED without any vote, c.f. get_winners),
+            and one vector per district for every key of DISTRICT_COLUMNS (e.g. 'turnout', 'registered').
+        Shared between the charts, must not be modified.
+
+    Raises:
+        ValueError: If a party has several candidates in a district, or if a district is missing.
+    """
+    table = keys['circonscription']
+    rows = get_ids(table, df_elections['nomCirconscription'])
+    columns, parties = pd.factorize(df_elections['abreviationPartiPolitique'])
+    shape = (len(table['names']), len(parties))
+
+    ran = np.zeros(shape, dtype=bool)
+    ran[rows, columns] = True
+    if ran.sum() != len(df_elections):
+        raise ValueError('Several candidates of the same party in a district')
+    if not ran.any(axis=1).all():
+        raise ValueError(f'Districts without results : {np.array(table["names"])[~ran.any(axis=1)].tolist()}')
+
+    votes = np.zeros(shape, dtype=np.int64)
+    votes[rows, columns] = df_elections['nbVoteTotal'].to_numpy()
+    shares = np.zeros(shape)
+    shares[rows, columns] = df_elections['tauxVote'].to_numpy()
+
+    matrix = {
+        'districts': table['names'],
+        'parties': parties.tolist(),
+        'columns': {party: i for i, party in enumerate(parties)},
+        'votes': votes,
+        'shares': shares,
+        'ran': ran,
+        'winners': get_winners(votes),
+    }
+    for key, column in DISTRICT_COLUMNS.items():
+        values = df_elections[column].to_numpy()
+        matrix[key] = np.zeros(shape[0], dtype=values.dtype)
+        matrix[key][rows] = values
+    return matrix
+
+def get_winners(votes):
+    """
+    Column of the party with the most votes in every row of a votes matrix, UNDECIDED for the rows without any vote
+    (argmax alone would give them to the first party).
+    """
+    return np.where(votes.sum(axis=1) > 0, votes.argmax(axis=1), UNDECIDED)
+
+def get_party_rows(vote_matrix: dict, party: str):
+    """
+    Rows of the districts where a party had a candidate, and its share of the votes there.
+    """
+    column = vote_matrix['columns'][party]
+    rows = np.flatnonzero(vote_matrix['ran'][:, column])
+    return rows, vote_matrix['shares'][rows, column]
+
+def update_vote_matrix(vote_matrix: dict, df_elections: pd.DataFrame, keys: dict):
+    """
+    Vote matrix of newer elections data (e.g. on election night, c.f. live.py), only recomputing the districts whose results changed :
+    reported polling stations, votes, or candidates. The previous matrix is not modified, so readers still holding it keep a consistent view.
+
+    Args:
+        vote_matrix (dict): Matrix of the previous data, c.f. get_vote_matrix.
+        df_elections (pd.DataFrame): The new elections data.
+        keys (dict): Key tables, c.f. keys.py.
+
+    Returns:
+        tuple: The new matrix (vote_matrix itself if nothing changed), and the rows of the changed districts.
+    """
+    if not set(df_elections['abreviationPartiPolitique']).issubset(vote_matrix['columns']):
+        # A new party : the columns change, so everything is rebuilt
+        matrix = get_vote_matrix(df_elections, keys)
+        return matrix, np.arange(len(matrix['districts']))
+
+    rows = get_ids(keys['circonscription'], df_elections['nomCirconscription'])
+    columns = np.array([vote_matrix['columns'][party] for party in df_elections['abreviationPartiPolitique']], dtype=int)
+    changed = (
+        (vote_matrix['votes'][rows, columns] != df_elections['nbVoteTotal'].to_numpy())
+        | (vote_matrix['reported'][rows] != df_elections['nbBureauComplete'].to_numpy())
+        | ~vote_matrix['ran'][rows, columns])
+    changed_rows = np.union1d(
+        rows[changed],
+        # Withdrawn candidates
+        np.flatnonzero(vote_matrix['ran'].sum(axis=1) != np.bincount(rows, minlength=len(vote_matrix['districts']))))
+    if len(changed_rows) == 0:
+        return vote_matrix, changed_rows
+
+    matrix = dict(vote_matrix)
+    for key in ['votes', 'shares', 'ran', 'winners', *DISTRICT_COLUMNS]:
+        matrix[key] = vote_matrix[key].copy()
+        matrix[key][changed_rows] = 0
+
+    update = np.isin(rows, changed_rows)
+    rows, columns = rows[update], columns[update]
+    matrix['ran'][rows, columns] = True
+    matrix['votes'][rows, columns] = df_elections['nbVoteTotal'].to_numpy()[update]
+    matrix['shares'][rows, columns] = df_elections['tauxVote'].to_numpy()[update]
+    matrix['winners'][changed_rows] = get_winners(matrix['votes'][changed_rows])
+    for key, column in DISTRICT_COLUMNS.items():
+        matrix[key][rows] = df_elections[column].to_numpy()[update]
+    return matrix, changed_rows
+
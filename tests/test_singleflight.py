@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+
+import dash
+from dash import Input, Output, Patch, dcc, html
+
+from src.singleflight import single_flight
+
+
+def test_followers_get_their_own_copy():
+    release = threading.Event()
+    calls = []
+
+    @single_flight
+    def build(party):
+        calls.append(party)
+        release.wait()
+        return {'data': [{'x': [1, 2]}]}
+
+    results = [None] * 4
+    def run(i):
+        results[i] = build('CAQ')
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['CAQ']
+    assert all(result == {'data': [{'x': [1, 2]}]} for result in results)
+    results[0]['data'][0]['x'].append(3)
+    assert all(result['data'][0]['x'] == [1, 2] for result in results[1:])
+    assert len({id(result) for result in results}) == 4
+
+def test_concurrent_dash_callbacks_are_coalesced():
+    app = dash.Dash(__name__)
+    app.layout = html.Div([dcc.Dropdown(id='party'), dcc.Graph(id='graph')])
+    release = threading.Event()
+    calls = []
+
+    @app.callback(Output('graph', 'figure'), Input('party', 'value'), prevent_initial_call=True)
+    @single_flight
+    def update_graph(party):
+        calls.append(party)
+        release.wait()
+        patch = Patch()
+        patch['layout']['title'] = party
+        return patch
+
+    payload = {
+        'output': 'graph.figure',
+        'outputs': {'id': 'graph', 'property': 'figure'},
+        'inputs': [{'id': 'party', 'property': 'value', 'value': 'CAQ'}],
+        'changedPropIds': ['party.value'],
+        'state': [],
+    }
+    responses = [None] * 4
+    def post(i):
+        responses[i] = app.server.test_client().post('/_dash-update-component', json=payload)
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    # Let the requests reach the callback before the first one returns
+    time.sleep(0.5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['CAQ']
+    assert all(response.status_code == 200 for response in responses)
+    bodies = [json.loads(response.get_data()) for response in responses]
+    assert all(body == bodies[0] for body in bodies)
+    assert bodies[0]['response']['graph']['figure']['__dash_patch_update'] == '__dash_patch_update'
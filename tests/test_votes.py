@@ -0,0 +1,54 @@
+import pandas as pd
+
+from src.keys import build_key_table
+from src.scenarios import get_seat_totals
+from src.viz_waffles_charts import get_seat_codes
+from src.votes import UNDECIDED, get_vote_matrix, update_vote_matrix
+
+DISTRICTS = ['Abitibi-Est', 'Gouin', 'Laurier-Dorion']
+PARTIES = ['C.A.Q.-E.F.L.', 'P.L.Q./Q.L.P.', 'Q.S.']
+
+
+def make_elections(votes, reported):
+    """Elections data with one candidate of every party in every district, from district x party votes."""
+    rows = []
+    for number, (district, district_votes, district_reported) in enumerate(zip(DISTRICTS, votes, reported)):
+        valid = sum(district_votes)
+        for party, party_votes in zip(PARTIES, district_votes):
+            rows.append({
+                'numeroCirconscription': 100 + number, 'nomCirconscription': district,
+                'nbBureauComplete': district_reported, 'nbBureauTotal': 100,
+                'nbVoteValide': valid, 'nbVoteRejete': 0, 'nbVoteExerce': valid, 'nbElecteurInscrit': 1000,
+                'tauxParticipation': valid / 10, 'abreviationPartiPolitique': party, 'nbVoteTotal': party_votes,
+                'tauxVote': 100 * party_votes / valid if valid else 0.0,
+            })
+    return pd.DataFrame(rows)
+
+def make_keys():
+    return {'circonscription': build_key_table(DISTRICTS)}
+
+def test_districts_without_votes_are_undecided():
+    vote_matrix = get_vote_matrix(make_elections([[10, 30, 20], [0, 0, 0], [5, 1, 2]], [100, 0, 100]), make_keys())
+
+    assert vote_matrix['winners'].tolist() == [1, UNDECIDED, 0]
+    assert get_seat_codes(vote_matrix).tolist() == [2, 0, 1]
+    assert get_seat_totals(vote_matrix, vote_matrix['winners']) == {'C.A.Q.-E.F.L.': 1, 'P.L.Q./Q.L.P.': 1}
+
+def test_no_false_sweep_before_the_results():
+    vote_matrix = get_vote_matrix(make_elections([[0, 0, 0]] * 3, [0, 0, 0]), make_keys())
+
+    assert (vote_matrix['winners'] == UNDECIDED).all()
+    assert (get_seat_codes(vote_matrix) == 0).all()
+    assert get_seat_totals(vote_matrix, vote_matrix['winners']) == {}
+
+def test_partial_update_leaves_districts_without_votes_undecided():
+    keys = make_keys()
+    vote_matrix = get_vote_matrix(make_elections([[0, 0, 0]] * 3, [0, 0, 0]), keys)
+
+    # First results in one district, a polling station reported without any vote in another
+    updated, rows = update_vote_matrix(vote_matrix, make_elections([[0, 0, 0], [3, 5, 9], [0, 0, 0]], [0, 1, 1]), keys)
+
+    assert rows.tolist() == [1, 2]
+    assert updated['winners'].tolist() == [UNDECIDED, 2, UNDECIDED]
+    assert (vote_matrix['winners'] == UNDECIDED).all()
+    assert updated['winners'].tolist() == get_vote_matrix(make_elections([[0, 0, 0], [3, 5, 9], [0, 0, 0]], [0, 1, 1]), keys)['winners'].tolist()